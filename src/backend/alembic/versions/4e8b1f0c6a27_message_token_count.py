@@ -0,0 +1,26 @@
+"""message token_count
+
+Revision ID: 4e8b1f0c6a27
+Revises: 9c41e2a7d3b5
+Create Date: 2026-10-17 11:05:47.218634
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4e8b1f0c6a27"
+down_revision: Union[str, None] = "9c41e2a7d3b5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("messages", sa.Column("token_count", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("messages", "token_count")
@@ -0,0 +1,31 @@
+"""message conversation_id position index
+
+Revision ID: 9c41e2a7d3b5
+Revises: 2853273872ca
+Create Date: 2026-10-17 10:12:31.512407
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9c41e2a7d3b5"
+down_revision: Union[str, None] = "2853273872ca"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "message_conversation_id_position",
+        "messages",
+        ["conversation_id", "position"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("message_conversation_id_position", table_name="messages")
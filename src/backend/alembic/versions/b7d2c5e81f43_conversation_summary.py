@@ -0,0 +1,30 @@
+"""conversation summary
+
+Revision ID: b7d2c5e81f43
+Revises: 4e8b1f0c6a27
+Create Date: 2026-10-17 12:21:09.604318
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d2c5e81f43"
+down_revision: Union[str, None] = "4e8b1f0c6a27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("conversations", sa.Column("summary", sa.String(), nullable=True))
+    op.add_column(
+        "conversations", sa.Column("summary_position", sa.Integer(), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("conversations", "summary_position")
+    op.drop_column("conversations", "summary")
@@ -0,0 +1,26 @@
+"""message finish_reason
+
+Revision ID: d3f6a9b2c714
+Revises: b7d2c5e81f43
+Create Date: 2026-10-17 13:40:52.381920
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d3f6a9b2c714"
+down_revision: Union[str, None] = "b7d2c5e81f43"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("messages", sa.Column("finish_reason", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("messages", "finish_reason")
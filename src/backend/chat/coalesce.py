@@ -0,0 +1,123 @@
+"""
+Coalescing of text generation events between the deployment stream and the encoder.
+
+Consecutive text deltas are merged while the time window is open, or until the
+buffer reaches the character cap, so far fewer SSE frames are sent for a long answer.
+Any other event and the end of the stream flush the buffer immediately, so
+ordering is kept and perceived latency is bounded by the window.
+Closing the coalesced stream closes the deployment stream.
+
+STREAM_COALESCE_WINDOW_MS=0 disables coalescing.
+"""
+
+import asyncio
+import os
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, Dict
+
+import anyio
+
+from backend.chat.enums import StreamEvent
+
+COALESCE_WINDOW_MS = float(os.getenv("STREAM_COALESCE_WINDOW_MS", "20"))
+COALESCE_MAX_CHARS = int(os.getenv("STREAM_COALESCE_MAX_CHARS", "200"))
+
+_END = object()
+
+
+class _StreamFailure:
+    def __init__(self, exception: BaseException):
+        self.exception = exception
+
+
+async def coalesce_text_generation(
+    stream: AsyncGenerator[Dict[str, Any], None],
+    window_ms: float = COALESCE_WINDOW_MS,
+    max_chars: int = COALESCE_MAX_CHARS,
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    Merge consecutive text generation events of a deployment stream.
+
+    Args:
+        stream (AsyncGenerator[Dict[str, Any], None]): Deployment stream events.
+        window_ms (float): Time window a text delta can wait for the next ones.
+        max_chars (int): Buffered characters that trigger a flush, 0 for no cap.
+
+    Yields:
+        Dict[str, Any]: Stream events, with text generation events merged.
+    """
+    if window_ms <= 0:
+        async with aclosing(stream):
+            async for event in stream:
+                yield event
+        return
+
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump() -> None:
+        try:
+            async with aclosing(stream):
+                async for event in stream:
+                    await queue.put(event)
+        except Exception as e:
+            await queue.put(_StreamFailure(e))
+        else:
+            await queue.put(_END)
+
+    pump_task = asyncio.create_task(pump())
+    loop = asyncio.get_running_loop()
+    window = window_ms / 1000
+
+    buffer: list[str] = []
+    buffered_chars = 0
+    last_text_event: Dict[str, Any] | None = None
+    deadline = 0.0
+
+    def flush() -> Dict[str, Any]:
+        nonlocal buffer, buffered_chars, last_text_event
+        event = last_text_event | {"text": "".join(buffer)}
+        buffer, buffered_chars, last_text_event = [], 0, None
+        return event
+
+    try:
+        while True:
+            if buffer:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    yield flush()
+                    continue
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield flush()
+                    continue
+            else:
+                item = await queue.get()
+
+            if isinstance(item, dict) and (
+                item.get("event_type") == StreamEvent.TEXT_GENERATION
+                and isinstance(item.get("text"), str)
+            ):
+                if not buffer:
+                    deadline = loop.time() + window
+                buffer.append(item["text"])
+                buffered_chars += len(item["text"])
+                last_text_event = item
+                if max_chars and buffered_chars >= max_chars:
+                    yield flush()
+                continue
+
+            if buffer:
+                yield flush()
+
+            if item is _END:
+                return
+            if isinstance(item, _StreamFailure):
+                raise item.exception
+
+            yield item
+    finally:
+        pump_task.cancel()
+        # Waits for the deployment stream to be closed, even when cancelled
+        with anyio.CancelScope(shield=True):
+            await asyncio.gather(pump_task, return_exceptions=True)
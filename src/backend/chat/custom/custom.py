@@ -1,17 +1,39 @@
 import logging
-from typing import Any
+import os
+import threading
+from contextlib import aclosing
+from functools import partial
+from typing import Any, AsyncGenerator, Dict
+from uuid import uuid4
 
+import anyio
 from fastapi import HTTPException
 
 from backend.chat.base import BaseChat
 from backend.chat.custom.model_deployments.base import BaseDeployment
 from backend.chat.custom.model_deployments.deployment import get_deployment
+from backend.chat.enums import StreamEvent
 from backend.config.tools import AVAILABLE_TOOLS, ToolName
 from backend.schemas.cohere_chat import CohereChatRequest
+from backend.schemas.search_query import SearchQuery
 from backend.schemas.tool import Category, Tool
+from backend.services.concurrency import run_cancellable, run_concurrently
 from backend.services.logger import get_logger
+from backend.services.response_cache import (
+    compact_stream_events,
+    get_response_cache,
+    lookup_response,
+    store_response,
+)
 from backend.tools.retrieval.collate import combine_documents
 
+RETRIEVAL_MAX_CONCURRENCY = int(os.getenv("RETRIEVAL_MAX_CONCURRENCY", "8"))
+RETRIEVAL_TIMEOUT = float(os.getenv("RETRIEVAL_TIMEOUT", "10"))
+TOOL_CALL_MAX_CONCURRENCY = int(os.getenv("TOOL_CALL_MAX_CONCURRENCY", "4"))
+# Tool calls are abandoned after the timeout, it is also passed to the tools but
+# only the Python interpreter honours it and stops on its own
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "30"))
+
 
 class CustomChat(BaseChat):
     """Custom chat flow not using integrations for models."""
@@ -40,14 +62,11 @@ class CustomChat(BaseChat):
 
         if kwargs.get("managed_tools", True):
             # Generate Search Queries
-            chat_history = [message.to_dict() for message in chat_request.chat_history]
-
-            function_tools: list[Tool] = []
-            for tool in chat_request.tools:
-                available_tool = AVAILABLE_TOOLS.get(tool.name)
-                if available_tool and available_tool.category == Category.Function:
-                    function_tools.append(Tool(**available_tool.model_dump()))
+            chat_history = [
+                message.to_dict() for message in chat_request.chat_history or []
+            ]
 
+            function_tools = self.get_function_tools(chat_request)
             if len(function_tools) > 0:
                 tool_results = self.get_tool_results(
                     chat_request.message, function_tools, deployment_model
@@ -60,8 +79,10 @@ class CustomChat(BaseChat):
                         tool_results=tool_results,
                     )
                 else:
-                    return deployment_model.invoke_chat(
+                    return self.invoke_chat_cached(
+                        deployment_model,
                         chat_request,
+                        user_id=kwargs.get("user_id"),
                         tool_results=tool_results,
                     )
 
@@ -82,16 +103,10 @@ class CustomChat(BaseChat):
             if len(queries) == 0 and len(retrievers) > 0:
                 queries = [chat_request.message]
 
-            all_documents = {}
-            # TODO: call in parallel and error handling
-            for retriever in retrievers:
-                for query in queries:
-                    all_documents.setdefault(query, []).extend(
-                        retriever.retrieve_documents(query)
-                    )
+            all_documents = self.retrieve_documents(retrievers, queries)
 
             # Collate Documents
-            documents = combine_documents(all_documents, deployment_model)
+            documents, _ = combine_documents(all_documents, deployment_model)
             chat_request.documents = documents
             chat_request.tools = []
 
@@ -99,7 +114,418 @@ class CustomChat(BaseChat):
         if kwargs.get("stream", True) is True:
             return deployment_model.invoke_chat_stream(chat_request)
         else:
-            return deployment_model.invoke_chat(chat_request)
+            return self.invoke_chat_cached(
+                deployment_model, chat_request, user_id=kwargs.get("user_id")
+            )
+
+    async def achat(self, chat_request: CohereChatRequest, **kwargs: Any) -> Any:
+        """
+        Async chat flow for custom models, used by the streaming endpoint.
+        Request validation happens up front, the retrieval and generation run
+        inside the returned stream so stream-start is sent before any upstream call.
+
+        Args:
+            chat_request (CohereChatRequest): Chat request.
+            **kwargs (Any): Keyword arguments.
+
+        Returns:
+            AsyncGenerator[StreamResponse, None]: Chat response.
+        """
+        deployment_model = get_deployment(kwargs.get("deployment_name"))
+        self.logger.info(f"Using deployment {deployment_model.__class__.__name__}")
+
+        if len(chat_request.tools) > 0 and len(chat_request.documents) > 0:
+            raise HTTPException(
+                status_code=400, detail="Both tools and documents cannot be provided."
+            )
+
+        function_tools = []
+        retrievers = []
+        managed_tools = kwargs.get("managed_tools", True)
+        if managed_tools:
+            function_tools = self.get_function_tools(chat_request)
+            if len(function_tools) == 0:
+                retrievers = self.get_retrievers(
+                    kwargs.get("file_paths", []),
+                    [tool.name for tool in chat_request.tools],
+                )
+                self.logger.info(
+                    f"Using retrievers: {[retriever.__class__.__name__ for retriever in retrievers]}"
+                )
+
+        invoke_kwargs = {}
+        stream_end_metadata = {}
+        stages = self.aprepare_chat_request(
+            chat_request,
+            deployment_model,
+            function_tools,
+            retrievers,
+            managed_tools,
+            invoke_kwargs,
+            stream_end_metadata,
+        )
+
+        if kwargs.get("stream", True) is not True:
+            async for _ in stages:
+                pass
+            return await self.ainvoke_chat_cached(
+                deployment_model,
+                chat_request,
+                user_id=kwargs.get("user_id"),
+                **invoke_kwargs,
+            )
+
+        return self.achat_stream(
+            chat_request,
+            deployment_model,
+            stages,
+            invoke_kwargs,
+            stream_end_metadata,
+            user_id=kwargs.get("user_id"),
+        )
+
+    async def achat_stream(
+        self,
+        chat_request: CohereChatRequest,
+        deployment_model: BaseDeployment,
+        stages: AsyncGenerator[Dict[str, Any], None],
+        invoke_kwargs: Dict[str, Any],
+        stream_end_metadata: Dict[str, Any] | None = None,
+        user_id: str | None = None,
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Stream the chat events: stream-start right away, then the events of
+        each preparation stage as it completes, then the model response.
+
+        Args:
+            chat_request (CohereChatRequest): Chat request.
+            deployment_model (BaseDeployment): Model deployment.
+            stages (AsyncGenerator): Preparation stages of the chat request.
+            invoke_kwargs (Dict[str, Any]): Keyword arguments filled in by the stages.
+            stream_end_metadata (Dict[str, Any] | None): Fields filled in by the stages, added to the stream end.
+            user_id (str | None): User ID, scopes the semantic response cache.
+
+        Yields:
+            Dict[str, Any]: Stream events.
+        """
+        yield {
+            "event_type": StreamEvent.STREAM_START,
+            "generation_id": str(uuid4()),
+            "is_finished": False,
+        }
+
+        # Closing this stream (e.g: the client disconnected) closes the stage
+        # or the model stream in progress
+        async with aclosing(stages):
+            async for event in stages:
+                yield event
+
+        async with aclosing(
+            self.ainvoke_chat_stream_cached(
+                deployment_model, chat_request, user_id=user_id, **invoke_kwargs
+            )
+        ) as model_stream:
+            async for event in model_stream:
+                # Stream start was already sent before the preparation stages
+                if event["event_type"] == StreamEvent.STREAM_START:
+                    continue
+                if event["event_type"] == StreamEvent.STREAM_END:
+                    event = event | (stream_end_metadata or {})
+                yield event
+
+    def invoke_chat_cached(
+        self,
+        deployment_model: BaseDeployment,
+        chat_request: CohereChatRequest,
+        user_id: str | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Invoke the chat, answered from the response cache for deterministic requests.
+
+        Args:
+            deployment_model (BaseDeployment): Model deployment.
+            chat_request (CohereChatRequest): Chat request.
+            user_id (str | None): User ID, scopes the semantic response cache.
+            **kwargs (Any): Keyword arguments of the deployment call.
+
+        Returns:
+            Any: Chat response.
+        """
+        cache = get_response_cache()
+        lookup = None
+        if cache is not None:
+            lookup = lookup_response(
+                cache, deployment_model, chat_request, False, user_id, **kwargs
+            )
+        if lookup is not None and lookup.hit:
+            self.logger.info("Chat response served from the response cache")
+            return lookup.value
+
+        response = deployment_model.invoke_chat(chat_request, **kwargs)
+        if lookup is not None:
+            store_response(
+                cache,
+                lookup,
+                response,
+                len(response.text or ""),
+                getattr(response, "finish_reason", None),
+            )
+        return response
+
+    async def ainvoke_chat_cached(
+        self,
+        deployment_model: BaseDeployment,
+        chat_request: CohereChatRequest,
+        user_id: str | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Async variant of invoke_chat_cached.
+
+        Args:
+            deployment_model (BaseDeployment): Model deployment.
+            chat_request (CohereChatRequest): Chat request.
+            user_id (str | None): User ID, scopes the semantic response cache.
+            **kwargs (Any): Keyword arguments of the deployment call.
+
+        Returns:
+            Any: Chat response.
+        """
+        cache = get_response_cache()
+        lookup = None
+        if cache is not None:
+            lookup = await anyio.to_thread.run_sync(
+                partial(
+                    lookup_response,
+                    cache,
+                    deployment_model,
+                    chat_request,
+                    False,
+                    user_id,
+                    **kwargs,
+                ),
+                abandon_on_cancel=True,
+            )
+        if lookup is not None and lookup.hit:
+            self.logger.info("Chat response served from the response cache")
+            return lookup.value
+
+        response = await deployment_model.ainvoke_chat(chat_request, **kwargs)
+        if lookup is not None:
+            store_response(
+                cache,
+                lookup,
+                response,
+                len(response.text or ""),
+                getattr(response, "finish_reason", None),
+            )
+        return response
+
+    async def ainvoke_chat_stream_cached(
+        self,
+        deployment_model: BaseDeployment,
+        chat_request: CohereChatRequest,
+        user_id: str | None = None,
+        **kwargs: Any,
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Stream the model response, replayed from the response cache when the
+        request is deterministic.
+
+        Args:
+            deployment_model (BaseDeployment): Model deployment.
+            chat_request (CohereChatRequest): Chat request.
+            user_id (str | None): User ID, scopes the semantic response cache.
+            **kwargs (Any): Keyword arguments of the deployment call.
+
+        Yields:
+            Dict[str, Any]: Stream events.
+        """
+        cache = get_response_cache()
+        lookup = None
+        if cache is not None:
+            lookup = await anyio.to_thread.run_sync(
+                partial(
+                    lookup_response,
+                    cache,
+                    deployment_model,
+                    chat_request,
+                    True,
+                    user_id,
+                    **kwargs,
+                ),
+                abandon_on_cancel=True,
+            )
+        if lookup is not None and lookup.hit:
+            self.logger.info("Chat stream replayed from the response cache")
+            for event in lookup.value:
+                yield event
+            return
+
+        events = []
+        finish_reason = None
+        async with aclosing(
+            deployment_model.ainvoke_chat_stream(chat_request, **kwargs)
+        ) as model_stream:
+            async for event in model_stream:
+                if lookup is not None:
+                    events.append(event)
+                if event["event_type"] == StreamEvent.STREAM_END:
+                    finish_reason = event.get("finish_reason")
+                yield event
+
+        if lookup is not None:
+            events, size = compact_stream_events(events)
+            store_response(cache, lookup, events, size, finish_reason)
+
+    async def aprepare_chat_request(
+        self,
+        chat_request: CohereChatRequest,
+        deployment_model: BaseDeployment,
+        function_tools: list[Tool],
+        retrievers: list[Any],
+        managed_tools: bool,
+        invoke_kwargs: Dict[str, Any],
+        stream_end_metadata: Dict[str, Any] | None = None,
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Run the tool calls or the search query generation, retrieval and collation
+        for the chat request, yielding an event as each stage completes.
+
+        Args:
+            chat_request (CohereChatRequest): Chat request, updated with the documents.
+            deployment_model (BaseDeployment): Model deployment.
+            function_tools (list[Tool]): Function tools to call.
+            retrievers (list[Any]): Retriever implementations.
+            managed_tools (bool): Whether the request uses managed tools.
+            invoke_kwargs (Dict[str, Any]): Updated with the tool results if any.
+            stream_end_metadata (Dict[str, Any] | None): Updated with the tokens of documents left out of the budget.
+
+        Yields:
+            Dict[str, Any]: Search queries and search results events.
+        """
+        if not managed_tools:
+            return
+
+        if len(function_tools) > 0:
+            invoke_kwargs["tool_results"] = await run_cancellable(
+                self.get_tool_results,
+                chat_request.message,
+                function_tools,
+                deployment_model,
+            )
+            chat_request.tools = None
+            return
+
+        chat_history = [
+            message.to_dict() for message in chat_request.chat_history or []
+        ]
+        queries = await deployment_model.ainvoke_search_queries(
+            chat_request.message, chat_history
+        )
+        self.logger.info(f"Search queries generated: {queries}")
+
+        if len(queries) > 0:
+            generation_id = str(uuid4())
+            yield {
+                "event_type": StreamEvent.SEARCH_QUERIES_GENERATION,
+                "search_queries": [
+                    SearchQuery(text=query, generation_id=generation_id)
+                    for query in queries
+                ],
+                "is_finished": False,
+            }
+
+        if len(queries) == 0 and len(retrievers) > 0:
+            queries = [chat_request.message]
+
+        all_documents = await run_cancellable(
+            self.retrieve_documents, retrievers, queries
+        )
+
+        documents, tokens_saved = await anyio.to_thread.run_sync(
+            combine_documents, all_documents, deployment_model, abandon_on_cancel=True
+        )
+        if stream_end_metadata is not None:
+            stream_end_metadata["context_tokens_saved"] = tokens_saved
+        for index, document in enumerate(documents):
+            document.setdefault("id", f"doc_{index}")
+
+        chat_request.documents = documents
+        chat_request.tools = []
+
+        if len(retrievers) > 0:
+            yield {
+                "event_type": StreamEvent.SEARCH_RESULTS,
+                "documents": documents,
+                "search_results": [],
+                "is_finished": False,
+            }
+
+    def get_function_tools(self, chat_request: CohereChatRequest) -> list[Tool]:
+        """
+        Get the managed function tools requested.
+
+        Args:
+            chat_request (CohereChatRequest): Chat request.
+
+        Returns:
+            list[Tool]: Function tools to call before generating the response.
+        """
+        function_tools: list[Tool] = []
+        for tool in chat_request.tools:
+            available_tool = AVAILABLE_TOOLS.get(tool.name)
+            if available_tool and available_tool.category == Category.Function:
+                function_tools.append(Tool(**available_tool.model_dump()))
+
+        return function_tools
+
+    def retrieve_documents(
+        self,
+        retrievers: list[Any],
+        queries: list[str],
+        cancelled: threading.Event | None = None,
+    ) -> dict[str, list[dict[str, Any]]]:
+        """
+        Retrieve documents for every query from every retriever, concurrently.
+        Failed or timed out retrievers are logged and skipped.
+
+        Args:
+            retrievers (list[Any]): Retriever implementations.
+            queries (list[str]): Search queries.
+            cancelled (threading.Event | None): Set to stop the retrievals not done yet.
+
+        Returns:
+            dict[str, list[dict[str, Any]]]: Documents by query.
+        """
+        pairs = [(retriever, query) for retriever in retrievers for query in queries]
+        outcomes = run_concurrently(
+            [
+                partial(retriever.retrieve_documents, query)
+                for retriever, query in pairs
+            ],
+            max_concurrency=RETRIEVAL_MAX_CONCURRENCY,
+            timeout=RETRIEVAL_TIMEOUT,
+            cancelled=cancelled,
+        )
+
+        all_documents = {}
+        for (retriever, query), outcome in zip(pairs, outcomes):
+            retriever_name = retriever.__class__.__name__
+            if not outcome.ok:
+                self.logger.warning(
+                    f"Retriever {retriever_name} failed for query '{query}' "
+                    f"after {outcome.elapsed:.2f}s: {outcome.error}"
+                )
+                continue
+
+            self.logger.info(
+                f"Retriever {retriever_name} took {outcome.elapsed:.2f}s for query '{query}'"
+            )
+            all_documents.setdefault(query, []).extend(outcome.value or [])
+
+        return all_documents
 
     def get_retrievers(
         self, file_paths: list[str], req_tools: list[ToolName]
@@ -143,21 +569,61 @@ class CustomChat(BaseChat):
         return retrievers
 
     def get_tool_results(
-        self, message: str, tools: list[Tool], model: BaseDeployment
+        self,
+        message: str,
+        tools: list[Tool],
+        model: BaseDeployment,
+        cancelled: threading.Event | None = None,
     ) -> list[dict[str, Any]]:
-        tool_results = []
+        """
+        Call the tools requested by the model, concurrently.
+        Results are in the order of the tool calls, a failed or timed out call
+        returns its error as the tool output.
+
+        Args:
+            message (str): User message.
+            tools (list[Tool]): Available function tools.
+            model (BaseDeployment): Model deployment.
+            cancelled (threading.Event | None): Set to stop the tool calls not done yet.
+
+        Returns:
+            list[dict[str, Any]]: Tool calls with their outputs.
+        """
         tools_to_use = model.invoke_tools(message, tools)
 
-        tool_calls = tools_to_use.tool_calls if tools_to_use.tool_calls else []
-        for tool_call in tool_calls:
-            tool = AVAILABLE_TOOLS.get(tool_call.name)
-            if not tool:
+        tool_calls = []
+        for tool_call in tools_to_use.tool_calls if tools_to_use.tool_calls else []:
+            if not AVAILABLE_TOOLS.get(tool_call.name):
                 logging.warning(f"Couldn't find tool {tool_call.name}")
                 continue
+            tool_calls.append(tool_call)
 
-            outputs = tool.implementation().call(
-                parameters=tool_call.parameters,
-            )
+        outcomes = run_concurrently(
+            [
+                partial(
+                    AVAILABLE_TOOLS[tool_call.name].implementation().call,
+                    parameters=tool_call.parameters,
+                    timeout=TOOL_CALL_TIMEOUT,
+                )
+                for tool_call in tool_calls
+            ],
+            max_concurrency=TOOL_CALL_MAX_CONCURRENCY,
+            timeout=TOOL_CALL_TIMEOUT,
+            cancelled=cancelled,
+        )
+
+        tool_results = []
+        for tool_call, outcome in zip(tool_calls, outcomes):
+            if outcome.ok:
+                outputs = outcome.value
+                self.logger.info(
+                    f"Tool {tool_call.name} took {outcome.elapsed:.2f}s"
+                )
+            else:
+                outputs = {"error": str(outcome.error)}
+                self.logger.warning(
+                    f"Tool {tool_call.name} failed after {outcome.elapsed:.2f}s: {outcome.error}"
+                )
             tool_results.append({"call": tool_call, "outputs": [outputs]})
 
         return tool_results
@@ -1,6 +1,18 @@
-from backend.chat.custom.model_deployments.azure import AzureDeployment
-from backend.chat.custom.model_deployments.cohere_platform import CohereDeployment
-from backend.chat.custom.model_deployments.sagemaker import SageMakerDeployment
+import importlib
+
+# Implementations are imported on first access, they pull in their SDKs
+_IMPLEMENTATIONS = {
+    "AzureDeployment": "backend.chat.custom.model_deployments.azure",
+    "CohereDeployment": "backend.chat.custom.model_deployments.cohere_platform",
+    "SageMakerDeployment": "backend.chat.custom.model_deployments.sagemaker",
+}
+
+
+def __getattr__(name):
+    if name in _IMPLEMENTATIONS:
+        return getattr(importlib.import_module(_IMPLEMENTATIONS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     "AzureDeployment",
@@ -1,5 +1,5 @@
 import os
-from typing import Any, Dict, Generator, List
+from typing import Any, AsyncGenerator, Dict, Generator, List
 
 import cohere
 from cohere.types import StreamedChatResponse
@@ -22,11 +22,11 @@ class AzureDeployment(BaseDeployment):
     chat_endpoint_url = os.environ.get("AZURE_CHAT_ENDPOINT_URL")
 
     def __init__(self):
-        if not self.chat_endpoint_url.endswith("/v1"):
-            self.chat_endpoint_url = self.chat_endpoint_url + "/v1"
-        self.client = cohere.Client(
-            base_url=self.chat_endpoint_url, api_key=self.api_key
-        )
+        base_url = self.chat_endpoint_url
+        if not base_url.endswith("/v1"):
+            base_url = base_url + "/v1"
+        self.client = cohere.Client(base_url=base_url, api_key=self.api_key)
+        self.async_client = cohere.AsyncClient(base_url=base_url, api_key=self.api_key)
 
     @property
     def rerank_enabled(self) -> bool:
@@ -59,6 +59,22 @@ class AzureDeployment(BaseDeployment):
         for event in stream:
             yield event.__dict__
 
+    async def ainvoke_chat(self, chat_request: CohereChatRequest, **kwargs: Any) -> Any:
+        return await self.async_client.chat(
+            **chat_request.model_dump(exclude={"stream"}),
+            **kwargs,
+        )
+
+    async def ainvoke_chat_stream(
+        self, chat_request: CohereChatRequest, **kwargs: Any
+    ) -> AsyncGenerator[StreamedChatResponse, None]:
+        stream = self.async_client.chat_stream(
+            **chat_request.model_dump(exclude={"stream"}),
+            **kwargs,
+        )
+        async for event in stream:
+            yield event.__dict__
+
     def invoke_search_queries(
         self,
         message: str,
@@ -77,6 +93,24 @@ class AzureDeployment(BaseDeployment):
 
         return [s.text for s in res.search_queries]
 
+    async def ainvoke_search_queries(
+        self,
+        message: str,
+        chat_history: List[Dict[str, str]] | None = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        res = await self.async_client.chat(
+            message=message,
+            chat_history=chat_history,
+            search_queries_only=True,
+            **kwargs,
+        )
+
+        if not res.search_queries:
+            return []
+
+        return [s.text for s in res.search_queries]
+
     def invoke_rerank(
         self, query: str, documents: List[Dict[str, Any]], **kwargs: Any
     ) -> Any:
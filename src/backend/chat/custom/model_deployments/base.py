@@ -1,34 +1,57 @@
 from abc import abstractmethod
-from typing import Any, Dict, Generator, List
+from typing import TYPE_CHECKING, Any, AsyncGenerator, Dict, Generator, List
+from uuid import uuid4
 
-from cohere.types import StreamedChatResponse
+import anyio
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 
 from backend.schemas.cohere_chat import CohereChatRequest
 
+if TYPE_CHECKING:
+    # The cohere SDK is only imported by the deployments using it
+    from cohere.types import StreamedChatResponse
+
 
 class BaseDeployment:
     """Base for all model deployment options.
 
     rerank_enabled: bool: Whether the deployment supports reranking.
+    embed_enabled: bool: Whether the deployment supports embeddings.
     invoke_chat_stream: Generator[StreamedChatResponse, None, None]: Invoke the chat stream.
     invoke_search_queries: list[str]: Invoke the search queries.
     invoke_rerank: Any: Invoke the rerank.
     invoke_tools: Any: Invoke the tools.
     list_models: List[str]: List all models.
     is_available: bool: Check if the deployment is available.
+    history_token_budget: int: Tokens of chat history sent to the model.
+    documents_token_budget: int: Tokens of retrieved documents sent to the model.
+    invoke_summary: str: Invoke a one-off completion of a prompt, e.g: to summarize.
+    invoke_embed: List[List[float]]: Invoke the embeddings, if embed_enabled.
+
+    ainvoke_chat, ainvoke_chat_stream and ainvoke_search_queries are the async
+    variants used by the streaming endpoint. By default they run the sync
+    implementation in the threadpool, deployments with an async client should
+    override them so a stream does not hold a worker thread while it is open.
     """
 
+    history_token_budget = 3000
+    documents_token_budget = 2000
+
     @property
     @abstractmethod
     def rerank_enabled(self) -> bool: ...
 
+    @property
+    def embed_enabled(self) -> bool:
+        return False
+
     @abstractmethod
     def invoke_chat(self, chat_request: CohereChatRequest, **kwargs: Any) -> Any: ...
 
     @abstractmethod
     def invoke_chat_stream(
         self, chat_request: CohereChatRequest, **kwargs: Any
-    ) -> Generator[StreamedChatResponse, None, None]: ...
+    ) -> Generator["StreamedChatResponse", None, None]: ...
 
     @abstractmethod
     def invoke_search_queries(
@@ -46,6 +69,55 @@ class BaseDeployment:
     @abstractmethod
     def invoke_tools(self, message: str, tools: List[Any], **kwargs: Any) -> Any: ...
 
+    def invoke_summary(
+        self, prompt: str, max_tokens: int | None = None, **kwargs: Any
+    ) -> str:
+        # One-off request, not stored in any conversation
+        response = self.invoke_chat(
+            CohereChatRequest(
+                message=prompt,
+                user_msg_id=str(uuid4()),
+                bot_msg_id=str(uuid4()),
+                chat_history=[],
+                max_tokens=max_tokens,
+            ),
+            **kwargs,
+        )
+        return response.text
+
+    def invoke_embed(self, texts: List[str], **kwargs: Any) -> List[List[float]]:
+        raise NotImplementedError(
+            f"{self.__class__.__name__} does not support embeddings."
+        )
+
+    async def ainvoke_chat(self, chat_request: CohereChatRequest, **kwargs: Any) -> Any:
+        return await run_in_threadpool(self.invoke_chat, chat_request, **kwargs)
+
+    async def ainvoke_chat_stream(
+        self, chat_request: CohereChatRequest, **kwargs: Any
+    ) -> AsyncGenerator["StreamedChatResponse", None]:
+        # Only each next() call is run in the threadpool, not the whole stream
+        stream = iter(self.invoke_chat_stream(chat_request, **kwargs))
+        try:
+            async for event in iterate_in_threadpool(stream):
+                yield event
+        finally:
+            # Closes the upstream stream when the client disconnected
+            close = getattr(stream, "close", None)
+            if close is not None:
+                with anyio.CancelScope(shield=True):
+                    await run_in_threadpool(close)
+
+    async def ainvoke_search_queries(
+        self,
+        message: str,
+        chat_history: List[Dict[str, str]] | None = None,
+        **kwargs: Any
+    ) -> list[str]:
+        return await run_in_threadpool(
+            self.invoke_search_queries, message, chat_history, **kwargs
+        )
+
     @staticmethod
     def list_models() -> List[str]: ...
 
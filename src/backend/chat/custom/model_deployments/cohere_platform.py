@@ -1,7 +1,8 @@
 import logging
 import os
-from typing import Any, Dict, Generator, List
+from typing import Any, AsyncGenerator, Dict, Generator, List
 
+import anyio
 import cohere
 import requests
 import openai as ai
@@ -24,15 +25,35 @@ class CohereDeployment(BaseDeployment):
     api_key = os.environ.get("COHERE_API_KEY")
     openai_key = os.environ.get("OPENAI_API_KEY")
     client_name = "cohere-toolkit"
+    list_models_timeout = 10
+    # gpt-3.5-turbo has a 16k context, the rest is left for the answer
+    history_token_budget = 6000
+    documents_token_budget = 6000
 
     def __init__(self):
         self.client = cohere.Client(api_key=self.api_key, client_name=self.client_name)
         self.OAI_client = ai.Client(api_key=self.openai_key)
-        self.OAI_client = ai.Client(api_key=self.openai_key)
+        #Async clients used by the streaming endpoint, they do not hold a worker thread.
+        self.async_client = cohere.AsyncClient(
+            api_key=self.api_key, client_name=self.client_name
+        )
+        self.OAI_async_client = ai.AsyncClient(api_key=self.openai_key)
+
+    #Maps openAI stop reasons to cohere reasons
+    stop_reason_map = {
+        "stop": "COMPLETE",
+        "length": "MAX_TOKENS",
+        "content_filter" : "ERROR_TOXIC"
+    }
+
     @property
     def rerank_enabled(self) -> bool:
         return True
 
+    @property
+    def embed_enabled(self) -> bool:
+        return True
+
     @classmethod
     def list_models(cls) -> List[str]:
         if not CohereDeployment.is_available():
@@ -44,7 +65,9 @@ class CohereDeployment(BaseDeployment):
             "authorization": f"Bearer {cls.api_key}",
         }
 
-        response = requests.get(url, headers=headers)
+        response = requests.get(
+            url, headers=headers, timeout=cls.list_models_timeout
+        )
 
         if not response.ok:
             logging.warning("Couldn't get models from Cohere API.")
@@ -76,56 +99,39 @@ class CohereDeployment(BaseDeployment):
         """
 
         print("INVOKE_CHAT")
-        prompt = chat_request.message
-
-        #Pull out paramters for renaming.
-        n = chat_request.k
-        top_p = chat_request.p
-
-        #We need to convert to openAI format, chat history needs reformatting.
-
-        messages = []
-        chat_request.chat_history.append(ChatMessage(role=ChatRole.USER, message=prompt)) #Add the latest prompt in cohere format.
-
-        #Reformat
-        for chat_msg in chat_request.chat_history:
-            chat_msg = chat_msg.to_openAI_dict()
-            messages.append(chat_msg)
-
-        #OpenAI return classes
-        # J = ChatCompletion()
-        # H = ChatCompletionMessage()
-        # K = Choice()
-        # U = FinishReason
+        chat_request.chat_history.append(ChatMessage(role=ChatRole.USER, message=chat_request.message)) #Add the latest prompt in cohere format.
 
         try: 
             openai_response = self.OAI_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-                messages=messages,
-                n=n,
-                top_p=top_p,
-                **chat_request.model_dump(include={"tempature", "frequency_p", "max_tokens", "precense_penalty"}),
+                **self._build_openai_params(chat_request),
                 **kwargs,
             )
         except:
             print("API limit reached, please try again in one minute.")
             return NonStreamedChatResponse(text="", chat_history=chat_request.chat_history, finish_reason="ERROR_LIMIT")
 
-        # Maps openAI stop reasons to cohere reasons
-        stop_reason_map = {
-            "stop": "COMPLETE", 
-            "length": "MAX_TOKENS", 
-            "content_filter" : "ERROR_TOXIC"
-        }
+        return self._build_non_streamed_response(chat_request, openai_response)
 
-        #We need to rebuild a NonStreamedChatResponse so it works with the rest of the software.
-        reformated_response = NonStreamedChatResponse(
-            text=openai_response.choices[0].message.content,
-            chat_history=chat_request.chat_history,
-            finish_reason=stop_reason_map[openai_response.choices[0].finish_reason]
-        )
+    async def ainvoke_chat(self, chat_request: CohereChatRequest, **kwargs: Any) -> Any:
+        """
+        Async variant of invoke_chat using the async openAI client.
+        """
+        chat_request.chat_history.append(ChatMessage(role=ChatRole.USER, message=chat_request.message)) #Add the latest prompt in cohere format.
+
+        # Only API errors are answered, a cancelled request stays cancelled
+        try:
+            openai_response = await self.OAI_async_client.chat.completions.create(
+                **self._build_openai_params(chat_request),
+                **kwargs,
+            )
+        except ai.RateLimitError:
+            logging.warning("API limit reached, please try again in one minute.")
+            return NonStreamedChatResponse(text="", chat_history=chat_request.chat_history, finish_reason="ERROR_LIMIT")
+        except ai.APIError as e:
+            logging.warning(f"OpenAI API error: {e}")
+            return NonStreamedChatResponse(text="", chat_history=chat_request.chat_history, finish_reason="ERROR")
 
-        return reformated_response
+        return self._build_non_streamed_response(chat_request, openai_response)
 
     def invoke_chat_stream_1(
         self, chat_request: CohereChatRequest, **kwargs: Any
@@ -152,88 +158,128 @@ class CohereDeployment(BaseDeployment):
         \n then rebuilds it back into a cohere-api chat response.
         \n two step process where we reformat the NonStreamedChatResponse and the generator fields.
         """        
-        prompt = chat_request.message
+        openai_response = self.OAI_client.chat.completions.create(
+            **self._build_openai_params(chat_request),
+            stream=True, #We want streaming here!
+            **kwargs,
+        )
 
-        #Pull out paramters for renaming.
-        n = chat_request.k
-        top_p = chat_request.p
+        #Closing the generator (client disconnected) closes the HTTP stream.
+        with openai_response:
+            #Yield the first formatted dictioanry (stream start)
+            yield self._stream_start_event()
 
-        #We need to convert to openAI format, chat history needs reformatting.
-        messages = []
-        #chat_request.chat_history.append(ChatMessage(role=ChatRole.USER, message=prompt)) #If the conversation is empty, start one.
+            #here we create all the intermediate generated tokens for the generator.
+            total_response = ""
+            reformatted_stop_reason = None
 
-        #Reformat the chat history for openAI API
-        for chat_msg in chat_request.chat_history:
-            chat_msg = chat_msg.to_openAI_dict()
-            messages.append(chat_msg)
-        
-        print("XSdadasdaisdhi1uy23y12ugeadbahjsdgakjsdhaksjhdaksjhdczmxnb")
-        #print(messages)
+            for event in openai_response:
+                choice = event.choices[0] #Grab the first choice.
 
-        try: 
-            openai_response = self.OAI_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                n=n,
-                top_p=top_p,
-                stream=True, #We want streaming here!
-                **chat_request.model_dump(include={"tempature", "frequency_p", "max_tokens", "precense_penalty"}),
-                **kwargs,
-            )
-        except self.OAI_client.request():
-            print("API limit reached, please try again in one minute.")
-            print(openai_response)
+                #Check if the generation process is finished.
+                if choice.finish_reason is None:
+                    total_response += choice.delta.content #Add intermediate token to total response
 
-        #Maps openAI stop reasons to cohere reasons
-        stop_reason_map = {
-            "stop": "COMPLETE", 
-            "length": "MAX_TOKENS", 
-            "content_filter" : "ERROR_TOXIC"
-        }
+                    #Yield intermediate token if not finished
+                    yield self._text_generation_event(choice.delta.content)
+                else: reformatted_stop_reason = self.stop_reason_map[choice.finish_reason] #It is stopped, so grab the reason.
 
-        #Yield the first formatted dictioanry (stream start)
-        yield {
-            'generation_id' : str(uuid.uuid4()),
-            'event_type' : StreamEvent.STREAM_START,
-            'is_finished' : False#,
-            # 'conversation_id' : chat_request.conversation_id 
+        #Yield final formatted dictionary with total response. (stream end)
+        yield self._stream_end_event(chat_request, total_response, reformatted_stop_reason)
 
-        }
-        
-        #here we create all the intermediate generated tokens for the generator.
+    async def ainvoke_chat_stream(
+        self, chat_request: CohereChatRequest, **kwargs: Any
+    ) -> AsyncGenerator[StreamedChatResponse, None]:
+        """
+        Async variant of invoke_chat_stream using the async openAI client,
+        so an open stream does not hold a worker thread.
+        """
+        openai_response = await self.OAI_async_client.chat.completions.create(
+            **self._build_openai_params(chat_request),
+            stream=True,
+            **kwargs,
+        )
 
         total_response = ""
+        reformatted_stop_reason = None
 
-        for event in openai_response:
-            choice = event.__dict__['choices'][0] #Grab the first choice.
+        try:
+            yield self._stream_start_event()
 
-            #Check if the generation process is finished.
-            if choice.finish_reason == None: 
-                total_response += choice.delta.content #Add intermediate token to total response
+            async for event in openai_response:
+                choice = event.choices[0]
 
-                #Yield intermediate token if not finished
-                yield {
-                    'text' : choice.delta.content,
-                    'event_type' : StreamEvent.TEXT_GENERATION,
-                    'is_finished' : False
-                }
-            else: reformatted_stop_reason = stop_reason_map[choice.finish_reason] #It is stopped, so grab the reason.
+                if choice.finish_reason is None:
+                    total_response += choice.delta.content
+                    yield self._text_generation_event(choice.delta.content)
+                else:
+                    reformatted_stop_reason = self.stop_reason_map[choice.finish_reason]
+        finally:
+            #Stops the upstream generation when the client disconnected mid-answer,
+            #shielded as the cancelled request scope would interrupt the close.
+            with anyio.CancelScope(shield=True):
+                await openai_response.close()
+
+        yield self._stream_end_event(chat_request, total_response, reformatted_stop_reason)
+
+    def _build_openai_params(self, chat_request: CohereChatRequest) -> Dict[str, Any]:
+        """
+        Reformats a coherechatrequest into the keyword arguments of an openAI chat completion call.
+        """
+        #We need to convert to openAI format, chat history needs reformatting.
+        messages = [chat_msg.to_openAI_dict() for chat_msg in chat_request.chat_history]
+
+        #Pull out paramters for renaming.
+        params = {
+            "model": "gpt-3.5-turbo",
+            "messages": messages,
+            "n": chat_request.k,
+            "top_p": chat_request.p,
+            **chat_request.model_dump(include={"temperature", "frequency_penalty", "max_tokens", "presence_penalty"}, exclude_none=True),
+        }
+        #A fixed seed makes the answer reproducible, openAI expects an integer.
+        if chat_request.seed is not None:
+            params["seed"] = int(chat_request.seed)
+        return params
+
+    def _build_non_streamed_response(
+        self, chat_request: CohereChatRequest, openai_response: ChatCompletion
+    ) -> NonStreamedChatResponse:
+        #We need to rebuild a NonStreamedChatResponse so it works with the rest of the software.
+        return NonStreamedChatResponse(
+            text=openai_response.choices[0].message.content,
+            chat_history=chat_request.chat_history,
+            finish_reason=self.stop_reason_map[openai_response.choices[0].finish_reason]
+        )
+
+    def _stream_start_event(self) -> Dict[str, Any]:
+        return {
+            'generation_id' : str(uuid.uuid4()),
+            'event_type' : StreamEvent.STREAM_START,
+            'is_finished' : False
+        }
 
-        #Add the latest chatbot response in cohere format.
-        #chat_request.chat_history.append(ChatMessage(role=ChatRole.CHATBOT, message=total_response))
+    def _text_generation_event(self, text: str) -> Dict[str, Any]:
+        return {
+            'text' : text,
+            'event_type' : StreamEvent.TEXT_GENERATION,
+            'is_finished' : False
+        }
 
+    def _stream_end_event(
+        self, chat_request: CohereChatRequest, total_response: str, finish_reason: str | None
+    ) -> Dict[str, Any]:
         #We need to rebuild a NonStreamedChatResponse so it works with the rest of the software. This is for the total and final output.
         reformated_response = NonStreamedChatResponse(
             text=total_response,
             chat_history=chat_request.chat_history,
-            finish_reason=reformatted_stop_reason,
+            finish_reason=finish_reason,
             conversation_id=chat_request.conversation_id
         )
 
-        #Yield final formatted dictionary with total response. (stream end)
-        yield {
+        return {
             "response" : reformated_response, 
-            "finish_reason" : reformatted_stop_reason,
+            "finish_reason" : finish_reason,
             "event_type" : StreamEvent.STREAM_END,
             "is_finished" : True,
             "tokens" : None,
@@ -259,6 +305,24 @@ class CohereDeployment(BaseDeployment):
 
         return [s.text for s in res.search_queries]
 
+    async def ainvoke_search_queries(
+        self,
+        message: str,
+        chat_history: List[Dict[str, str]] | None = None,
+        **kwargs: Any,
+    ) -> list[str]:
+        res = await self.async_client.chat(
+            message=message,
+            chat_history=chat_history,
+            search_queries_only=True,
+            **kwargs,
+        )
+
+        if not res.search_queries:
+            return []
+
+        return [s.text for s in res.search_queries]
+
     def invoke_rerank(
         self, query: str, documents: List[Dict[str, Any]], **kwargs: Any
     ) -> Any:
@@ -266,6 +330,14 @@ class CohereDeployment(BaseDeployment):
             query=query, documents=documents, model="rerank-english-v2.0", **kwargs
         )
 
+    def invoke_embed(self, texts: List[str], **kwargs: Any) -> List[List[float]]:
+        return self.client.embed(
+            texts=texts,
+            model="embed-english-v3.0",
+            input_type="search_query",
+            **kwargs,
+        ).embeddings
+
     def invoke_tools(self, message: str, tools: List[Any], **kwargs: Any) -> List[Any]:
         return self.client.chat(
             message=message, tools=tools, model="command-r", **kwargs
@@ -1,6 +1,15 @@
+import threading
+
 from backend.chat.custom.model_deployments.base import BaseDeployment
 from backend.config.deployments import AVAILABLE_MODEL_DEPLOYMENTS, ModelDeploymentName
 
+# Deployment instances are shared across requests so their HTTP clients
+# keep their connection pools, deployments must not hold per-request state.
+# Keyed by name with the class they were created from, a name now served by
+# another class (e.g: patched in tests) gets a new instance.
+_deployment_instances: dict[str, tuple[type[BaseDeployment], BaseDeployment]] = {}
+_deployment_instances_lock = threading.Lock()
+
 
 def get_deployment(deployment_name) -> BaseDeployment:
     """Get the deployment implementation.
@@ -9,7 +18,7 @@ def get_deployment(deployment_name) -> BaseDeployment:
         deployment (str): Deployment name.
 
     Returns:
-        BaseDeployment: Deployment implementation instance based on the deployment name.
+        BaseDeployment: Shared deployment implementation instance based on the deployment name.
 
     Raises:
         ValueError: If the deployment is not supported.
@@ -18,13 +27,33 @@ def get_deployment(deployment_name) -> BaseDeployment:
 
     # Check provided deployment against config const
     if deployment is not None and deployment.is_available:
-        return deployment.deployment_class(**deployment.kwargs)
+        return _get_or_create_instance(deployment_name, deployment, deployment.kwargs)
 
     # Fallback to first available deployment
-    for deployment in AVAILABLE_MODEL_DEPLOYMENTS.values():
+    for name, deployment in AVAILABLE_MODEL_DEPLOYMENTS.items():
         if deployment.is_available:
-            return deployment.deployment_class()
+            return _get_or_create_instance(name, deployment, {})
 
     raise ValueError(
         f"Deployment {deployment_name} is not supported, and no available deployments were found."
     )
+
+
+def _get_or_create_instance(name, deployment, kwargs) -> BaseDeployment:
+    deployment_class = deployment.deployment_class
+    cached = _deployment_instances.get(name)
+    if cached is not None and cached[0] is deployment_class:
+        return cached[1]
+
+    with _deployment_instances_lock:
+        cached = _deployment_instances.get(name)
+        if cached is None or cached[0] is not deployment_class:
+            cached = (deployment_class, deployment_class(**kwargs))
+            _deployment_instances[name] = cached
+        return cached[1]
+
+
+def clear_deployment_instances() -> None:
+    """Drop the shared deployment instances, e.g: after a configuration change."""
+    with _deployment_instances_lock:
+        _deployment_instances.clear()
@@ -15,6 +15,9 @@ class SageMakerDeployment(BaseDeployment):
     SageMaker Deployment.
     How to setup SageMaker with Cohere:
     https://docs.cohere.com/docs/amazon-sagemaker-setup-guide
+
+    boto3 has no asyncio client, so the async variants from BaseDeployment are used:
+    each read of the response stream runs in the threadpool instead of the whole stream.
     """
 
     DEFAULT_MODELS = ["sagemaker-command"]
@@ -23,9 +26,10 @@ class SageMakerDeployment(BaseDeployment):
     endpoint_name = os.environ.get("SAGE_MAKER_ENDPOINT_NAME")
 
     def __init__(self):
-        boto3.setup_default_session(profile_name=self.profile_name)
-        # Create the AWS client for the Bedrock runtime with boto3
-        self.client = boto3.client("sagemaker-runtime", region_name=self.region_name)
+        # boto3 clients are thread safe but sessions are not, the client is created
+        # from its own session instead of changing the process wide default one
+        session = boto3.Session(profile_name=self.profile_name)
+        self.client = session.client("sagemaker-runtime", region_name=self.region_name)
         self.params = {
             "EndpointName": self.endpoint_name,
             "ContentType": "application/json",
@@ -63,10 +67,10 @@ class SageMakerDeployment(BaseDeployment):
             "chat_history": [x.to_dict() for x in chat_request.chat_history],
             "documents": chat_request.documents,
         }
-        self.params["Body"] = json.dumps(json_params)
+        params = {**self.params, "Body": json.dumps(json_params)}
 
         # Invoke the model and print the response
-        result = self.client.invoke_endpoint_with_response_stream(**self.params)
+        result = self.client.invoke_endpoint_with_response_stream(**params)
         event_stream = result["Body"]
         for index, line in enumerate(SageMakerDeployment.LineIterator(event_stream)):
             stream_event = json.loads(line.decode())
@@ -85,10 +89,10 @@ class SageMakerDeployment(BaseDeployment):
             "message": message,
             "chat_history": chat_history,
         }
-        self.params["Body"] = json.dumps(json_params)
+        params = {**self.params, "Body": json.dumps(json_params)}
 
         # Invoke the model and print the response
-        result = self.client.invoke_endpoint(**self.params)
+        result = self.client.invoke_endpoint(**params)
         response = json.loads(result["Body"].read().decode())
         return [s["text"] for s in response["search_queries"]]
 
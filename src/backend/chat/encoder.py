@@ -0,0 +1,64 @@
+"""
+Encoders for the SSE chat stream events.
+
+Text generation events are sent once per token, so they skip the Pydantic model,
+jsonable_encoder and json.dumps round trip: the envelope is precompiled and only the
+text is escaped. The output is identical to encode_chat_response_event, which is
+used for every other event type.
+"""
+
+import json
+from json.encoder import encode_basestring_ascii
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+
+from backend.schemas.chat import ChatResponse, ChatResponseEvent
+
+_TEXT_GENERATION_PREFIX = '{"event": "text-generation", "data": {"is_finished": '
+_TEXT_GENERATION_TEXT = {
+    True: _TEXT_GENERATION_PREFIX + 'true, "text": ',
+    False: _TEXT_GENERATION_PREFIX + 'false, "text": ',
+}
+
+
+def encode_chat_response_event(stream_event: ChatResponse) -> str:
+    """
+    Encode any stream event as a ChatResponseEvent.
+
+    Args:
+        stream_event (ChatResponse): Stream event.
+
+    Returns:
+        str: JSON representation of the chat response event.
+    """
+    return json.dumps(
+        jsonable_encoder(
+            ChatResponseEvent(
+                event=stream_event.event_type.value,
+                data=stream_event,
+            )
+        )
+    )
+
+
+def encode_text_generation(text: str, is_finished: bool = False) -> str:
+    """
+    Encode a text generation event, same output as
+    encode_chat_response_event(StreamTextGeneration(text=text, is_finished=is_finished)).
+
+    Args:
+        text (str): Generated text.
+        is_finished (bool): Whether the chat stream has finished.
+
+    Returns:
+        str: JSON representation of the chat response event.
+    """
+    return _TEXT_GENERATION_TEXT[bool(is_finished)] + encode_basestring_ascii(text) + "}}"
+
+
+def is_fast_text_generation(event: dict[str, Any]) -> bool:
+    """Whether a raw text generation event can be encoded without validation."""
+    return isinstance(event.get("text"), str) and isinstance(
+        event.get("is_finished"), bool
+    )
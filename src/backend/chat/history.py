@@ -0,0 +1,153 @@
+"""
+Token budgeted chat history.
+
+The history sent to the model keeps the latest messages that fit in the token
+budget of the deployment, plus the pinned messages (annotation responses) which
+are always kept. Token counts are stored on the messages when they are written,
+so building the history never tokenizes the conversation again.
+
+CHAT_HISTORY_TOKEN_BUDGET overrides the budget of every deployment. Only the
+latest CHAT_HISTORY_MAX_MESSAGES messages of a conversation and its pinned
+messages are loaded for a turn.
+
+With USE_CONVERSATION_SUMMARY, the messages older than the window are folded in
+a rolling summary of the conversation (see chat/summary.py) which is sent ahead
+of the window and counts against the budget.
+"""
+
+import os
+from distutils.util import strtobool
+
+from backend.chat.custom.model_deployments.base import BaseDeployment
+from backend.config.deployments import AVAILABLE_MODEL_DEPLOYMENTS
+from backend.models.conversation import Conversation
+from backend.models.message import Message
+from backend.services.tokens import count_tokens
+
+CHAT_HISTORY_TOKEN_BUDGET = os.getenv("CHAT_HISTORY_TOKEN_BUDGET")
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "200"))
+USE_CONVERSATION_SUMMARY = bool(
+    strtobool(os.getenv("USE_CONVERSATION_SUMMARY", "false"))
+)
+
+
+def get_history_token_budget(deployment_name: str | None) -> int:
+    """
+    Get the chat history token budget of a deployment.
+
+    Args:
+        deployment_name (str | None): Deployment name.
+
+    Returns:
+        int: Token budget of the chat history.
+    """
+    if CHAT_HISTORY_TOKEN_BUDGET:
+        return int(CHAT_HISTORY_TOKEN_BUDGET)
+
+    deployment = (
+        AVAILABLE_MODEL_DEPLOYMENTS.get(deployment_name) if deployment_name else None
+    )
+    if deployment is None:
+        return BaseDeployment.history_token_budget
+    return deployment.deployment_class.history_token_budget
+
+
+def get_message_token_count(message: Message) -> int:
+    """
+    Get the token count of a message, messages stored before token counts
+    existed are counted once and the count is saved with the transaction.
+
+    Args:
+        message (Message): Message.
+
+    Returns:
+        int: Number of tokens of the message text.
+    """
+    if message.token_count is None:
+        message.token_count = count_tokens(message.text)
+    return message.token_count
+
+
+def window_chat_history(messages: list[Message], token_budget: int) -> list[Message]:
+    """
+    Select the messages of the chat history that fit in the token budget.
+
+    Args:
+        messages (list[Message]): Conversation messages, in position order.
+        token_budget (int): Token budget of the chat history.
+
+    Returns:
+        list[Message]: Latest messages within the budget and the pinned ones, in order.
+    """
+    if not messages:
+        return []
+
+    # The latest message, the user message of the turn, and the pinned messages
+    # are always kept
+    last_index = len(messages) - 1
+    selected = {last_index} | {
+        index
+        for index, message in enumerate(messages)
+        if message.is_annotation_response
+    }
+    used_tokens = sum(get_message_token_count(messages[index]) for index in selected)
+
+    for index in range(last_index - 1, -1, -1):
+        if index in selected:
+            continue
+        token_count = get_message_token_count(messages[index])
+        if used_tokens + token_count > token_budget:
+            break
+        used_tokens += token_count
+        selected.add(index)
+
+    return [messages[index] for index in sorted(selected)]
+
+
+def get_conversation_summary(conversation: Conversation) -> str | None:
+    """
+    Get the rolling summary of a conversation, if summaries are enabled.
+
+    Args:
+        conversation (Conversation): Conversation.
+
+    Returns:
+        str | None: Summary of the messages up to summary_position.
+    """
+    if not USE_CONVERSATION_SUMMARY or not conversation.summary:
+        return None
+    return conversation.summary
+
+
+def window_conversation(
+    conversation: Conversation,
+    token_budget: int,
+    messages: list[Message] | None = None,
+) -> tuple[str | None, list[Message]]:
+    """
+    Select the summary and the messages of the chat history of a conversation.
+
+    Args:
+        conversation (Conversation): Conversation.
+        token_budget (int): Token budget of the chat history.
+        messages (list[Message] | None): Messages to window in position order,
+            all the messages of the conversation by default.
+
+    Returns:
+        tuple[str | None, list[Message]]: Summary, and the messages after it within the budget.
+    """
+    if messages is None:
+        messages = conversation.messages
+    summary = get_conversation_summary(conversation)
+    if summary is None:
+        return None, window_chat_history(messages, token_budget)
+
+    # The summarized messages are only kept when pinned
+    messages = [
+        message
+        for message in messages
+        if message.position > conversation.summary_position
+        or message.is_annotation_response
+    ]
+    token_budget = max(token_budget - count_tokens(summary), 0)
+    return summary, window_chat_history(messages, token_budget)
@@ -0,0 +1,240 @@
+"""
+Rolling summaries of long conversations.
+
+Every CONVERSATION_SUMMARY_INTERVAL turns, the messages that fell out of the
+chat history window since the last summary are folded into the conversation
+summary, in a background thread once the turn is done. The summary is sent
+ahead of the window (see chat/history.py), so the prompt size stays roughly
+constant however long the conversation gets.
+
+At most CONVERSATION_SUMMARY_INPUT_TOKENS of messages are folded per refresh,
+the oldest first, the rest is folded by the next refreshes.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, ContextManager
+
+from sqlalchemy.orm import Session
+
+from backend.chat.custom.model_deployments.deployment import get_deployment
+from backend.chat.history import (
+    USE_CONVERSATION_SUMMARY,
+    get_history_token_budget,
+    get_message_token_count,
+    window_conversation,
+)
+from backend.crud import conversation as conversation_crud
+from backend.models.conversation import Conversation
+from backend.models.message import Message
+from backend.services.logger import get_logger
+
+CONVERSATION_SUMMARY_INTERVAL = int(os.getenv("CONVERSATION_SUMMARY_INTERVAL", "5"))
+CONVERSATION_SUMMARY_MAX_TOKENS = int(
+    os.getenv("CONVERSATION_SUMMARY_MAX_TOKENS", "400")
+)
+CONVERSATION_SUMMARY_INPUT_TOKENS = int(
+    os.getenv("CONVERSATION_SUMMARY_INPUT_TOKENS", "6000")
+)
+
+SUMMARY_PROMPT = """Update the summary of a conversation between a user and an assistant with the new messages below.
+Keep the facts, names, decisions, annotations and open questions the assistant needs to continue the conversation.
+Answer with the updated summary only, in at most {max_words} words.
+
+Summary so far:
+{summary}
+
+New messages:
+{messages}"""
+
+logger = get_logger()
+
+_executor: ThreadPoolExecutor | None = None
+_refreshing: set[str] = set()
+_lock = threading.Lock()
+
+
+def should_refresh_summary(message_position: int) -> bool:
+    """
+    Whether the summary is refreshed after the chatbot message of a turn.
+
+    Args:
+        message_position (int): Position of the chatbot message of the turn.
+
+    Returns:
+        bool: True every CONVERSATION_SUMMARY_INTERVAL turns.
+    """
+    if not USE_CONVERSATION_SUMMARY or CONVERSATION_SUMMARY_INTERVAL <= 0:
+        return False
+    # The user and chatbot messages of a turn share its position
+    turn = message_position + 1
+    return turn % CONVERSATION_SUMMARY_INTERVAL == 0
+
+
+def get_messages_to_summarize(
+    conversation: Conversation, token_budget: int
+) -> list[Message]:
+    """
+    Get the messages out of the chat history window that are not summarized yet.
+
+    Args:
+        conversation (Conversation): Conversation with its messages.
+        token_budget (int): Token budget of the chat history.
+
+    Returns:
+        list[Message]: Oldest of those messages, within CONVERSATION_SUMMARY_INPUT_TOKENS
+            except for the end of the last turn.
+    """
+    _, window = window_conversation(conversation, token_budget)
+    # Pinned messages are kept whatever their position, the window starts at
+    # the oldest message kept for fitting in the budget
+    window_start = min(
+        (
+            message.position
+            for message in window
+            if not message.is_annotation_response
+        ),
+        default=None,
+    )
+    summary_position = (
+        conversation.summary_position if conversation.summary is not None else -1
+    )
+
+    messages = []
+    used_tokens = 0
+    for message in conversation.messages:
+        if window_start is not None and message.position >= window_start:
+            break
+        if message.position <= summary_position or message.is_annotation_response:
+            continue
+        used_tokens += get_message_token_count(message)
+        # Only stops between turns: the summary position covers the whole turn
+        if (
+            messages
+            and used_tokens > CONVERSATION_SUMMARY_INPUT_TOKENS
+            and message.position != messages[-1].position
+        ):
+            break
+        messages.append(message)
+    return messages
+
+
+def build_summary_prompt(summary: str | None, messages: list[Message]) -> str:
+    """
+    Build the prompt folding messages into the summary.
+
+    Args:
+        summary (str | None): Current summary.
+        messages (list[Message]): Messages to fold, in position order.
+
+    Returns:
+        str: Summary prompt.
+    """
+    return SUMMARY_PROMPT.format(
+        # Roughly 3 words per 4 tokens
+        max_words=CONVERSATION_SUMMARY_MAX_TOKENS * 3 // 4,
+        summary=summary or "(empty)",
+        messages="\n".join(
+            f"{message.agent.value}: {message.text}" for message in messages
+        ),
+    )
+
+
+def refresh_conversation_summary(
+    session_factory: Callable[[], ContextManager[Session]],
+    conversation_id: str,
+    user_id: str,
+    deployment_name: str | None,
+) -> bool:
+    """
+    Fold the messages that fell out of the chat history window into the summary.
+
+    Args:
+        session_factory (Callable[[], ContextManager[Session]]): Factory of short-lived sessions.
+        conversation_id (str): Conversation ID.
+        user_id (str): User ID.
+        deployment_name (str | None): Deployment used to summarize.
+
+    Returns:
+        bool: Whether the summary was updated.
+    """
+    # The connection is not held while the summary is generated
+    with session_factory() as session:
+        conversation = conversation_crud.get_conversation_with_messages(
+            session, conversation_id, user_id
+        )
+        if conversation is None:
+            return False
+        messages = get_messages_to_summarize(
+            conversation, get_history_token_budget(deployment_name)
+        )
+        if not messages:
+            return False
+        prompt = build_summary_prompt(conversation.summary, messages)
+        summary_position = messages[-1].position
+
+    summary = get_deployment(deployment_name).invoke_summary(
+        prompt, max_tokens=CONVERSATION_SUMMARY_MAX_TOKENS
+    )
+    if not summary:
+        return False
+
+    with session_factory() as session:
+        conversation_crud.update_conversation_summary(
+            session, conversation_id, user_id, summary, summary_position
+        )
+    return True
+
+
+def _refresh(
+    session_factory: Callable[[], ContextManager[Session]],
+    conversation_id: str,
+    user_id: str,
+    deployment_name: str | None,
+) -> None:
+    try:
+        refresh_conversation_summary(
+            session_factory, conversation_id, user_id, deployment_name
+        )
+    except Exception:
+        logger.exception(f"Couldn't refresh the summary of {conversation_id}.")
+    finally:
+        with _lock:
+            _refreshing.discard(conversation_id)
+
+
+def schedule_summary_refresh(
+    session_factory: Callable[[], ContextManager[Session]],
+    conversation_id: str,
+    user_id: str,
+    deployment_name: str | None,
+    message_position: int,
+) -> None:
+    """
+    Refresh the summary of a conversation in the background, if it is due.
+    At most one refresh runs per conversation.
+
+    Args:
+        session_factory (Callable[[], ContextManager[Session]]): Factory of short-lived sessions.
+        conversation_id (str): Conversation ID.
+        user_id (str): User ID.
+        deployment_name (str | None): Deployment used to summarize.
+        message_position (int): Position of the chatbot message of the turn.
+    """
+    global _executor
+    if not should_refresh_summary(message_position):
+        return
+
+    with _lock:
+        if conversation_id in _refreshing:
+            return
+        _refreshing.add(conversation_id)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=2, thread_name_prefix="conversation-summary"
+            )
+
+    _executor.submit(
+        _refresh, session_factory, conversation_id, user_id, deployment_name
+    )
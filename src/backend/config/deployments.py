@@ -3,9 +3,7 @@ import os
 from distutils.util import strtobool
 from enum import StrEnum
 
-from backend.chat.custom.model_deployments.azure import AzureDeployment
-from backend.chat.custom.model_deployments.cohere_platform import CohereDeployment
-from backend.chat.custom.model_deployments.sagemaker import SageMakerDeployment
+from backend.config.registry import LazyRegistry
 from backend.schemas.deployment import Deployment
 
 
@@ -18,41 +16,61 @@ class ModelDeploymentName(StrEnum):
 use_community_features = bool(strtobool(os.getenv("USE_COMMUNITY_FEATURES", "false")))
 
 
-ALL_MODEL_DEPLOYMENTS = {
-    ModelDeploymentName.CoherePlatform: Deployment(
+def cohere_platform_deployment() -> Deployment:
+    from backend.chat.custom.model_deployments.cohere_platform import (
+        CohereDeployment,
+    )
+
+    return Deployment(
         name=ModelDeploymentName.CoherePlatform,
         deployment_class=CohereDeployment,
-        models=CohereDeployment.list_models(),
         is_available=CohereDeployment.is_available(),
         env_vars=[
             "COHERE_API_KEY",
         ],
-    ),
-    ModelDeploymentName.SageMaker: Deployment(
+    )
+
+
+def sagemaker_deployment() -> Deployment:
+    from backend.chat.custom.model_deployments.sagemaker import SageMakerDeployment
+
+    return Deployment(
         name=ModelDeploymentName.SageMaker,
         deployment_class=SageMakerDeployment,
-        models=SageMakerDeployment.list_models(),
         is_available=SageMakerDeployment.is_available(),
         env_vars=[
             "SAGE_MAKER_REGION_NAME",
             "SAGE_MAKER_ENDPOINT_NAME",
             "SAGE_MAKER_PROFILE_NAME",
         ],
-    ),
-    ModelDeploymentName.Azure: Deployment(
+    )
+
+
+def azure_deployment() -> Deployment:
+    from backend.chat.custom.model_deployments.azure import AzureDeployment
+
+    return Deployment(
         name=ModelDeploymentName.Azure,
         deployment_class=AzureDeployment,
-        models=AzureDeployment.list_models(),
         is_available=AzureDeployment.is_available(),
         env_vars=[
             "AZURE_API_KEY",
             "AZURE_CHAT_ENDPOINT_URL",
         ],
-    ),
-}
+    )
+
+
+# Deployments are built on first access, see backend.config.registry
+ALL_MODEL_DEPLOYMENTS = LazyRegistry(
+    {
+        ModelDeploymentName.CoherePlatform: cohere_platform_deployment,
+        ModelDeploymentName.SageMaker: sagemaker_deployment,
+        ModelDeploymentName.Azure: azure_deployment,
+    }
+)
 
 
-def get_available_deployments() -> dict[ModelDeploymentName, Deployment]:
+def get_available_deployments() -> LazyRegistry:
     if use_community_features:
         try:
             from community.config.deployments import (
@@ -0,0 +1,83 @@
+"""
+Registry whose entries are built on first access.
+
+The tool and deployment registries hold loaders instead of instances, a loader
+imports the implementation (and its SDK: langchain, cohere, boto3...) only when
+the entry is first read. Importing the app stays cheap, and a worker only pays
+for the implementations it actually uses.
+
+Listing the keys, checking membership, copying and merging registries never
+runs a loader.
+"""
+
+import threading
+from collections.abc import MutableMapping
+from typing import Any, Callable, Iterator
+
+
+class LazyRegistry(MutableMapping):
+    """Mapping of keys to values built by their loader on first access."""
+
+    def __init__(self, loaders: dict[Any, Callable[[], Any]] | None = None):
+        self._loaders: dict[Any, Callable[[], Any]] = dict(loaders or {})
+        self._values: dict[Any, Any] = {}
+        # Reentrant, a loader may read another entry of the registry
+        self._lock = threading.RLock()
+
+    def __getitem__(self, key: Any) -> Any:
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+
+        loader = self._loaders[key]
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = loader()
+            return self._values[key]
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._loaders[key] = lambda: value
+            self._values[key] = value
+
+    def __delitem__(self, key: Any) -> None:
+        with self._lock:
+            del self._loaders[key]
+            self._values.pop(key, None)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(list(self._loaders))
+
+    def __len__(self) -> int:
+        return len(self._loaders)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._loaders
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({list(self._loaders)})"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._loaders.clear()
+            self._values.clear()
+
+    def is_loaded(self, key: Any) -> bool:
+        """Whether the entry has already been built."""
+        return key in self._values
+
+    def copy(self) -> "LazyRegistry":
+        registry = LazyRegistry(self._loaders)
+        registry._values = dict(self._values)
+        return registry
+
+    def update(self, other: Any = (), /, **kwargs: Any) -> None:
+        if isinstance(other, LazyRegistry):
+            with self._lock:
+                self._loaders.update(other._loaders)
+                for key in other._loaders:
+                    self._values.pop(key, None)
+                self._values.update(other._values)
+            other = ()
+        super().update(other, **kwargs)
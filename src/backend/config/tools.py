@@ -3,16 +3,8 @@ import os
 from distutils.util import strtobool
 from enum import StrEnum
 
+from backend.config.registry import LazyRegistry
 from backend.schemas.tool import Category, ManagedTool
-from backend.tools.function_tools import (
-    CalculatorFunctionTool,
-    PythonInterpreterFunctionTool,
-)
-from backend.tools.retrieval import (
-    LangChainVectorDBRetriever,
-    LangChainWikiRetriever,
-    TavilyInternetSearch,
-)
 
 """
 List of available tools. Each tool should have a name, implementation, is_visible and category. 
@@ -23,6 +15,9 @@ If a tool is not visible, it will not be shown in the frontend.
 
 If you want to add a new tool, check the instructions on how to implement a retriever in the documentation.
 Don't forget to add the implementation to this AVAILABLE_TOOLS dictionary!
+
+Each tool is built by a loader which imports its implementation, loaders only run
+the first time the tool is read from the registry so unused tools are never imported.
 """
 
 
@@ -34,8 +29,10 @@ class ToolName(StrEnum):
     Tavily_Internet_Search = "Internet Search"
 
 
-ALL_TOOLS = {
-    ToolName.Wiki_Retriever_LangChain: ManagedTool(
+def wiki_retriever_langchain_tool() -> ManagedTool:
+    from backend.tools.retrieval.lang_chain import LangChainWikiRetriever
+
+    return ManagedTool(
         name=ToolName.Wiki_Retriever_LangChain,
         implementation=LangChainWikiRetriever,
         kwargs={"chunk_size": 300, "chunk_overlap": 0},
@@ -44,8 +41,13 @@ ALL_TOOLS = {
         error_message="LangChainWikiRetriever not available.",
         category=Category.DataLoader,
         description="Retrieves documents from Wikipedia using LangChain.",
-    ),
-    ToolName.File_Upload_Langchain: ManagedTool(
+    )
+
+
+def file_upload_langchain_tool() -> ManagedTool:
+    from backend.tools.retrieval.lang_chain import LangChainVectorDBRetriever
+
+    return ManagedTool(
         name=ToolName.File_Upload_Langchain,
         implementation=LangChainVectorDBRetriever,
         is_visible=True,
@@ -53,8 +55,15 @@ ALL_TOOLS = {
         error_message="LangChainVectorDBRetriever not available, please make sure to set the COHERE_API_KEY environment variable.",
         category=Category.FileLoader,
         description="Retrieves documents from a file using LangChain.",
-    ),
-    ToolName.Python_Interpreter: ManagedTool(
+    )
+
+
+def python_interpreter_tool() -> ManagedTool:
+    from backend.tools.function_tools.python_interpreter import (
+        PythonInterpreterFunctionTool,
+    )
+
+    return ManagedTool(
         name=ToolName.Python_Interpreter,
         implementation=PythonInterpreterFunctionTool,
         parameter_definitions={
@@ -69,8 +78,13 @@ ALL_TOOLS = {
         error_message="PythonInterpreterFunctionTool not available, please make sure to set the PYTHON_INTERPRETER_URL environment variable.",
         category=Category.Function,
         description="Runs python code in a sandbox.",
-    ),
-    ToolName.Calculator: ManagedTool(
+    )
+
+
+def calculator_tool() -> ManagedTool:
+    from backend.tools.function_tools.calculator import CalculatorFunctionTool
+
+    return ManagedTool(
         name=ToolName.Calculator,
         implementation=CalculatorFunctionTool,
         parameter_definitions={
@@ -85,8 +99,13 @@ ALL_TOOLS = {
         error_message="CalculatorFunctionTool not available.",
         category=Category.Function,
         description="Evaluate arithmetic expressions.",
-    ),
-    ToolName.Tavily_Internet_Search: ManagedTool(
+    )
+
+
+def tavily_internet_search_tool() -> ManagedTool:
+    from backend.tools.retrieval.tavily import TavilyInternetSearch
+
+    return ManagedTool(
         name=ToolName.Tavily_Internet_Search,
         implementation=TavilyInternetSearch,
         is_visible=True,
@@ -94,11 +113,21 @@ ALL_TOOLS = {
         error_message="TavilyInternetSearch not available, please make sure to set the TAVILY_API_KEY environment variable.",
         category=Category.DataLoader,
         description="Returns a list of relevant document snippets for a textual query retrieved from the internet using Tavily.",
-    ),
-}
+    )
+
+
+ALL_TOOLS = LazyRegistry(
+    {
+        ToolName.Wiki_Retriever_LangChain: wiki_retriever_langchain_tool,
+        ToolName.File_Upload_Langchain: file_upload_langchain_tool,
+        ToolName.Python_Interpreter: python_interpreter_tool,
+        ToolName.Calculator: calculator_tool,
+        ToolName.Tavily_Internet_Search: tavily_internet_search_tool,
+    }
+)
 
 
-def get_available_tools() -> dict[ToolName, dict]:
+def get_available_tools() -> LazyRegistry:
     langchain_tools = [ToolName.Python_Interpreter, ToolName.Tavily_Internet_Search]
     use_langchain_tools = bool(
         strtobool(os.getenv("USE_EXPERIMENTAL_LANGCHAIN", "False"))
@@ -106,9 +135,11 @@ def get_available_tools() -> dict[ToolName, dict]:
     use_community_tools = bool(strtobool(os.getenv("USE_COMMUNITY_FEATURES", "False")))
 
     if use_langchain_tools:
-        return {
-            key: value for key, value in ALL_TOOLS.items() if key in langchain_tools
-        }
+        tools = ALL_TOOLS.copy()
+        for key in list(tools):
+            if key not in langchain_tools:
+                del tools[key]
+        return tools
 
     if use_community_tools:
         try:
@@ -1,4 +1,5 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, joinedload
 
 from backend.models.conversation import Conversation
 from backend.schemas.conversation import UpdateConversation
@@ -22,7 +23,7 @@ def create_conversation(db: Session, conversation: Conversation) -> Conversation
 
 
 def get_conversation(
-    db: Session, conversation_id: str, user_id: str
+    db: Session, conversation_id: str, user_id: str, for_update: bool = False
 ) -> Conversation | None:
     """
     Get a conversation by ID.
@@ -31,15 +32,43 @@ def get_conversation(
         db (Session): Database session.
         conversation_id (str): Conversation ID.
         user_id (str): User ID.
+        for_update (bool): Lock the conversation row until the end of the transaction.
 
     Returns:
         Conversation: Conversation with the given conversation ID and user ID.
     """
-    return (
+    query = db.query(Conversation).filter(
+        Conversation.id == conversation_id, Conversation.user_id == user_id
+    )
+    if for_update:
+        query = query.with_for_update()
+    return query.first()
+
+def get_conversation_with_messages(
+    db: Session, conversation_id: str, user_id: str, for_update: bool = False
+) -> Conversation | None:
+    """
+    Get a conversation by ID with its messages, loaded in the same query.
+
+    Args:
+        db (Session): Database session.
+        conversation_id (str): Conversation ID.
+        user_id (str): User ID.
+        for_update (bool): Lock the conversation row until the end of the transaction.
+
+    Returns:
+        Conversation: Conversation with the given conversation ID and user ID.
+    """
+    query = (
         db.query(Conversation)
+        .options(joinedload(Conversation.text_messages))
         .filter(Conversation.id == conversation_id, Conversation.user_id == user_id)
-        .first()
     )
+    if for_update:
+        query = query.with_for_update(of=Conversation)
+    # No LIMIT, which would wrap the joined eager load in a subquery
+    return query.one_or_none()
+
 
 def extract_conversations(
         db: Session
@@ -111,6 +140,38 @@ def update_conversation(
     return conversation
 
 
+def update_conversation_summary(
+    db: Session,
+    conversation_id: str,
+    user_id: str,
+    summary: str,
+    summary_position: int,
+) -> None:
+    """
+    Update the rolling summary of a conversation, unless a later summary was
+    already stored.
+
+    Args:
+        db (Session): Database session.
+        conversation_id (str): Conversation ID.
+        user_id (str): User ID.
+        summary (str): Summary of the messages up to summary_position.
+        summary_position (int): Position of the last summarized message.
+    """
+    db.query(Conversation).filter(
+        Conversation.id == conversation_id,
+        Conversation.user_id == user_id,
+        or_(
+            Conversation.summary_position.is_(None),
+            Conversation.summary_position < summary_position,
+        ),
+    ).update(
+        {"summary": summary, "summary_position": summary_position},
+        synchronize_session=False,
+    )
+    db.commit()
+
+
 def delete_conversation(db: Session, conversation_id: str, user_id: str) -> None:
     """
     Delete a conversation by ID.
@@ -1,3 +1,4 @@
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
 
 from backend.models.message import Message
@@ -21,6 +22,59 @@ def create_message(db: Session, message: Message) -> Message:
     return message
 
 
+def get_next_message_position(db: Session, conversation_id: str) -> int:
+    """
+    Get the position of the next message of a conversation, using the
+    (conversation_id, position) index instead of loading the messages.
+
+    Args:
+        db (Session): Database session.
+        conversation_id (str): Conversation ID.
+
+    Returns:
+        int: Position after the last active message, 0 for an empty conversation.
+    """
+    max_position = (
+        db.query(func.max(Message.position))
+        .filter(Message.conversation_id == conversation_id, Message.is_active)
+        .scalar()
+    )
+    return 0 if max_position is None else max_position + 1
+
+
+def get_latest_messages(
+    db: Session, conversation_id: str, limit: int
+) -> list[Message]:
+    """
+    Get the latest messages of a conversation and its pinned messages
+    (annotation responses), instead of loading the whole conversation.
+
+    Args:
+        db (Session): Database session.
+        conversation_id (str): Conversation ID.
+        limit (int): Number of latest messages.
+
+    Returns:
+        list[Message]: Messages in position order.
+    """
+    latest_ids = (
+        db.query(Message.id)
+        .filter(Message.conversation_id == conversation_id)
+        .order_by(Message.position.desc(), Message.created_at.desc())
+        .limit(limit)
+        .scalar_subquery()
+    )
+    return (
+        db.query(Message)
+        .filter(
+            Message.conversation_id == conversation_id,
+            or_(Message.id.in_(latest_ids), Message.is_annotation_response),
+        )
+        .order_by(Message.position, Message.created_at)
+        .all()
+    )
+
+
 def get_message(db: Session, message_id: str, user_id: str) -> Message:
     """
     Get a message by ID.
@@ -40,6 +94,27 @@ def get_message(db: Session, message_id: str, user_id: str) -> Message:
     )
 
 
+def get_messages_by_ids(
+    db: Session, message_ids: list[str], user_id: str
+) -> list[Message]:
+    """
+    Get messages by ID, in a single query.
+
+    Args:
+        db (Session): Database session.
+        message_ids (list[str]): Message IDs.
+        user_id (str): User ID.
+
+    Returns:
+        list[Message]: Messages found, in no particular order.
+    """
+    return (
+        db.query(Message)
+        .filter(Message.id.in_(message_ids), Message.user_id == user_id)
+        .all()
+    )
+
+
 def get_messages(
     db: Session, user_id: str, offset: int = 0, limit: int = 100
 ) -> list[Message]:
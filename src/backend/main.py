@@ -4,6 +4,7 @@ from alembic.command import upgrade
 from alembic.config import Config
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 
 from backend.routers.chat import router as chat_router
@@ -13,13 +14,27 @@ from backend.routers.experimental_features import router as experimental_feature
 from backend.routers.tool import router as tool_router
 from backend.routers.user import router as user_router
 from backend.routers.annotations import router as annotations_router
+from backend.config.deployments import AVAILABLE_MODEL_DEPLOYMENTS
+from backend.models.database import get_session_factory
+from backend.services.model_catalog import get_model_catalog
+from backend.services.persistence import (
+    start_persistence_worker,
+    stop_persistence_worker,
+    use_background_persistence,
+)
+from backend.services.request_validators import chat_request_exception_handler
 
 load_dotenv()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    if use_background_persistence:
+        start_persistence_worker(get_session_factory())
+    # Warm the model lists in the background, the boot does not wait on them
+    get_model_catalog().warm(AVAILABLE_MODEL_DEPLOYMENTS)
     yield
+    stop_persistence_worker()
 
 
 origins = ["*"]
@@ -35,6 +50,8 @@ def create_app():
     app.include_router(experimental_feature_router)
     app.include_router(annotations_router) #add annotations router
 
+    app.add_exception_handler(RequestValidationError, chat_request_exception_handler)
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=origins,
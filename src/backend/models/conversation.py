@@ -1,6 +1,6 @@
 from typing import List
 
-from sqlalchemy import Index, String
+from sqlalchemy import Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from backend.models.base import Base
@@ -15,8 +15,12 @@ class Conversation(Base):
     user_id: Mapped[str] = mapped_column(String)
     title: Mapped[str] = mapped_column(String, default="New Conversation")
     description: Mapped[str] = mapped_column(String, nullable=True, default=None)
+    # Rolling summary of the messages up to summary_position, see chat/summary.py
+    summary: Mapped[str] = mapped_column(String, nullable=True, default=None)
+    summary_position: Mapped[int] = mapped_column(Integer, nullable=True, default=None)
 
-    text_messages: Mapped[List["Message"]] = relationship()
+    # Loaded in position order, so sorting them is linear
+    text_messages: Mapped[List["Message"]] = relationship(order_by=Message.position)
     files: Mapped[List["File"]] = relationship()
 
     @property
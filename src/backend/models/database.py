@@ -1,5 +1,5 @@
 import os
-from typing import Annotated, Any, Generator
+from typing import Annotated, Any, Callable, ContextManager, Generator
 
 from dotenv import load_dotenv
 from fastapi import Depends
@@ -22,3 +22,17 @@ def get_session() -> Generator[Session, Any, None]:
 
 
 DBSessionDep = Annotated[Session, Depends(get_session)]
+
+
+def get_session_factory() -> Callable[[], ContextManager[Session]]:
+    """
+    Returns a factory of short-lived sessions, used to check out a connection
+    only for the duration of a unit of work (e.g: persisting a chat turn after
+    a stream) instead of for the whole request.
+    """
+    return lambda: Session(engine)
+
+
+SessionFactoryDep = Annotated[
+    Callable[[], ContextManager[Session]], Depends(get_session_factory)
+]
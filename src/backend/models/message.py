@@ -1,7 +1,7 @@
 from enum import StrEnum
 from typing import List
 
-from sqlalchemy import Boolean, Enum, ForeignKey, Index, String
+from sqlalchemy import Boolean, Enum, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import Mapped, declared_attr, mapped_column, relationship
 
 from backend.models.base import Base
@@ -30,9 +30,13 @@ class Message(Base):
     conversation_id: Mapped[str] = mapped_column(
         ForeignKey("conversations.id", ondelete="CASCADE")
     )
-    position: Mapped[int]
+    position: Mapped[int] = mapped_column(Integer)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     generation_id: Mapped[str] = mapped_column(String, nullable=True)
+    # Computed when the message is written, used to budget the chat history
+    token_count: Mapped[int] = mapped_column(Integer, nullable=True)
+    # Finish reason of the generation, USER_CANCEL when the client disconnected
+    finish_reason: Mapped[str] = mapped_column(String, nullable=True)
 
     documents: Mapped[List["Document"]] = relationship()
     citations: Mapped[List["Citation"]] = relationship()
@@ -53,6 +57,7 @@ class Message(Base):
     __table_args__ = (
         Index("message_conversation_id_user_id", conversation_id, user_id),
         Index("message_conversation_id", conversation_id),
+        Index("message_conversation_id_position", conversation_id, position),
         Index("message_is_active", is_active),
         Index("message_user_id", user_id),
     )
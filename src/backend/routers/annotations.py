@@ -4,16 +4,12 @@ from distutils.util import strtobool
 from typing import Any, Generator, List, Union
 from uuid import uuid4
 
-from cohere.types import StreamedChatResponse
 from fastapi import APIRouter, Depends, Request
 from fastapi.encoders import jsonable_encoder
 from fastapi import Form, HTTPException
-from langchain_core.agents import AgentActionMessageLog
-from langchain_core.runnables.utils import AddableDict
 from sse_starlette.sse import EventSourceResponse
 
 from backend.chat.custom.custom import CustomChat
-from backend.chat.custom.langchain import LangChainChat
 from backend.chat.enums import StreamEvent
 from backend.config.tools import AVAILABLE_TOOLS
 
@@ -51,7 +47,6 @@ from backend.schemas.langchain_chat import LangchainChatRequest
 from backend.schemas.search_query import SearchQuery
 from backend.schemas.tool import ToolCall
 from backend.services.request_validators import (
-    validate_chat_request,
     validate_deployment_header,
     validate_user_header,
 )
@@ -1,19 +1,42 @@
+import asyncio
 import json
 import os
+from contextlib import aclosing
 from distutils.util import strtobool
-from typing import Any, Generator, List, Union
+from functools import partial
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Callable,
+    Generator,
+    List,
+    Union,
+)
 from uuid import uuid4
 
-from cohere.types import StreamedChatResponse
-from fastapi import APIRouter, Depends, Request
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.encoders import jsonable_encoder
-from langchain_core.agents import AgentActionMessageLog
-from langchain_core.runnables.utils import AddableDict
-from sse_starlette.sse import EventSourceResponse
+from sqlalchemy import inspect
+from sse_starlette.sse import EventSourceResponse, ServerSentEvent
+from starlette.concurrency import run_in_threadpool
 
+from backend.chat.coalesce import coalesce_text_generation
 from backend.chat.custom.custom import CustomChat
-from backend.chat.custom.langchain import LangChainChat
+from backend.chat.encoder import (
+    encode_chat_response_event,
+    encode_text_generation,
+    is_fast_text_generation,
+)
 from backend.chat.enums import StreamEvent
+from backend.chat.history import (
+    CHAT_HISTORY_MAX_MESSAGES,
+    get_history_token_budget,
+    window_conversation,
+)
+from backend.chat.summary import schedule_summary_refresh
 from backend.config.tools import AVAILABLE_TOOLS
 from backend.crud import conversation as conversation_crud
 from backend.crud import file as file_crud
@@ -21,8 +44,9 @@ from backend.crud import message as message_crud
 from backend.models import get_session
 from backend.models.citation import Citation
 from backend.models.conversation import Conversation
-from backend.models.database import DBSessionDep
+from backend.models.database import DBSessionDep, SessionFactoryDep
 from backend.models.document import Document
+from backend.models.file import File
 from backend.models.message import Message, MessageAgent
 from backend.schemas.chat import (
     BaseChatRequest,
@@ -44,28 +68,41 @@ from backend.schemas.chat import (
 )
 from backend.schemas.cohere_chat import CohereChatRequest
 from backend.schemas.conversation import UpdateConversation
-from backend.schemas.file import UpdateFile
 from backend.schemas.langchain_chat import LangchainChatRequest
 from backend.schemas.search_query import SearchQuery
 from backend.schemas.tool import ToolCall
+from backend.services.json_body import JSONBodyRoute
+from backend.services.persistence import get_persistence_worker
 from backend.services.request_validators import (
-    validate_chat_request,
     validate_deployment_header,
     validate_user_header,
 )
+from backend.services.tokens import count_tokens
+from backend.services.turns import TurnStream, get_turn_registry
+
+if TYPE_CHECKING:
+    from cohere.types import StreamedChatResponse
 
+# Keep-alive comment interval, retrieval can take a while before the first token
+SSE_PING_INTERVAL = int(os.getenv("SSE_PING_INTERVAL", "5"))
+
+# Cohere's finish reason of a generation cancelled by the user
+USER_CANCEL_FINISH_REASON = "USER_CANCEL"
+
+# The request bodies are validated once, by the request models, and decoded with orjson
 router = APIRouter(
     dependencies=[
         Depends(get_session),
-        Depends(validate_chat_request),
         Depends(validate_user_header),
-    ]
+    ],
+    route_class=JSONBodyRoute,
 )
 
 
 @router.post("/chat-stream", dependencies=[Depends(validate_deployment_header)])
 async def chat_stream(
     session: DBSessionDep,
+    session_factory: SessionFactoryDep,
     chat_request: CohereChatRequest,
     request: Request,
 ) -> Generator[ChatResponseEvent, Any, None]:
@@ -73,7 +110,8 @@ async def chat_stream(
     Stream chat endpoint to handle user messages and return chatbot responses.
 
     Args:
-        session (DBSessionDep): Database session.
+        session (DBSessionDep): Database session, only used for the turn setup.
+        session_factory (SessionFactoryDep): Factory of short-lived sessions, used to persist the response.
         chat_request (CohereChatRequest): Chat request data.
         request (Request): Request object.
 
@@ -81,6 +119,119 @@ async def chat_stream(
         EventSourceResponse: Server-sent event response with chatbot responses.
     """
     print("CHAT STREAM ACTIVAVTED")
+    # A retried turn attaches to the generation in progress, or replays it. A
+    # reconnecting client resumes after the last event it got.
+    last_event_id = get_last_event_id(request)
+    start = last_event_id + 1 if last_event_id is not None else 0
+    turn_registry = get_turn_registry()
+    turn, created = turn_registry.reserve(
+        request.headers.get("User-Id", ""), chat_request.bot_msg_id
+    )
+    if created and last_event_id is not None:
+        turn_registry.discard(turn)
+        turn.close()
+        raise HTTPException(
+            status_code=410,
+            detail=f"Chat turn {chat_request.bot_msg_id} can't be resumed anymore.",
+        )
+    if not created:
+        if not turn.can_resume(start):
+            raise HTTPException(
+                status_code=410,
+                detail=(
+                    f"Chat turn {chat_request.bot_msg_id} can't be resumed "
+                    f"from event {start}."
+                ),
+            )
+        return EventSourceResponse(
+            stream_turn_events(turn, start),
+            media_type="text/event-stream",
+            ping=SSE_PING_INTERVAL,
+        )
+
+    try:
+        await start_chat_turn(session, session_factory, chat_request, request, turn)
+    except BaseException:
+        turn_registry.discard(turn)
+        turn.close()
+        raise
+
+    return EventSourceResponse(
+        stream_turn_events(turn), media_type="text/event-stream", ping=SSE_PING_INTERVAL
+    )
+
+
+def get_last_event_id(request: Request) -> int | None:
+    """
+    Get the ID of the last event a reconnecting client got.
+
+    Args:
+        request (Request): Request object.
+
+    Returns:
+        int | None: Event ID, None if the client is not reconnecting.
+
+    Raises:
+        HTTPException: If the Last-Event-ID header is not an event ID.
+    """
+    last_event_id = request.headers.get("Last-Event-ID")
+    if not last_event_id:
+        return None
+    try:
+        return int(last_event_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=400, detail=f"Invalid Last-Event-ID: {last_event_id}."
+        )
+
+
+async def stream_turn_events(
+    turn: TurnStream, start: int = 0
+) -> AsyncGenerator[ServerSentEvent, None]:
+    """
+    Stream the events of a turn with their IDs, sent back in Last-Event-ID on reconnect.
+
+    Args:
+        turn (TurnStream): Turn.
+        start (int): ID of the first event to send.
+
+    Yields:
+        ServerSentEvent: Numbered event.
+    """
+    async with aclosing(turn.subscribe(start)) as events:
+        async for event_id, event in events:
+            yield ServerSentEvent(data=event, id=str(event_id))
+
+
+async def start_chat_turn(
+    session: DBSessionDep,
+    session_factory: SessionFactoryDep,
+    chat_request: CohereChatRequest,
+    request: Request,
+    turn: TurnStream,
+) -> None:
+    """
+    Start generating a streamed turn, or replaying it if it was answered already.
+
+    Args:
+        session (DBSessionDep): Database session, only used for the turn setup.
+        session_factory (SessionFactoryDep): Factory of short-lived sessions, used to persist the response.
+        chat_request (CohereChatRequest): Chat request data.
+        request (Request): Request object.
+        turn (TurnStream): Turn registered for the request.
+
+    Raises:
+        HTTPException: If the turn was started but its response is not stored.
+    """
+    user_id = request.headers.get("User-Id", "")
+    # The turn setup queries, locks and commits with a sync session, off the event loop
+    stored_message = await run_in_threadpool(
+        get_stored_turn, session, chat_request, user_id
+    )
+    if stored_message is not None:
+        turn.start(replay_events(encode_stored_turn(stored_message)))
+        return
+
     (
         session,
         chat_request,
@@ -91,9 +242,7 @@ async def chat_stream(
         deployment_name,
         should_store,
         managed_tools,
-    ) = process_chat(session, chat_request, request)
-
-    msg = conversation_crud.get_conversation(session, conversation_id, user_id)
+    ) = await run_in_threadpool(process_chat, session, chat_request, request)
 
     # mock_request = BaseAnnotationRequest(
     # message_id=msg.messages[0].id,
@@ -110,28 +259,35 @@ async def chat_stream(
     # print("annotate req", id)
     # await annotate(session, id, mock_request, request)
 
-    return EventSourceResponse(
+    # Once every request attached to the turn disconnected, the turn cancels the
+    # stream, which closes the model stream and the retrieval in progress, and
+    # keeps the partial answer
+    turn.start(
         generate_chat_stream(
-            session,
-            CustomChat().chat(
-                chat_request,
-                stream=True,
-                deployment_name=deployment_name,
-                file_paths=file_paths,
-                managed_tools=managed_tools,
+            session_factory,
+            coalesce_text_generation(
+                await CustomChat().achat(
+                    chat_request,
+                    stream=True,
+                    deployment_name=deployment_name,
+                    file_paths=file_paths,
+                    managed_tools=managed_tools,
+                    user_id=user_id,
+                )
             ),
             response_message,
             conversation_id,
             user_id,
             should_store=should_store,
-        ),
-        media_type="text/event-stream",
+            deployment_name=deployment_name,
+        )
     )
 
 
 @router.post("/chat", dependencies=[Depends(validate_deployment_header)])
 def chat(
     session: DBSessionDep,
+    session_factory: SessionFactoryDep,
     chat_request: CohereChatRequest,
     request: Request,
 ) -> NonStreamedChatResponse:
@@ -141,11 +297,26 @@ def chat(
     Args:
         chat_request (CohereChatRequest): Chat request data.
         session (DBSessionDep): Database session.
+        session_factory (SessionFactoryDep): Factory of short-lived sessions, used to refresh the conversation summary.
         request (Request): Request object.
 
     Returns:
         NonStreamedChatResponse: Chatbot response.
+
+    Raises:
+        HTTPException: If the turn is being generated, or its response is not stored.
     """
+    # A retried turn gets the stored response, the model isn't called again
+    user_id = request.headers.get("User-Id", "")
+    if get_turn_registry().get(user_id, chat_request.bot_msg_id) is not None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Chat turn {chat_request.bot_msg_id} is already being generated.",
+        )
+    stored_message = get_stored_turn(session, chat_request, user_id)
+    if stored_message is not None:
+        return build_stored_chat_response(stored_message)
+
     (
         session,
         chat_request,
@@ -158,7 +329,7 @@ def chat(
         managed_tools,
     ) = process_chat(session, chat_request, request)
 
-    return generate_chat_response(
+    response = generate_chat_response(
         session,
         CustomChat().chat(
             chat_request,
@@ -166,6 +337,7 @@ def chat(
             deployment_name=deployment_name,
             file_paths=file_paths,
             managed_tools=managed_tools,
+            user_id=user_id,
         ),
         response_message,
         conversation_id,
@@ -173,8 +345,132 @@ def chat(
         should_store=should_store,
     )
 
+    if should_store:
+        schedule_summary_refresh(
+            session_factory,
+            conversation_id,
+            user_id,
+            deployment_name,
+            response_message.position,
+        )
+    return response
+
 from backend.routers.annotations import annotate, delete_annotation
 
+
+def get_stored_turn(
+    session: DBSessionDep, chat_request: BaseChatRequest, user_id: str
+) -> Message | None:
+    """
+    Get the stored chatbot message of a turn, when the request is a retry.
+
+    Args:
+        session (DBSessionDep): Database session.
+        chat_request (BaseChatRequest): Chat request data.
+        user_id (str): User ID.
+
+    Returns:
+        Message | None: Chatbot message, stored or waiting to be written by the
+            persistence worker, None if the turn wasn't started.
+
+    Raises:
+        HTTPException: If the turn was started but its response is not stored.
+    """
+    messages = {
+        message.id: message
+        for message in message_crud.get_messages_by_ids(
+            session, [chat_request.user_msg_id, chat_request.bot_msg_id], user_id
+        )
+    }
+    if chat_request.bot_msg_id in messages:
+        return messages[chat_request.bot_msg_id]
+
+    # A finished turn is only stored once the persistence worker writes it
+    persistence_worker = get_persistence_worker()
+    if persistence_worker is not None:
+        pending_message = persistence_worker.get_pending_turn(chat_request.bot_msg_id)
+        if pending_message is not None and pending_message.user_id == user_id:
+            return pending_message
+
+    if chat_request.user_msg_id in messages:
+        raise HTTPException(
+            status_code=409,
+            detail=(
+                f"Chat turn {chat_request.bot_msg_id} was started but its response "
+                "is not stored, retry with new message IDs."
+            ),
+        )
+    return None
+
+
+def encode_stored_turn(message: Message) -> list[str]:
+    """
+    Encode a stored chatbot message as the events of a streamed turn.
+
+    Args:
+        message (Message): Chatbot message.
+
+    Returns:
+        list[str]: Encoded events, the text is sent in a single event.
+    """
+    events = [
+        StreamStart(
+            generation_id=message.generation_id,
+            conversation_id=message.conversation_id,
+            is_finished=False,
+        )
+    ]
+    if message.documents:
+        events.append(
+            StreamSearchResults(documents=message.documents, is_finished=False)
+        )
+    events.append(StreamTextGeneration(text=message.text, is_finished=False))
+    if message.citations:
+        events.append(
+            StreamCitationGeneration(citations=message.citations, is_finished=False)
+        )
+    events.append(
+        StreamEnd(
+            response_id=message.id,
+            generation_id=message.generation_id,
+            conversation_id=message.conversation_id,
+            text=message.text,
+            citations=message.citations,
+            documents=message.documents,
+            finish_reason=message.finish_reason or "COMPLETE",
+        )
+    )
+    return [encode_chat_response_event(event) for event in events]
+
+
+async def replay_events(events: list[str]) -> AsyncIterator[str]:
+    for event in events:
+        yield event
+
+
+def build_stored_chat_response(message: Message) -> NonStreamedChatResponse:
+    """
+    Build the response of a stored chatbot message.
+
+    Args:
+        message (Message): Chatbot message.
+
+    Returns:
+        NonStreamedChatResponse: Chatbot response.
+    """
+    return NonStreamedChatResponse(
+        text=message.text,
+        response_id=message.id,
+        generation_id=message.generation_id,
+        chat_history=None,
+        finish_reason=message.finish_reason or "COMPLETE",
+        citations=message.citations,
+        documents=message.documents,
+        event_type=StreamEvent.NON_STREAMED_CHAT_RESPONSE,
+        is_finished=True,
+        conversation_id=message.conversation_id,
+    )
+
 def process_chat(
     session: DBSessionDep, chat_request: BaseChatRequest, request: Request
 ) -> tuple[DBSessionDep, BaseChatRequest, Union[list[str], None], Message, str, str]:
@@ -195,12 +491,14 @@ def process_chat(
     should_store = chat_request.chat_history is None and not is_custom_tool_call(
         chat_request
     )
+    # The turn is set up in a single transaction, the writes are flushed on commit.
     conversation = get_or_create_conversation(
         session, chat_request, user_id, should_store
     )
-    
+    history_messages = get_history_messages(session, conversation)
+
     # Get position to put next message in
-    next_message_position = get_next_message_position(conversation)
+    next_message_position = get_next_message_position(session, conversation)
     #BUGFIX for next message positioning, i think this fixes it
     #next_message_position = len(chat_request.chat_history) if chat_request.chat_history else 0 
     user_message = create_message(
@@ -214,7 +512,9 @@ def process_chat(
         should_store,
         id=chat_request.user_msg_id,
     )
-    print("user id msg", chat_request.user_msg_id)
+    if should_store:
+        # The chat history ends with the user message
+        history_messages.append(user_message)
     chatbot_message = create_message(
         session,
         chat_request,
@@ -227,16 +527,18 @@ def process_chat(
         id=chat_request.bot_msg_id,
     )
 
-
     file_paths = None
     if isinstance(chat_request, CohereChatRequest):
-        file_paths = handle_file_retrieval(session, user_id, chat_request.file_ids)
-        attach_files_to_messages(
+        file_paths = handle_file_retrieval(
             session, user_id, user_message.id, chat_request.file_ids
         )
 
     chat_history = create_chat_history(
-        conversation, next_message_position, chat_request
+        conversation,
+        history_messages,
+        next_message_position,
+        chat_request,
+        get_history_token_budget(deployment_name),
     )
 
     # co.chat expects either chat_history or conversation_id, not both
@@ -248,12 +550,20 @@ def process_chat(
         len([tool.name for tool in tools if tool.name in AVAILABLE_TOOLS]) > 0
     )
 
+    # Read the ID before committing, loading expired attributes after the
+    # commit would check out a connection again for the rest of the request.
+    conversation_id = conversation.id
+    # End the transaction so the session hands its connection back to the pool
+    # before the response is generated, the response is persisted afterwards
+    # with a short-lived session.
+    session.commit()
+
     return (
         session,
         chat_request,
         file_paths,
         chatbot_message,
-        conversation.id,
+        conversation_id,
         user_id,
         deployment_name,
         should_store,
@@ -299,26 +609,34 @@ def get_or_create_conversation(
         Conversation: Conversation object.
     """
     conversation_id = chat_request.conversation_id or ""
-    conversation = conversation_crud.get_conversation(session, conversation_id, user_id)
+    # The row lock serializes the turns of a conversation, so concurrent
+    # turns can't be given the same message position
+    conversation = conversation_crud.get_conversation(
+        session, conversation_id, user_id, for_update=should_store
+    )
 
     if conversation is None:
         conversation = Conversation(
             user_id=user_id,
-            id=chat_request.conversation_id,
+            # The ID is set here as the conversation is only flushed on commit
+            id=chat_request.conversation_id or str(uuid4()),
             title=chat_request.message[:28], #add paritial convo name
         )
 
         if should_store:
-            conversation_crud.create_conversation(session, conversation)
+            session.add(conversation)
 
     return conversation
 
 
-def get_next_message_position(conversation: Conversation) -> int:
+def get_next_message_position(
+    session: DBSessionDep, conversation: Conversation
+) -> int:
     """
     Gets message position to create next messages.
 
     Args:
+        session (DBSessionDep): Database session.
         conversation (Conversation): current Conversation.
 
     Returns:
@@ -326,15 +644,51 @@ def get_next_message_position(conversation: Conversation) -> int:
     """
 
     # Message starts the conversation
-    if len(conversation.messages) == 0:
+    if not inspect(conversation).persistent:
         return 0
 
-    # Get current max position from existing Messages
-    current_active_position = max(
-        [message.position for message in conversation.messages if message.is_active]
-    )
+    # Queried after the conversation row is locked, so a concurrent turn that
+    # held the lock has written its messages
+    return message_crud.get_next_message_position(session, conversation.id)
 
-    return current_active_position + 1
+
+def get_history_messages(
+    session: DBSessionDep, conversation: Conversation
+) -> list[Message]:
+    """
+    Gets the messages the chat history of a conversation is built from, the
+    latest ones and the pinned ones, the older ones can't fit in the history.
+    Chatbot messages still waiting on the persistence worker are included.
+
+    Args:
+        session (DBSessionDep): Database session.
+        conversation (Conversation): current Conversation.
+
+    Returns:
+        list[Message]: Messages in position order.
+    """
+    if not inspect(conversation).persistent:
+        return []
+
+    messages = message_crud.get_latest_messages(
+        session, conversation.id, CHAT_HISTORY_MAX_MESSAGES
+    )
+    persistence_worker = get_persistence_worker()
+    if persistence_worker is None:
+        return messages
+
+    # A turn can start before the worker writes the answer of the previous one
+    loaded_ids = {message.id for message in messages}
+    messages += [
+        message
+        for message in persistence_worker.get_pending_turns(conversation.id)
+        if message.id not in loaded_ids
+    ]
+    # The user message of a turn comes before its answer
+    return sorted(
+        messages,
+        key=lambda message: (message.position, message.agent == MessageAgent.CHATBOT),
+    )
 
 
 def create_message(
@@ -349,7 +703,8 @@ def create_message(
     id: str | None = None,
 ) -> Message:
     """
-    Create a message object and store it in the database.
+    Create a message object and add it to the session, it is written when the
+    turn setup is committed.
 
     Args:
         session (DBSessionDep): Database session.
@@ -366,30 +721,36 @@ def create_message(
         Message: Message object.
     """
     message = Message(
-        id=id,
+        id=id or str(uuid4()),
         user_id=user_id,
         conversation_id=conversation_id,
         text=text,
         position=user_message_position,
         is_active=True,
         agent=agent,
+        token_count=count_tokens(text),
         is_annotation_response= True if '| Annotated Text | Annotation |\n|----------|----------|\n' in text else False
     )
     
     if should_store:
-        return message_crud.create_message(session, message)
+        session.add(message)
     return message
 
 
 def handle_file_retrieval(
-    session: DBSessionDep, user_id: str, file_ids: List[str] | None = None
+    session: DBSessionDep,
+    user_id: str,
+    message_id: str,
+    file_ids: List[str] | None = None,
 ) -> list[str] | None:
     """
-    Retrieve file paths from the database.
+    Retrieve file paths from the database, and attach the Files to the Message
+    if they do not have a message_id foreign key yet.
 
     Args:
         session (DBSessionDep): Database session.
         user_id (str): User ID.
+        message_id (str): Message ID to attach to if needed.
         file_ids (List): List of File IDs.
 
     Returns:
@@ -400,75 +761,71 @@ def handle_file_retrieval(
     if file_ids is not None:
         files = file_crud.get_files_by_ids(session, file_ids, user_id)
         file_paths = [file.file_path for file in files]
+        attach_files_to_messages(files, message_id)
 
     return file_paths
 
 
-def attach_files_to_messages(
-    session: DBSessionDep,
-    user_id: str,
-    message_id: str,
-    file_ids: List[str] | None = None,
-) -> None:
+def attach_files_to_messages(files: List[File], message_id: str) -> None:
     """
     Attach Files to Message if the File does not have a message_id foreign key.
 
     Args:
-        session (DBSessionDep): Database session.
-        user_id (str): User ID.
+        files (List[File]): Files of the chat request.
         message_id (str): Message ID to attach to if needed.
-        file_ids (List): List of File IDs.
 
     Returns:
         None
     """
-    if file_ids is not None:
-        files = file_crud.get_files_by_ids(session, file_ids, user_id)
-        for file in files:
-            if file.message_id is None:
-                file_crud.update_file(session, file, UpdateFile(message_id=message_id))
+    for file in files:
+        if file.message_id is None:
+            file.message_id = message_id
 
 
 def create_chat_history(
     conversation: Conversation,
+    messages: list[Message],
     user_message_position: int,
     chat_request: BaseChatRequest,
+    token_budget: int,
 ) -> list[ChatMessage]:
     """
     Create chat history from conversation messages or request.
 
     Args:
         conversation (Conversation): Conversation object.
+        messages (list[Message]): Messages of the conversation, see get_history_messages.
         user_message_position (int): User message position.
         chat_request (BaseChatRequest): Chat request data.
+        token_budget (int): Token budget of the history built from the conversation.
 
     Returns:
         list[ChatMessage]: List of chat messages.
     """
-
-    # print("CREATE HISTORY CHAT +++++++++++++++++++++++++++++++++++++++")
-    # print(chat_request.chat_history)
-
     if chat_request.chat_history is not None:
         return chat_request.chat_history
 
-    #Ignore user message postion. This messed up chat_history for open AI calls. We can ignore it.
-    text_messages = [
-        message for message in conversation.messages#[:user_message_position] #LEAVE THIS COMMENTED OUT OR SAY GOODBYE TO CONTEXT.
-        #user mesage position might be messed up, remove if problems found!
-    ]
+    # The history ends with the user message of the turn, the OpenAI call only
+    # sends the history. Older messages are dropped once the budget is used,
+    # or folded in the conversation summary when enabled.
+    summary, text_messages = window_conversation(conversation, token_budget, messages)
 
-    # print("TEXT MESSAGES: ")
-    # for m in text_messages:
-    #     print(m.text)
-    # print("++++++++++++++++++++++++++++++++++++++++++++")
-    return [
+    chat_history = [
         ChatMessage(
             role=ChatRole(message.agent.value.upper()),
             message=message.text,
         )
         for message in text_messages
     ]
+    if summary is not None:
+        chat_history.insert(
+            0,
+            ChatMessage(
+                role=ChatRole.USER,
+                message=f"Summary of the earlier conversation:\n{summary}",
+            ),
+        )
+    return chat_history
 
 
 def update_conversation_after_turn(
@@ -503,15 +860,79 @@ def update_conversation_after_turn(
     # conversation_crud.update_conversation(session, conversation, new_conversation)
 
 
-def generate_chat_stream(
-    session: DBSessionDep,
-    model_deployment_stream: Generator[StreamedChatResponse, None, None],
+def persist_conversation_turn(
+    session_factory: SessionFactoryDep,
+    response_message: Message,
+    conversation_id: str,
+    final_message_text: str,
+    user_id: str,
+) -> None:
+    """
+    Persists the conversation turn with a short-lived session, so a connection
+    is only checked out for the writes and not while the response is generated.
+
+    Args:
+        session_factory (SessionFactoryDep): Factory of short-lived sessions.
+        response_message (Message): Response message object.
+        conversation_id (str): Conversation ID.
+        final_message_text (str): Final message text.
+        user_id (str): User ID.
+    """
+    with session_factory() as session:
+        update_conversation_after_turn(
+            session, response_message, conversation_id, final_message_text, user_id
+        )
+
+
+async def persist_chat_turn(
+    session_factory: SessionFactoryDep,
+    response_message: Message,
+    conversation_id: str,
+    final_message_text: str,
+    user_id: str,
+    on_written: Callable[[], None] | None = None,
+) -> None:
+    """
+    Persists the chatbot message of a streamed turn, written behind by the
+    persistence worker when it runs. The response message is detached once
+    written, read what is needed from it before.
+
+    Args:
+        session_factory (SessionFactoryDep): Factory of short-lived sessions.
+        response_message (Message): Response message object.
+        conversation_id (str): Conversation ID.
+        final_message_text (str): Final message text.
+        user_id (str): User ID.
+        on_written (Callable[[], None] | None): Called once the turn is written.
+    """
+    persistence_worker = get_persistence_worker()
+    if persistence_worker is not None:
+        # Written behind by the persistence worker, the response never waits on the database
+        persistence_worker.submit(response_message, on_written)
+        return
+
+    await run_in_threadpool(
+        persist_conversation_turn,
+        session_factory,
+        response_message,
+        conversation_id,
+        final_message_text,
+        user_id,
+    )
+    if on_written is not None:
+        on_written()
+
+
+async def generate_chat_stream(
+    session_factory: SessionFactoryDep,
+    model_deployment_stream: AsyncGenerator["StreamedChatResponse", None],
     response_message: Message,
     conversation_id: str,
     user_id: str,
     should_store: bool = True,
+    deployment_name: str | None = None,
     **kwargs: Any,
-) -> Generator[bytes, Any, None]:
+) -> AsyncGenerator[bytes, Any]:
 
     print("used this method (chat stream) !!!!!!!!!!!!!!!!!!!!!!!!!!!")
     print("conv id :", conversation_id)
@@ -522,12 +943,13 @@ def generate_chat_stream(
     Generate chat stream from model deployment stream.
 
     Args:
-        session (DBSessionDep): Database session.
-        model_deployment_stream (Generator[StreamResponse, None, None]): Model deployment stream.
+        session_factory (SessionFactoryDep): Factory of short-lived sessions used to persist the response.
+        model_deployment_stream (AsyncGenerator[StreamResponse, None]): Model deployment stream.
         response_message (Message): Response message object.
         conversation_id (str): Conversation ID.
         user_id (str): User ID.
         should_store (bool): Whether to store the conversation in the database.
+        deployment_name (str | None): Deployment name, used to refresh the conversation summary.
         **kwargs (Any): Additional keyword arguments.
 
     Yields:
@@ -546,109 +968,139 @@ def generate_chat_stream(
     all_citations = []
 
     stream_event = None
-    for event in model_deployment_stream:
-        if event["event_type"] == StreamEvent.STREAM_START:
-            stream_event = StreamStart.model_validate(event)
-            response_message.generation_id = event["generation_id"]
-            stream_end_data["generation_id"] = event["generation_id"]
-        elif event["event_type"] == StreamEvent.TEXT_GENERATION:
-            final_message_text += event["text"]
-            stream_event = StreamTextGeneration.model_validate(event)
-        elif event["event_type"] == StreamEvent.SEARCH_RESULTS:
-            for document in event["documents"]:
-                storage_document = Document(
-                    document_id=document.get("id", ""),
-                    text=document.get("text", ""),
-                    title=document.get("title", ""),
-                    url=document.get("url", ""),
-                    user_id=response_message.user_id,
-                    conversation_id=response_message.conversation_id,
-                    message_id=response_message.id,
-                )
-                document_ids_to_document[document["id"]] = storage_document
-
-            documents = list(document_ids_to_document.values())
-            response_message.documents = documents
-            stream_end_data["documents"] = documents
-            if "search_results" not in event or event["search_results"] is None:
-                event["search_results"] = []
-            stream_event = StreamSearchResults(
-                **event
-                | {
-                    "documents": documents,
-                    "search_results": event["search_results"],
-                },
-            )
-        elif event["event_type"] == StreamEvent.SEARCH_QUERIES_GENERATION:
-            search_queries = []
-            for search_query in event["search_queries"]:
-                search_queries.append(
-                    SearchQuery(
-                        text=search_query.text,
-                        generation_id=search_query.generation_id,
+    try:
+        async for event in model_deployment_stream:
+            if event["event_type"] == StreamEvent.STREAM_START:
+                stream_event = StreamStart.model_validate(event)
+                response_message.generation_id = event["generation_id"]
+                stream_end_data["generation_id"] = event["generation_id"]
+            elif event["event_type"] == StreamEvent.TEXT_GENERATION:
+                final_message_text += event["text"]
+                # Hot path, sent once per token
+                if is_fast_text_generation(event):
+                    yield encode_text_generation(event["text"], event["is_finished"])
+                    continue
+                stream_event = StreamTextGeneration.model_validate(event)
+            elif event["event_type"] == StreamEvent.SEARCH_RESULTS:
+                for document in event["documents"]:
+                    storage_document = Document(
+                        document_id=document.get("id", ""),
+                        text=document.get("text", ""),
+                        title=document.get("title", ""),
+                        url=document.get("url", ""),
+                        user_id=response_message.user_id,
+                        conversation_id=response_message.conversation_id,
+                        message_id=response_message.id,
                     )
+                    document_ids_to_document[document["id"]] = storage_document
+
+                documents = list(document_ids_to_document.values())
+                response_message.documents = documents
+                stream_end_data["documents"] = documents
+                if "search_results" not in event or event["search_results"] is None:
+                    event["search_results"] = []
+                stream_event = StreamSearchResults(
+                    **event
+                    | {
+                        "documents": documents,
+                        "search_results": event["search_results"],
+                    },
                 )
-            stream_event = StreamSearchQueriesGeneration(
-                **event | {"search_queries": search_queries}
-            )
-            stream_end_data["search_queries"] = search_queries
-        elif event["event_type"] == StreamEvent.TOOL_CALLS_GENERATION:
-            tool_calls = []
-            for tool_call in event["tool_calls"]:
-                tool_calls.append(
-                    ToolCall(
-                        name=tool_call.name,
-                        parameters=tool_call.parameters,
+            elif event["event_type"] == StreamEvent.SEARCH_QUERIES_GENERATION:
+                search_queries = []
+                for search_query in event["search_queries"]:
+                    search_queries.append(
+                        SearchQuery(
+                            text=search_query.text,
+                            generation_id=search_query.generation_id,
+                        )
                     )
+                stream_event = StreamSearchQueriesGeneration(
+                    **event | {"search_queries": search_queries}
                 )
-            stream_event = StreamToolCallsGeneration(
-                **event | {"tool_calls": tool_calls}
-            )
-            stream_end_data["tool_calls"] = tool_calls
-        elif event["event_type"] == StreamEvent.CITATION_GENERATION:
-            citations = []
-            for event_citation in event["citations"]:
-                citation = Citation(
-                    text=event_citation.text,
-                    user_id=response_message.user_id,
-                    start=event_citation.start,
-                    end=event_citation.end,
-                    document_ids=event_citation.document_ids,
+                stream_end_data["search_queries"] = search_queries
+            elif event["event_type"] == StreamEvent.TOOL_CALLS_GENERATION:
+                tool_calls = []
+                for tool_call in event["tool_calls"]:
+                    tool_calls.append(
+                        ToolCall(
+                            name=tool_call.name,
+                            parameters=tool_call.parameters,
+                        )
+                    )
+                stream_event = StreamToolCallsGeneration(
+                    **event | {"tool_calls": tool_calls}
                 )
-                for document_id in citation.document_ids:
-                    document = document_ids_to_document.get(document_id, None)
-                    if document is not None:
-                        citation.documents.append(document)
-                citations.append(citation)
-            stream_event = StreamCitationGeneration(**event | {"citations": citations})
-            all_citations.extend(citations)
-        elif event["event_type"] == StreamEvent.STREAM_END:
-            response_message.citations = all_citations
-            response_message.text = final_message_text
-
-            stream_end_data["citations"] = all_citations
-            stream_end_data["text"] = final_message_text
-            stream_end = StreamEnd.model_validate(event | stream_end_data)
-            stream_event = stream_end
-
-        yield json.dumps(
-            jsonable_encoder(
-                ChatResponseEvent(
-                    event=stream_event.event_type.value,
-                    data=stream_event,
+                stream_end_data["tool_calls"] = tool_calls
+            elif event["event_type"] == StreamEvent.CITATION_GENERATION:
+                citations = []
+                for event_citation in event["citations"]:
+                    citation = Citation(
+                        text=event_citation.text,
+                        user_id=response_message.user_id,
+                        start=event_citation.start,
+                        end=event_citation.end,
+                        document_ids=event_citation.document_ids,
+                    )
+                    for document_id in citation.document_ids:
+                        document = document_ids_to_document.get(document_id, None)
+                        if document is not None:
+                            citation.documents.append(document)
+                    citations.append(citation)
+                stream_event = StreamCitationGeneration(**event | {"citations": citations})
+                all_citations.extend(citations)
+            elif event["event_type"] == StreamEvent.STREAM_END:
+                response_message.citations = all_citations
+                response_message.text = final_message_text
+                response_message.token_count = count_tokens(final_message_text)
+
+                stream_end_data["citations"] = all_citations
+                stream_end_data["text"] = final_message_text
+                stream_end = StreamEnd.model_validate(event | stream_end_data)
+                stream_event = stream_end
+
+            yield encode_chat_response_event(stream_event)
+    except (asyncio.CancelledError, GeneratorExit):
+        # The client disconnected: stop the generation and keep the partial answer.
+        # Shielded, as every await in the cancelled request scope is interrupted.
+        with anyio.CancelScope(shield=True):
+            await model_deployment_stream.aclose()
+            if should_store:
+                response_message.citations = all_citations
+                response_message.text = final_message_text
+                response_message.token_count = count_tokens(final_message_text)
+                response_message.finish_reason = USER_CANCEL_FINISH_REASON
+                await persist_chat_turn(
+                    session_factory,
+                    response_message,
+                    conversation_id,
+                    final_message_text,
+                    user_id,
                 )
-            )
-        )
+        raise
 
     if should_store:
-        update_conversation_after_turn(
-            session, response_message, conversation_id, final_message_text, user_id
+        # The summary reads the stored turn, it is refreshed once it is written
+        await persist_chat_turn(
+            session_factory,
+            response_message,
+            conversation_id,
+            final_message_text,
+            user_id,
+            on_written=partial(
+                schedule_summary_refresh,
+                session_factory,
+                conversation_id,
+                user_id,
+                deployment_name,
+                response_message.position,
+            ),
         )
 
 
 def generate_chat_response(
     session: DBSessionDep,
-    model_deployment_response: Generator[StreamedChatResponse, None, None],
+    model_deployment_response: Generator["StreamedChatResponse", None, None],
     response_message: Message,
     conversation_id: str,
     user_id: str,
@@ -723,7 +1175,9 @@ def generate_chat_response(
     )
 
     response_message.text = non_streamed_chat_response.text
+    response_message.token_count = count_tokens(non_streamed_chat_response.text)
     response_message.generation_id = non_streamed_chat_response.generation_id
+    response_message.finish_reason = non_streamed_chat_response.finish_reason
 
     if should_store:
         update_conversation_after_turn(
@@ -739,13 +1193,19 @@ def generate_chat_response(
 
 @router.post("/langchain-chat")
 def langchain_chat_stream(
-    session: DBSessionDep, chat_request: LangchainChatRequest, request: Request
+    session: DBSessionDep,
+    session_factory: SessionFactoryDep,
+    chat_request: LangchainChatRequest,
+    request: Request,
 ):
 
     use_langchain = bool(strtobool(os.getenv("USE_EXPERIMENTAL_LANGCHAIN", "false")))
     if not use_langchain:
         return {"error": "Langchain is not enabled."}
 
+    # langchain is only imported when the experimental endpoint is used
+    from backend.chat.custom.langchain import LangChainChat
+
     (
         session,
         chat_request,
@@ -760,7 +1220,7 @@ def langchain_chat_stream(
 
     return EventSourceResponse(
         generate_langchain_chat_stream(
-            session,
+            session_factory,
             LangChainChat().chat(chat_request, managed_tools=managed_tools),
             response_message,
             conversation_id,
@@ -772,7 +1232,7 @@ def langchain_chat_stream(
 
 
 def generate_langchain_chat_stream(
-    session: DBSessionDep,
+    session_factory: SessionFactoryDep,
     model_deployment_stream: Generator[Any, None, None],
     response_message: Message,
     conversation_id: str,
@@ -780,6 +1240,9 @@ def generate_langchain_chat_stream(
     should_store: bool,
     **kwargs: Any,
 ):
+    from langchain_core.agents import AgentActionMessageLog
+    from langchain_core.runnables.utils import AddableDict
+
     final_message_text = ""
 
     # send stream start event
@@ -900,6 +1363,10 @@ def generate_langchain_chat_stream(
                     )
                 )
     if should_store:
-        update_conversation_after_turn(
-            session, response_message, conversation_id, final_message_text, user_id
-        )
+        persistence_worker = get_persistence_worker()
+        if persistence_worker is not None:
+            persistence_worker.submit(response_message)
+        else:
+            persist_conversation_turn(
+                session_factory, response_message, conversation_id, final_message_text, user_id
+            )
@@ -4,6 +4,7 @@ from backend.config.deployments import AVAILABLE_MODEL_DEPLOYMENTS
 from backend.models import get_session
 from backend.schemas.deployment import Deployment, UpdateDeploymentEnv
 from backend.services.env import update_env_file
+from backend.services.model_catalog import get_model_catalog
 from backend.services.request_validators import validate_env_vars
 
 router = APIRouter(
@@ -16,6 +17,8 @@ router = APIRouter(
 def list_deployments(all: bool = False) -> list[Deployment]:
     """
     List all available deployments and their models.
+    Models are served from the model catalog cache, models_stale is set
+    while an expired list is being refreshed.
 
     Returns:
         list[Deployment]: List of available deployment options.
@@ -36,7 +39,15 @@ def list_deployments(all: bool = False) -> list[Deployment]:
             ),
         )
 
-    return available_deployments
+    catalog = get_model_catalog()
+    deployments = []
+    for deployment in available_deployments:
+        models, stale = catalog.get_models(deployment.deployment_class)
+        deployments.append(
+            deployment.model_copy(update={"models": models, "models_stale": stale})
+        )
+
+    return deployments
 
 
 @router.post("/{name}/set_env_vars", response_class=Response)
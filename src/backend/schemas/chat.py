@@ -2,15 +2,22 @@ from enum import StrEnum
 from typing import Any, ClassVar, Dict, List, Union
 from uuid import uuid4
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+from pydantic_core import PydanticCustomError
 
 from backend.chat.enums import StreamEvent
+from backend.config.tools import AVAILABLE_TOOLS
 from backend.schemas.citation import Citation
 from backend.schemas.document import Document
 from backend.schemas.search_query import SearchQuery
 from backend.schemas.tool import Tool, ToolCall
 
 
+# Validation error type of the chat requests answered with a 400, see
+# services/request_validators.py
+BAD_REQUEST_ERROR = "bad_request"
+
+
 class ChatRole(StrEnum):
     """One of CHATBOT|USER to identify who the message is coming from."""
 
@@ -180,6 +187,10 @@ class StreamEnd(ChatResponse):
         default=[],
     )
     finish_reason: str = Field()
+    context_tokens_saved: int = Field(
+        title="Tokens of retrieved documents left out of the prompt to fit the budget.",
+        default=0,
+    )
 
 
 class NonStreamedChatResponse(ChatResponse):
@@ -340,3 +351,24 @@ class BaseChatRequest(BaseModel):
             ]
         """,
     )
+
+    @field_validator("tools")
+    @classmethod
+    def validate_tools(cls, tools: List[Tool] | None) -> List[Tool] | None:
+        """Managed and custom tools can't be mixed, custom tools need a description."""
+        if not tools:
+            return tools
+
+        managed_tools = [tool for tool in tools if tool.name in AVAILABLE_TOOLS]
+        if len(managed_tools) > 0 and len(tools) != len(managed_tools):
+            raise PydanticCustomError(
+                BAD_REQUEST_ERROR, "Cannot mix both managed and custom tools"
+            )
+
+        if len(managed_tools) == 0:
+            for tool in tools:
+                if not tool.description:
+                    raise PydanticCustomError(
+                        BAD_REQUEST_ERROR, "Custom tools must have a description"
+                    )
+        return tools
@@ -7,7 +7,9 @@ from backend.chat.custom.model_deployments.base import BaseDeployment
 
 class Deployment(BaseModel):
     name: str
-    models: list[str]
+    # Filled from the model catalog when the deployments are listed
+    models: list[str] = []
+    models_stale: bool = False
     is_available: bool = Field(exclude=True)
     deployment_class: Type[BaseDeployment] = Field(exclude=True)
     env_vars: list[str]
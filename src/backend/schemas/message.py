@@ -22,6 +22,7 @@ class Message(MessageBase):
     updated_at: datetime.datetime
 
     generation_id: Union[str, None]
+    finish_reason: Union[str, None] = None
 
     position: int
     is_active: bool
@@ -0,0 +1,200 @@
+"""
+Concurrent fan-out of blocking calls (retrievers, tools).
+
+Every call runs in a process-wide thread pool of FAN_OUT_MAX_WORKERS threads,
+each fan-out submitting at most max_concurrency calls at a time, and gets its
+own timeout, counted from the moment it starts running so queued calls are not
+penalised by the cap. Failures and timeouts are captured per call instead of
+being raised, so callers can keep the partial results.
+
+A thread can't be interrupted: a call that timed out keeps its pool thread
+until it returns, unless it honours a timeout of its own. The pool size bounds
+the threads left running. When they hold every pool thread, a call the pool
+doesn't start within the timeout of its submission times out too, and is never
+started.
+
+A fan-out awaited with run_cancellable is abandoned when the awaiting task is
+cancelled (e.g: the client disconnected), the queued calls are then never started.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    CancelledError,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from functools import partial
+from typing import Any, Callable
+
+import anyio
+
+FAN_OUT_MAX_WORKERS = int(os.getenv("FAN_OUT_MAX_WORKERS", "32"))
+# Seconds between checks of the cancellation of a fan-out
+CANCELLATION_POLL_INTERVAL = 0.1
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+class CallOutcome:
+    """Result of one call of a fan-out."""
+
+    def __init__(self):
+        self.value: Any = None
+        self.error: BaseException | None = None
+        self.elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _timed(call: Callable[[], Any], started: dict[int, float], index: int) -> tuple:
+    started[index] = time.monotonic()
+    try:
+        value, error = call(), None
+    except Exception as e:
+        value, error = None, e
+    return value, error, time.monotonic() - started[index]
+
+
+def get_fan_out_executor() -> ThreadPoolExecutor:
+    """Returns the process-wide fan-out thread pool."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=FAN_OUT_MAX_WORKERS, thread_name_prefix="fan-out"
+            )
+        return _executor
+
+
+def run_concurrently(
+    calls: list[Callable[[], Any]],
+    max_concurrency: int = 8,
+    timeout: float | None = None,
+    cancelled: threading.Event | None = None,
+) -> list[CallOutcome]:
+    """
+    Run blocking calls concurrently on the shared fan-out pool.
+
+    Args:
+        calls (list[Callable[[], Any]]): Calls to run.
+        max_concurrency (int): Maximum number of calls of this fan-out submitted
+            to the pool at the same time.
+        timeout (float | None): Seconds a call can run before it is abandoned, the
+            call itself is only stopped if it honours a timeout of its own. Also
+            the seconds a submitted call can wait for a pool thread.
+        cancelled (threading.Event | None): Set to abandon the calls not done yet.
+
+    Returns:
+        list[CallOutcome]: Outcome of each call, in the order of the calls.
+    """
+    outcomes = [CallOutcome() for _ in calls]
+    if not calls:
+        return outcomes
+
+    executor = get_fan_out_executor()
+    submitted: dict[int, float] = {}
+    started: dict[int, float] = {}
+    not_submitted = iter(enumerate(calls))
+    futures: dict[Future, int] = {}
+    pending: set[Future] = set()
+
+    def submit_next() -> None:
+        for index, call in not_submitted:
+            submitted[index] = time.monotonic()
+            future = executor.submit(_timed, call, started, index)
+            futures[future] = index
+            pending.add(future)
+            return
+
+    def deadline(index: int) -> float:
+        # Calls waiting for a pool thread are timed from their submission
+        return started.get(index, submitted[index]) + timeout
+
+    for _ in range(max(1, min(max_concurrency, len(calls)))):
+        submit_next()
+
+    try:
+        while pending:
+            wait_timeout = None
+            if timeout is not None:
+                next_deadline = min(deadline(futures[future]) for future in pending)
+                wait_timeout = max(0.0, next_deadline - time.monotonic())
+            if cancelled is not None:
+                wait_timeout = min(
+                    CANCELLATION_POLL_INTERVAL if wait_timeout is None else wait_timeout,
+                    CANCELLATION_POLL_INTERVAL,
+                )
+
+            done, pending = wait(
+                pending, timeout=wait_timeout, return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                outcome = outcomes[futures[future]]
+                outcome.value, outcome.error, outcome.elapsed = future.result()
+                submit_next()
+
+            if cancelled is not None and cancelled.is_set():
+                cancelled_indexes = [futures[future] for future in pending]
+                cancelled_indexes += [index for index, _ in not_submitted]
+                for index in cancelled_indexes:
+                    outcomes[index].error = CancelledError("Call cancelled")
+                break
+
+            if timeout is None:
+                continue
+
+            now = time.monotonic()
+            for future in list(pending):
+                index = futures[future]
+                if now < deadline(index):
+                    continue
+                if index in started:
+                    # The thread can't be interrupted, its result is discarded
+                    outcomes[index].error = TimeoutError(
+                        f"Call timed out after {timeout}s"
+                    )
+                    outcomes[index].elapsed = now - started[index]
+                else:
+                    future.cancel()
+                    outcomes[index].error = TimeoutError(
+                        f"Call not started after {timeout}s"
+                    )
+                pending.discard(future)
+                submit_next()
+    finally:
+        # Calls still queued in the pool are never started
+        for future in pending:
+            future.cancel()
+
+    return outcomes
+
+
+async def run_cancellable(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Run a blocking fan-out in a worker thread. The fan-out gets a `cancelled`
+    event, set when the awaiting task is cancelled, and is then abandoned
+    instead of holding the task until it completes.
+
+    Args:
+        func (Callable[..., Any]): Function accepting a `cancelled` keyword argument.
+        *args (Any): Positional arguments of the function.
+        **kwargs (Any): Keyword arguments of the function.
+
+    Returns:
+        Any: Result of the function.
+    """
+    cancelled = threading.Event()
+    try:
+        return await anyio.to_thread.run_sync(
+            partial(func, *args, cancelled=cancelled, **kwargs),
+            abandon_on_cancel=True,
+        )
+    finally:
+        cancelled.set()
@@ -0,0 +1,190 @@
+"""
+Catalog of the models offered by each deployment.
+
+Listing models can be a network call (e.g: the Cohere models API), so it is never
+done at import time nor while serving a request. The lists are cached in memory
+and on disk with a TTL, an expired list is still served, flagged as stale, while
+it is refreshed in a background thread. Only a cold start, with nothing cached,
+waits for the first fetch and at most MODEL_CATALOG_COLD_TIMEOUT seconds.
+
+MODEL_CATALOG_CACHE_PATH= (empty) disables the disk cache.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Mapping, Type
+
+from backend.chat.custom.model_deployments.base import BaseDeployment
+from backend.schemas.deployment import Deployment
+from backend.services.logger import get_logger
+
+MODEL_CATALOG_TTL = float(os.getenv("MODEL_CATALOG_TTL", "3600"))
+MODEL_CATALOG_CACHE_PATH = os.getenv(
+    "MODEL_CATALOG_CACHE_PATH", "model_catalog_cache.json"
+)
+MODEL_CATALOG_COLD_TIMEOUT = float(os.getenv("MODEL_CATALOG_COLD_TIMEOUT", "2"))
+
+logger = get_logger()
+
+
+class ModelCatalog:
+    """Cached model lists of the deployments, refreshed in the background."""
+
+    def __init__(
+        self,
+        cache_path: str = MODEL_CATALOG_CACHE_PATH,
+        ttl: float = MODEL_CATALOG_TTL,
+        cold_timeout: float = MODEL_CATALOG_COLD_TIMEOUT,
+    ):
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.cold_timeout = cold_timeout
+
+        self._entries: dict[str, dict] = {}
+        self._refreshing: dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._disk_loaded = False
+
+    def get_models(
+        self, deployment_class: Type[BaseDeployment]
+    ) -> tuple[list[str], bool]:
+        """
+        Get the models of a deployment without waiting on the network,
+        except on a cold start.
+
+        Args:
+            deployment_class (Type[BaseDeployment]): Deployment implementation.
+
+        Returns:
+            tuple[list[str], bool]: Models, and whether the list is stale.
+        """
+        self._load_disk_cache()
+        key = deployment_class.__name__
+
+        entry = self._entries.get(key)
+        if entry is not None and not self._is_expired(entry):
+            return entry["models"], False
+
+        refreshed = self.refresh(deployment_class)
+        if entry is not None:
+            return entry["models"], True
+
+        refreshed.wait(self.cold_timeout)
+        entry = self._entries.get(key)
+        if entry is None:
+            return [], True
+        return entry["models"], self._is_expired(entry)
+
+    def refresh(self, deployment_class: Type[BaseDeployment]) -> threading.Event:
+        """
+        Refresh the models of a deployment in a background thread,
+        at most one refresh runs per deployment.
+
+        Args:
+            deployment_class (Type[BaseDeployment]): Deployment implementation.
+
+        Returns:
+            threading.Event: Set when the refresh is done.
+        """
+        key = deployment_class.__name__
+        with self._lock:
+            refreshed = self._refreshing.get(key)
+            if refreshed is not None:
+                return refreshed
+            refreshed = threading.Event()
+            self._refreshing[key] = refreshed
+
+        threading.Thread(
+            target=self._refresh,
+            args=(key, deployment_class, refreshed),
+            name=f"model-catalog-{key}",
+            daemon=True,
+        ).start()
+        return refreshed
+
+    def warm(self, deployments: Mapping[str, Deployment]) -> None:
+        """
+        Refresh the models of the available deployments from a background thread.
+        Loading a deployment imports its SDK, so this is kept off the boot.
+
+        Args:
+            deployments (Mapping[str, Deployment]): Deployments registry.
+        """
+
+        def warm_deployments() -> None:
+            for name in list(deployments):
+                try:
+                    deployment = deployments[name]
+                except Exception as e:
+                    logger.warning(f"Couldn't load deployment {name}: {e}")
+                    continue
+                if deployment.is_available:
+                    self.refresh(deployment.deployment_class)
+
+        threading.Thread(
+            target=warm_deployments, name="model-catalog-warm", daemon=True
+        ).start()
+
+    def _refresh(
+        self,
+        key: str,
+        deployment_class: Type[BaseDeployment],
+        refreshed: threading.Event,
+    ) -> None:
+        try:
+            models = deployment_class.list_models()
+        except Exception as e:
+            # Keep serving the previous list
+            logger.warning(f"Couldn't list the models of {key}: {e}")
+        else:
+            with self._lock:
+                self._entries[key] = {"models": models, "fetched_at": time.time()}
+                self._save_disk_cache()
+        finally:
+            with self._lock:
+                self._refreshing.pop(key, None)
+            refreshed.set()
+
+    def _is_expired(self, entry: dict) -> bool:
+        return time.time() - entry["fetched_at"] >= self.ttl
+
+    def _load_disk_cache(self) -> None:
+        if self._disk_loaded:
+            return
+
+        with self._lock:
+            if self._disk_loaded:
+                return
+            self._disk_loaded = True
+            if not self.cache_path or not os.path.exists(self.cache_path):
+                return
+            try:
+                with open(self.cache_path) as f:
+                    self._entries.update(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring the model catalog cache: {e}")
+
+    def _save_disk_cache(self) -> None:
+        if not self.cache_path:
+            return
+
+        tmp_path = self.cache_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Couldn't write the model catalog cache: {e}")
+
+
+_catalog: ModelCatalog | None = None
+
+
+def get_model_catalog() -> ModelCatalog:
+    """Returns the process-wide model catalog."""
+    global _catalog
+    if _catalog is None:
+        _catalog = ModelCatalog()
+    return _catalog
@@ -0,0 +1,436 @@
+"""
+Write-behind persistence of chat turns.
+
+Completed turns (the chatbot message with its documents and citations) are put on
+an in-process queue and written by a background thread, grouped in a single
+transaction per batch. Transient database failures are retried with a backoff,
+if the database stays unavailable the batch is spooled to a local JSONL file
+which is replayed when the worker starts and every PERSISTENCE_SPOOL_REPLAY_INTERVAL
+seconds.
+
+The worker writes a copy of the submitted message, the caller keeps its own
+object. A callback passed to submit runs on the worker thread once the turn is
+written, it doesn't run for spooled turns. Turns queued or spooled can be read
+back with get_pending_turn, or get_pending_turns for a conversation, until they
+are written.
+
+The spool file can be shared by the workers of several processes, it is only
+appended to and replayed under an exclusive lock on PERSISTENCE_SPOOL_PATH.lock.
+A replay moves the spool to PERSISTENCE_SPOOL_PATH.replay first, a replay file
+left over by a crash is replayed with the next spool. Unreadable lines are skipped.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from distutils.util import strtobool
+from typing import Any, Callable, ContextManager, Iterator, Tuple
+
+from sqlalchemy.exc import IntegrityError, InterfaceError, OperationalError
+from sqlalchemy.orm import Session
+
+from backend.models.citation import Citation
+from backend.models.document import Document
+from backend.models.message import Message, MessageAgent
+from backend.services.logger import get_logger
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, the spool is then only locked within the process
+    fcntl = None
+
+use_background_persistence = bool(
+    strtobool(os.getenv("USE_BACKGROUND_PERSISTENCE", "true"))
+)
+
+logger = get_logger()
+
+_STOP = object()
+
+# Queued turn: a copy of the message and the callback run once it is written
+PendingTurn = Tuple[Message, Callable[[], None] | None]
+
+
+class ChatTurnPersistenceWorker:
+    """Background writer for completed chat turns."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], ContextManager[Session]],
+        batch_size: int = int(os.getenv("PERSISTENCE_BATCH_SIZE", "50")),
+        flush_interval: float = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", "0.2")),
+        max_retries: int = int(os.getenv("PERSISTENCE_MAX_RETRIES", "3")),
+        retry_backoff: float = float(os.getenv("PERSISTENCE_RETRY_BACKOFF", "0.5")),
+        spool_path: str = os.getenv(
+            "PERSISTENCE_SPOOL_PATH", "chat_turns_spool.jsonl"
+        ),
+        spool_replay_interval: float = float(
+            os.getenv("PERSISTENCE_SPOOL_REPLAY_INTERVAL", "60")
+        ),
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.spool_path = spool_path
+        self.spool_replay_interval = spool_replay_interval
+
+        self.queue: queue.Queue = queue.Queue()
+        self._spool_lock = threading.Lock()
+        # Serialized turns not written yet, by message ID
+        self._pending: dict[str, dict[str, Any]] = {}
+        self._pending_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._next_replay = 0.0
+
+    def start(self) -> None:
+        """Replays spooled turns and starts the writer thread."""
+        if self._thread is not None:
+            return
+
+        self._safe_replay_spool()
+        self._next_replay = time.monotonic() + self.spool_replay_interval
+        self._thread = threading.Thread(
+            target=self._run, name="chat-turn-persistence", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float | None = 30) -> None:
+        """Drains the queue and stops the writer thread."""
+        if self._thread is None:
+            return
+
+        self.queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(
+        self, message: Message, on_written: Callable[[], None] | None = None
+    ) -> None:
+        """
+        Queues a copy of a completed turn, never blocks on the database.
+
+        Args:
+            message (Message): Message with its documents and citations.
+            on_written (Callable[[], None] | None): Called on the worker thread once
+                the turn is written.
+        """
+        data = message_to_dict(message)
+        with self._pending_lock:
+            self._pending[message.id] = data
+        self.queue.put((message_from_dict(data), on_written))
+
+    def get_pending_turn(self, message_id: str) -> Message | None:
+        """
+        Gets a turn queued or spooled but not written yet.
+
+        Args:
+            message_id (str): Chatbot message ID.
+
+        Returns:
+            Message | None: Copy of the message, None if it isn't pending.
+        """
+        with self._pending_lock:
+            data = self._pending.get(message_id)
+        return message_from_dict(data) if data is not None else None
+
+    def get_pending_turns(self, conversation_id: str) -> list[Message]:
+        """
+        Gets the turns of a conversation queued or spooled but not written yet.
+
+        Args:
+            conversation_id (str): Conversation ID.
+
+        Returns:
+            list[Message]: Copies of the messages, in no particular order.
+        """
+        with self._pending_lock:
+            turns = [
+                data
+                for data in self._pending.values()
+                if data["conversation_id"] == conversation_id
+            ]
+        return [message_from_dict(data) for data in turns]
+
+    def flush(self) -> None:
+        """Blocks until every queued turn has been written or spooled."""
+        self.queue.join()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            if time.monotonic() >= self._next_replay:
+                self._safe_replay_spool()
+                self._next_replay = time.monotonic() + self.spool_replay_interval
+
+            try:
+                item = self.queue.get(
+                    timeout=max(self._next_replay - time.monotonic(), 0)
+                )
+            except queue.Empty:
+                continue
+            if item is _STOP:
+                self.queue.task_done()
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self.queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                self._write_batch(batch)
+            except Exception:
+                logger.exception("Unexpected error persisting chat turns, spooling.")
+                self._spool(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _write_batch(self, turns: list[PendingTurn]) -> None:
+        # The messages are expired by the commit, their IDs are read before
+        message_ids = [message.id for message, _ in turns]
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.session_factory() as session:
+                    session.add_all([message for message, _ in turns])
+                    session.commit()
+                break
+            except IntegrityError:
+                # One turn of the batch conflicts (e.g: already written by a
+                # previous attempt), write them one by one so the others are kept
+                self._write_each(turns)
+                return
+            except (OperationalError, InterfaceError) as e:
+                if attempt == self.max_retries:
+                    logger.warning(
+                        f"Database unavailable, spooling {len(turns)} chat turns: {e}"
+                    )
+                    self._spool(turns)
+                    return
+                time.sleep(self.retry_backoff * 2**attempt)
+
+        for message_id, (_, on_written) in zip(message_ids, turns):
+            self._forget(message_id)
+            self._notify(on_written)
+
+    def _write_each(self, turns: list[PendingTurn]) -> None:
+        for message, on_written in turns:
+            message_id = message.id
+            try:
+                with self.session_factory() as session:
+                    session.add(message)
+                    session.commit()
+            except IntegrityError as e:
+                logger.warning(f"Skipping chat turn {message_id}: {e}")
+                self._forget(message_id)
+                continue
+            except (OperationalError, InterfaceError):
+                self._spool([(message, on_written)])
+                continue
+            self._forget(message_id)
+            self._notify(on_written)
+
+    def _forget(self, message_id: str) -> None:
+        with self._pending_lock:
+            self._pending.pop(message_id, None)
+
+    def _notify(self, on_written: Callable[[], None] | None) -> None:
+        if on_written is None:
+            return
+        try:
+            on_written()
+        except Exception:
+            logger.exception("Error in chat turn written callback.")
+
+    @contextmanager
+    def _locked_spool(self) -> Iterator[None]:
+        with self._spool_lock, open(self.spool_path + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                # Released when the lock file is closed
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _spool(self, turns: list[PendingTurn]) -> None:
+        try:
+            with self._locked_spool(), open(self.spool_path, "a") as f:
+                for message, _ in turns:
+                    f.write(json.dumps(message_to_dict(message)) + "\n")
+        except OSError:
+            logger.exception(f"Couldn't spool {len(turns)} chat turns, they are lost.")
+
+    def _safe_replay_spool(self) -> None:
+        # The writer thread must survive a failed replay, the spool is kept
+        try:
+            self._replay_spool()
+        except Exception:
+            logger.exception("Couldn't replay the spooled chat turns.")
+
+    def _replay_spool(self) -> None:
+        replay_path = self.spool_path + ".replay"
+        with self._locked_spool():
+            if os.path.exists(self.spool_path):
+                if os.path.exists(replay_path):
+                    # Left over by a crash during a replay, replayed first
+                    with open(replay_path, "a") as replay, open(self.spool_path) as f:
+                        replay.write(f.read())
+                    os.remove(self.spool_path)
+                else:
+                    os.replace(self.spool_path, replay_path)
+            elif not os.path.exists(replay_path):
+                return
+
+            turns = []
+            with open(replay_path) as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        data = json.loads(line)
+                        turns.append((data, message_from_dict(data)))
+                    except (ValueError, KeyError, TypeError) as e:
+                        logger.warning(
+                            f"Skipping unreadable spooled chat turn at line {line_number}: {e}"
+                        )
+
+            logger.info(f"Replaying {len(turns)} spooled chat turns.")
+            for data, message in turns:
+                with self._pending_lock:
+                    self._pending[data["id"]] = data
+                self.queue.put((message, None))
+            os.remove(replay_path)
+
+
+def message_to_dict(message: Message) -> dict[str, Any]:
+    """
+    Serializes a chat turn for the spool file.
+
+    Args:
+        message (Message): Message with its documents and citations.
+
+    Returns:
+        dict[str, Any]: JSON serializable turn.
+    """
+    return {
+        "id": message.id,
+        "user_id": message.user_id,
+        "conversation_id": message.conversation_id,
+        "text": message.text,
+        "position": message.position,
+        "is_active": message.is_active,
+        "generation_id": message.generation_id,
+        "token_count": message.token_count,
+        "finish_reason": message.finish_reason,
+        "is_annotation_response": message.is_annotation_response,
+        "agent": message.agent.value if message.agent else None,
+        "documents": [
+            {
+                "document_id": document.document_id,
+                "text": document.text,
+                "title": document.title,
+                "url": document.url,
+                "user_id": document.user_id,
+                "conversation_id": document.conversation_id,
+            }
+            for document in message.documents
+        ],
+        "citations": [
+            {
+                "text": citation.text,
+                "user_id": citation.user_id,
+                "start": citation.start,
+                "end": citation.end,
+                "document_ids": citation.document_ids,
+            }
+            for citation in message.citations
+        ],
+    }
+
+
+def message_from_dict(data: dict[str, Any]) -> Message:
+    """
+    Rebuilds a chat turn from the spool file.
+
+    Args:
+        data (dict[str, Any]): Turn serialized with message_to_dict.
+
+    Returns:
+        Message: Transient message with its documents and citations.
+    """
+    message = Message(
+        id=data["id"],
+        user_id=data["user_id"],
+        conversation_id=data["conversation_id"],
+        text=data["text"],
+        position=data["position"],
+        is_active=data["is_active"],
+        generation_id=data["generation_id"],
+        token_count=data.get("token_count"),
+        finish_reason=data.get("finish_reason"),
+        is_annotation_response=data["is_annotation_response"],
+        agent=MessageAgent(data["agent"]) if data["agent"] else None,
+    )
+
+    documents_by_id = {}
+    for document in data["documents"]:
+        storage_document = Document(**document, message_id=message.id)
+        documents_by_id[document["document_id"]] = storage_document
+    message.documents = list(documents_by_id.values())
+
+    citations = []
+    for citation_data in data["citations"]:
+        citation = Citation(**citation_data)
+        for document_id in citation.document_ids or []:
+            document = documents_by_id.get(document_id)
+            if document is not None:
+                citation.documents.append(document)
+        citations.append(citation)
+    message.citations = citations
+
+    return message
+
+
+_worker: ChatTurnPersistenceWorker | None = None
+
+
+def start_persistence_worker(
+    session_factory: Callable[[], ContextManager[Session]]
+) -> ChatTurnPersistenceWorker:
+    """Starts the process-wide persistence worker."""
+    global _worker
+    if _worker is None:
+        _worker = ChatTurnPersistenceWorker(session_factory)
+        _worker.start()
+    return _worker
+
+
+def stop_persistence_worker() -> None:
+    """Drains and stops the process-wide persistence worker."""
+    global _worker
+    if _worker is not None:
+        _worker.stop()
+        _worker = None
+
+
+def get_persistence_worker() -> ChatTurnPersistenceWorker | None:
+    """
+    Returns the process-wide persistence worker, or None when turns are
+    written synchronously (USE_BACKGROUND_PERSISTENCE=false or not started).
+    """
+    return _worker
@@ -1,9 +1,12 @@
 from urllib.parse import unquote_plus
 
 from fastapi import HTTPException, Request
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
 
 from backend.config.deployments import AVAILABLE_MODEL_DEPLOYMENTS
-from backend.config.tools import AVAILABLE_TOOLS
+from backend.schemas.chat import BAD_REQUEST_ERROR
 
 
 def validate_user_header(request: Request):
@@ -48,33 +51,25 @@ def validate_deployment_header(request: Request):
         )
 
 
-async def validate_chat_request(request: Request):
+async def chat_request_exception_handler(
+    request: Request, exc: RequestValidationError
+) -> JSONResponse:
     """
-    Validate that the request has the appropriate values in the body
+    Answer the chat request rules broken in the body, validated with the model
+    (see BaseChatRequest), with a 400 and their message. Other validation errors
+    get FastAPI's default 422.
 
     Args:
-        request (Request): The request to validate
+        request (Request): The request that failed validation
+        exc (RequestValidationError): The validation error
 
-    Raises:
-        HTTPException: If the request does not have the appropriate values in the body
+    Returns:
+        JSONResponse: The error response
     """
-    body = await request.json()
-    tools = body.get("tools")
-    if not tools:
-        return
-
-    managed_tools = [tool["name"] for tool in tools if tool["name"] in AVAILABLE_TOOLS]
-    if len(managed_tools) > 0 and len(tools) != len(managed_tools):
-        raise HTTPException(
-            status_code=400, detail="Cannot mix both managed and custom tools"
-        )
-
-    if len(managed_tools) == 0:
-        for tool in tools:
-            if not tool.get("description"):
-                raise HTTPException(
-                    status_code=400, detail="Custom tools must have a description"
-                )
+    for error in exc.errors():
+        if error["type"] == BAD_REQUEST_ERROR:
+            return JSONResponse(status_code=400, content={"detail": error["msg"]})
+    return await request_validation_exception_handler(request, exc)
 
 
 async def validate_env_vars(request: Request):
@@ -0,0 +1,413 @@
+"""
+Cache of the answers to deterministic chat requests.
+
+A request is deterministic when its temperature is 0 or its seed is fixed: the
+same deployment, model, chat history, message, documents and parameters then
+produce the same answer. Answers are kept in memory, keyed by a hash of all of
+those, evicted by LRU and TTL, and capped in entries and characters.
+
+The semantic tier (RESPONSE_CACHE_SIMILARITY between 0 and 1) also serves first
+turn prompts whose embedding is close enough to a cached one, from the same user,
+with the same deployment, parameters, documents and tool results. It needs a
+deployment supporting embeddings and the user of the request.
+
+Only complete answers are cached.
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from distutils.util import strtobool
+from typing import Any
+
+from backend.chat.custom.model_deployments.base import BaseDeployment
+from backend.chat.enums import StreamEvent
+from backend.schemas.chat import ChatRole
+from backend.schemas.cohere_chat import CohereChatRequest
+from backend.services.logger import get_logger
+
+use_response_cache = bool(strtobool(os.getenv("USE_RESPONSE_CACHE", "false")))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_MAX_CHARS = int(os.getenv("RESPONSE_CACHE_MAX_CHARS", "20000000"))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+
+COMPLETE_FINISH_REASON = "COMPLETE"
+
+logger = get_logger()
+
+# Fields that identify the request but don't change the answer
+_EXCLUDED_FIELDS = {
+    "conversation_id",
+    "user_msg_id",
+    "bot_msg_id",
+    "file_ids",
+    "stream",
+}
+
+
+class CachedResponse:
+    """Cached answer, with what the semantic tier needs to match it."""
+
+    def __init__(
+        self,
+        value: Any,
+        size: int,
+        expires_at: float,
+        scope: str | None = None,
+        embedding: list[float] | None = None,
+    ):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.scope = scope
+        self.embedding = embedding
+
+
+class CacheLookup:
+    """Keys of a request in the cache, and its cached answer on a hit."""
+
+    def __init__(
+        self,
+        key: str,
+        scope: str | None = None,
+        embedding: list[float] | None = None,
+        value: Any = None,
+    ):
+        self.key = key
+        self.scope = scope
+        self.embedding = embedding
+        self.value = value
+
+    @property
+    def hit(self) -> bool:
+        return self.value is not None
+
+
+class ResponseCache:
+    """In-memory LRU cache of answers, with a TTL and a size cap."""
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        max_chars: int = RESPONSE_CACHE_MAX_CHARS,
+        ttl: float = RESPONSE_CACHE_TTL,
+        similarity: float = RESPONSE_CACHE_SIMILARITY,
+    ):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.ttl = ttl
+        self.similarity = similarity
+
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    @property
+    def semantic(self) -> bool:
+        """Whether the semantic tier is enabled."""
+        return 0 < self.similarity <= 1
+
+    def get(self, key: str) -> Any | None:
+        """
+        Get the cached answer of a request.
+
+        Args:
+            key (str): Request key, see get_cache_key.
+
+        Returns:
+            Any | None: Cached answer, None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def get_similar(self, scope: str, embedding: list[float]) -> Any | None:
+        """
+        Get the cached answer of the most similar first turn prompt.
+
+        Args:
+            scope (str): Deployment and parameters key, see get_semantic_scope.
+            embedding (list[float]): Embedding of the prompt.
+
+        Returns:
+            Any | None: Cached answer, None if no prompt is similar enough.
+        """
+        embedding = _normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            best_key, best_similarity = None, self.similarity
+            for key, entry in self._entries.items():
+                if entry.scope != scope or entry.expires_at <= now:
+                    continue
+                similarity = sum(a * b for a, b in zip(entry.embedding, embedding))
+                if similarity >= best_similarity:
+                    best_key, best_similarity = key, similarity
+
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key].value
+
+    def put(
+        self,
+        key: str,
+        value: Any,
+        size: int,
+        scope: str | None = None,
+        embedding: list[float] | None = None,
+    ) -> None:
+        """
+        Cache an answer, evicting the least recently used ones over the caps.
+
+        Args:
+            key (str): Request key, see get_cache_key.
+            value (Any): Answer.
+            size (int): Characters of the answer.
+            scope (str | None): Semantic tier scope, for first turn prompts.
+            embedding (list[float] | None): Embedding of the prompt, for the semantic tier.
+        """
+        if size > self.max_chars:
+            return
+
+        entry = CachedResponse(
+            value,
+            size,
+            time.monotonic() + self.ttl,
+            scope if embedding is not None else None,
+            _normalize(embedding) if embedding is not None else None,
+        )
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._chars += size
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._chars > self.max_chars
+            ):
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._chars -= entry.size
+
+
+def _normalize(embedding: list[float]) -> list[float]:
+    norm = math.sqrt(sum(value * value for value in embedding)) or 1.0
+    return [value / norm for value in embedding]
+
+
+def _hash(payload: Any) -> str:
+    # Tool results hold pydantic objects, serialized by their string representation
+    data = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def is_deterministic(chat_request: CohereChatRequest) -> bool:
+    """Whether the request always gets the same answer."""
+    return chat_request.temperature == 0 or chat_request.seed is not None
+
+
+def is_first_turn(chat_request: CohereChatRequest) -> bool:
+    """Whether the model hasn't answered in the chat history yet."""
+    return not any(
+        message.role == ChatRole.CHATBOT for message in chat_request.chat_history or []
+    )
+
+
+def get_cache_key(
+    deployment_name: str, chat_request: CohereChatRequest, stream: bool, **kwargs: Any
+) -> str | None:
+    """
+    Get the cache key of a request.
+
+    Args:
+        deployment_name (str): Name of the deployment class.
+        chat_request (CohereChatRequest): Chat request, with its documents.
+        stream (bool): Whether the answer is streamed.
+        **kwargs (Any): Keyword arguments of the deployment call, e.g: tool results.
+
+    Returns:
+        str | None: Key, None if the request is not deterministic.
+    """
+    if not is_deterministic(chat_request):
+        return None
+
+    return _hash(
+        {
+            "deployment": deployment_name,
+            "stream": stream,
+            "request": chat_request.model_dump(mode="json", exclude=_EXCLUDED_FIELDS),
+            "kwargs": kwargs,
+        }
+    )
+
+
+def get_semantic_scope(
+    deployment_name: str,
+    chat_request: CohereChatRequest,
+    stream: bool,
+    user_id: str,
+    **kwargs: Any,
+) -> str:
+    """
+    Get the key of the user, deployment, parameters and documents of a first turn
+    prompt, the prompts of a scope are matched by similarity.
+
+    Args:
+        deployment_name (str): Name of the deployment class.
+        chat_request (CohereChatRequest): Chat request, with its documents.
+        stream (bool): Whether the answer is streamed.
+        user_id (str): User ID, answers are never shared across users.
+        **kwargs (Any): Keyword arguments of the deployment call, e.g: tool results.
+
+    Returns:
+        str: Scope key.
+    """
+    return _hash(
+        {
+            "user": user_id,
+            "deployment": deployment_name,
+            "stream": stream,
+            "request": chat_request.model_dump(
+                mode="json", exclude=_EXCLUDED_FIELDS | {"message", "chat_history"}
+            ),
+            "kwargs": kwargs,
+        }
+    )
+
+
+def lookup_response(
+    cache: ResponseCache,
+    deployment_model: BaseDeployment,
+    chat_request: CohereChatRequest,
+    stream: bool,
+    user_id: str | None = None,
+    **kwargs: Any,
+) -> CacheLookup | None:
+    """
+    Look up the answer of a request, in the exact tier then in the semantic tier.
+    Blocking, the prompt is embedded for the semantic tier.
+
+    Args:
+        cache (ResponseCache): Response cache.
+        deployment_model (BaseDeployment): Model deployment.
+        chat_request (CohereChatRequest): Chat request, with its documents.
+        stream (bool): Whether the answer is streamed.
+        user_id (str | None): User ID, the semantic tier is skipped without it.
+        **kwargs (Any): Keyword arguments of the deployment call, e.g: tool results.
+
+    Returns:
+        CacheLookup | None: Lookup, None if the request can't be cached.
+    """
+    deployment_name = deployment_model.__class__.__name__
+    key = get_cache_key(deployment_name, chat_request, stream, **kwargs)
+    if key is None:
+        return None
+
+    lookup = CacheLookup(key, value=cache.get(key))
+    if (
+        lookup.hit
+        or not cache.semantic
+        or not user_id
+        or not deployment_model.embed_enabled
+        or not is_first_turn(chat_request)
+    ):
+        return lookup
+
+    try:
+        lookup.embedding = deployment_model.invoke_embed([chat_request.message])[0]
+    except Exception as e:
+        logger.warning(f"Couldn't embed the prompt for the response cache: {e}")
+        return lookup
+
+    lookup.scope = get_semantic_scope(
+        deployment_name, chat_request, stream, user_id, **kwargs
+    )
+    lookup.value = cache.get_similar(lookup.scope, lookup.embedding)
+    return lookup
+
+
+def store_response(
+    cache: ResponseCache,
+    lookup: CacheLookup,
+    value: Any,
+    size: int,
+    finish_reason: str | None,
+) -> None:
+    """
+    Cache the answer of a request looked up with lookup_response, if complete.
+
+    Args:
+        cache (ResponseCache): Response cache.
+        lookup (CacheLookup): Lookup of the request.
+        value (Any): Answer.
+        size (int): Characters of the answer.
+        finish_reason (str | None): Finish reason of the answer.
+    """
+    if finish_reason != COMPLETE_FINISH_REASON:
+        return
+    cache.put(lookup.key, value, size, lookup.scope, lookup.embedding)
+
+
+def compact_stream_events(
+    events: list[dict[str, Any]]
+) -> tuple[list[dict[str, Any]], int]:
+    """
+    Compact the events of a streamed answer for the cache, the consecutive text
+    generation events are merged and the stream start is dropped.
+
+    Args:
+        events (list[dict[str, Any]]): Events of the deployment stream.
+
+    Returns:
+        tuple[list[dict[str, Any]], int]: Events to replay, and characters of the answer.
+    """
+    compacted = []
+    size = 0
+    for event in events:
+        if event["event_type"] == StreamEvent.STREAM_START:
+            continue
+        if event["event_type"] == StreamEvent.TEXT_GENERATION:
+            size += len(event["text"] or "")
+            if compacted and compacted[-1]["event_type"] == StreamEvent.TEXT_GENERATION:
+                compacted[-1] = compacted[-1] | {
+                    "text": compacted[-1]["text"] + (event["text"] or "")
+                }
+                continue
+        compacted.append(event)
+    return compacted, size
+
+
+_cache: ResponseCache | None = None
+
+
+def get_response_cache() -> ResponseCache | None:
+    """
+    Returns the process-wide response cache, or None when it is disabled
+    (USE_RESPONSE_CACHE=false).
+    """
+    global _cache
+    if not use_response_cache:
+        return None
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
@@ -0,0 +1,59 @@
+"""
+Token counting for the chat history budget.
+
+Uses the tiktoken encoding of the OpenAI chat models when tiktoken is installed,
+otherwise an estimate of 4 characters per token. Counts are computed once, when
+a message is written, and stored on the message.
+"""
+
+import math
+import threading
+from typing import Any
+
+from backend.services.logger import get_logger
+
+TIKTOKEN_ENCODING = "cl100k_base"
+CHARS_PER_TOKEN = 4
+
+logger = get_logger()
+
+_encoding: Any = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding() -> Any:
+    global _encoding, _encoding_loaded
+    if _encoding_loaded:
+        return _encoding
+
+    with _encoding_lock:
+        if not _encoding_loaded:
+            try:
+                import tiktoken
+
+                _encoding = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+            except Exception as e:
+                logger.info(f"tiktoken not available, estimating token counts: {e}")
+                _encoding = None
+            _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str | None) -> int:
+    """
+    Count the tokens of a text.
+
+    Args:
+        text (str | None): Text to count.
+
+    Returns:
+        int: Number of tokens, estimated if tiktoken is not installed.
+    """
+    if not text:
+        return 0
+
+    encoding = _get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
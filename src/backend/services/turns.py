@@ -0,0 +1,261 @@
+"""
+Registry of the streamed chat turns in flight, keyed by the client generated
+bot message ID, so a retried request attaches to the generation in progress
+instead of starting a second one.
+
+A turn is generated by a task of its own and its encoded events are numbered
+and kept in an event buffer, each request attached to the turn replays them
+then follows the new ones. A client reconnecting with the ID of the last event
+it got resumes after it, as long as the buffer still holds the next one.
+
+A request disconnecting doesn't stop the generation while others are attached.
+Once the last one left, the generation keeps running TURN_RESUME_GRACE_PERIOD
+seconds for the client to reconnect, then it is cancelled. Finished turns are
+kept TURN_REPLAY_TTL seconds, so a retry is replayed even before the response
+is written to the database.
+"""
+
+import asyncio
+import os
+from abc import abstractmethod
+from collections import deque
+from typing import AsyncGenerator, AsyncIterator, Callable
+
+from backend.services.logger import get_logger
+
+TURN_REPLAY_TTL = float(os.getenv("TURN_REPLAY_TTL", "60"))
+TURN_RESUME_GRACE_PERIOD = float(os.getenv("TURN_RESUME_GRACE_PERIOD", "30"))
+TURN_EVENT_BUFFER_SIZE = int(os.getenv("TURN_EVENT_BUFFER_SIZE", "1000"))
+
+logger = get_logger()
+
+
+class BaseEventBuffer:
+    """Base for the stores of the recent events of a turn."""
+
+    @abstractmethod
+    def append(self, event: str) -> int:
+        """Store an event and return its ID, the events are numbered from 0."""
+        ...
+
+    @abstractmethod
+    def read(self, start: int) -> list[tuple[int, str]]:
+        """Return the stored events from ID start, with their IDs."""
+        ...
+
+    @abstractmethod
+    def first_id(self) -> int:
+        """Return the ID of the oldest event stored, or of the next one if none is."""
+        ...
+
+    @abstractmethod
+    def next_id(self) -> int:
+        """Return the ID of the next event."""
+        ...
+
+
+class InMemoryEventBuffer(BaseEventBuffer):
+    """Ring buffer of the recent events of a turn, in the process memory."""
+
+    def __init__(self, max_events: int = TURN_EVENT_BUFFER_SIZE):
+        self._events: deque[str] = deque(maxlen=max_events)
+        self._next_id = 0
+
+    def append(self, event: str) -> int:
+        self._events.append(event)
+        self._next_id += 1
+        return self._next_id - 1
+
+    def read(self, start: int) -> list[tuple[int, str]]:
+        first_id = self.first_id()
+        start = max(start, first_id)
+        return [
+            (event_id, self._events[event_id - first_id])
+            for event_id in range(start, self._next_id)
+        ]
+
+    def first_id(self) -> int:
+        return self._next_id - len(self._events)
+
+    def next_id(self) -> int:
+        return self._next_id
+
+
+class TurnStream:
+    """Encoded events of a streamed chat turn, shared by the requests attached to it."""
+
+    def __init__(
+        self,
+        turn_id: tuple[str, str],
+        on_finished: Callable[["TurnStream"], None],
+        events: BaseEventBuffer | None = None,
+        grace_period: float = TURN_RESUME_GRACE_PERIOD,
+    ):
+        self.turn_id = turn_id
+        self.events = events if events is not None else InMemoryEventBuffer()
+        self.grace_period = grace_period
+        self.finished = False
+        self.subscribers = 0
+
+        self._on_finished = on_finished
+        self._changed = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._grace_timer: asyncio.TimerHandle | None = None
+
+    def start(self, stream: AsyncIterator[str]) -> None:
+        """
+        Generate the turn in a task of its own.
+
+        Args:
+            stream (AsyncIterator[str]): Encoded events of the turn.
+        """
+        self._task = asyncio.create_task(self._generate(stream))
+
+    def can_resume(self, start: int) -> bool:
+        """
+        Whether the events from ID start can all be sent.
+
+        Args:
+            start (int): ID of the first event to send.
+
+        Returns:
+            bool: False if some of them were dropped from the event buffer.
+        """
+        return start >= self.events.first_id()
+
+    async def subscribe(self, start: int = 0) -> AsyncGenerator[tuple[int, str], None]:
+        """
+        Replay the events of the turn, then follow the new ones until it finishes.
+
+        Args:
+            start (int): ID of the first event to send.
+
+        Yields:
+            tuple[int, str]: Event ID and encoded event.
+        """
+        self.subscribers += 1
+        if self._grace_timer is not None:
+            self._grace_timer.cancel()
+            self._grace_timer = None
+
+        next_id = start
+        try:
+            while True:
+                for event_id, event in self.events.read(next_id):
+                    yield event_id, event
+                    next_id = event_id + 1
+                if self.finished and next_id >= self.events.next_id():
+                    return
+                changed = self._changed
+                await changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.finished:
+                # Leaves the client time to reconnect before cancelling
+                self._grace_timer = asyncio.get_running_loop().call_later(
+                    self.grace_period, self._cancel_unattended
+                )
+
+    def close(self) -> None:
+        """End the turn without generating it, e.g: when it couldn't be set up."""
+        self.finished = True
+        self._notify()
+
+    def cancel(self) -> None:
+        """Cancel the generation, if the turn is not finished."""
+        if self._task is not None and not self.finished:
+            self._task.cancel()
+
+    def _cancel_unattended(self) -> None:
+        self._grace_timer = None
+        if self.subscribers == 0:
+            self.cancel()
+
+    async def _generate(self, stream: AsyncIterator[str]) -> None:
+        try:
+            async for event in stream:
+                self.events.append(event)
+                self._notify()
+        except Exception:
+            logger.exception(f"Chat turn {self.turn_id[1]} failed.")
+        finally:
+            self.finished = True
+            self._notify()
+            self._on_finished(self)
+
+    def _notify(self) -> None:
+        # Wakes the subscribers waiting on the current event, later waits use a new one
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+class TurnRegistry:
+    """Streamed chat turns in flight, and recently finished, by user and bot message ID."""
+
+    def __init__(
+        self,
+        replay_ttl: float = TURN_REPLAY_TTL,
+        grace_period: float = TURN_RESUME_GRACE_PERIOD,
+        event_buffer_factory: Callable[[], BaseEventBuffer] = InMemoryEventBuffer,
+    ):
+        self.replay_ttl = replay_ttl
+        self.grace_period = grace_period
+        self.event_buffer_factory = event_buffer_factory
+        self._turns: dict[tuple[str, str], TurnStream] = {}
+
+    def get(self, user_id: str, bot_msg_id: str) -> TurnStream | None:
+        """
+        Get a turn in flight or recently finished.
+
+        Args:
+            user_id (str): User ID.
+            bot_msg_id (str): Bot message ID of the turn.
+
+        Returns:
+            TurnStream | None: Turn, None if unknown.
+        """
+        return self._turns.get((user_id, bot_msg_id))
+
+    def reserve(self, user_id: str, bot_msg_id: str) -> tuple[TurnStream, bool]:
+        """
+        Get a turn, or register a new one to be started.
+
+        Args:
+            user_id (str): User ID.
+            bot_msg_id (str): Bot message ID of the turn.
+
+        Returns:
+            tuple[TurnStream, bool]: Turn, and whether it was registered by this call.
+        """
+        turn_id = (user_id, bot_msg_id)
+        turn = self._turns.get(turn_id)
+        if turn is not None:
+            return turn, False
+
+        turn = TurnStream(
+            turn_id,
+            self._finished,
+            events=self.event_buffer_factory(),
+            grace_period=self.grace_period,
+        )
+        self._turns[turn_id] = turn
+        return turn, True
+
+    def discard(self, turn: TurnStream) -> None:
+        """Forget a turn, e.g: when it couldn't be started."""
+        if self._turns.get(turn.turn_id) is turn:
+            del self._turns[turn.turn_id]
+
+    def _finished(self, turn: TurnStream) -> None:
+        asyncio.get_running_loop().call_later(self.replay_ttl, self.discard, turn)
+
+
+_registry: TurnRegistry | None = None
+
+
+def get_turn_registry() -> TurnRegistry:
+    """Returns the process-wide registry of streamed chat turns."""
+    global _registry
+    if _registry is None:
+        _registry = TurnRegistry()
+    return _registry
@@ -0,0 +1,64 @@
+"""
+Benchmark of parsing large chat request bodies, with chat history and documents.
+
+Before, validate_chat_request decoded the body with the json module, then FastAPI
+decoded it again before validating it into CohereChatRequest. Now the body is
+decoded once, with orjson when installed, and the tool rules are checked by the
+model validation.
+
+Run with:
+    poetry run python -m backend.tests.benchmarks.bench_request_parsing
+"""
+
+import json
+import timeit
+
+from backend.schemas.cohere_chat import CohereChatRequest
+from backend.services.json_body import loads
+
+SIZES_MB = [1, 4, 16]
+
+
+def build_body(size_mb: int) -> bytes:
+    # Half chat history, half documents
+    count = size_mb * 1024 * 1024 // 2 // 1000
+    body = {
+        "message": "Summarize the documents",
+        "user_msg_id": "user",
+        "bot_msg_id": "bot",
+        "conversation_id": "conversation",
+        "chat_history": [
+            {"role": "USER" if i % 2 == 0 else "CHATBOT", "message": "word " * 190}
+            for i in range(count)
+        ],
+        "documents": [
+            {"id": str(i), "title": f"Document {i}", "text": "text " * 180}
+            for i in range(count)
+        ],
+        "tools": [{"name": "random_number_generator", "description": "Random"}],
+    }
+    return json.dumps(body).encode()
+
+
+def parse_twice(body: bytes) -> CohereChatRequest:
+    json.loads(body)
+    return CohereChatRequest.model_validate(json.loads(body))
+
+
+def parse_once(body: bytes) -> CohereChatRequest:
+    return CohereChatRequest.model_validate(loads(body))
+
+
+def main() -> None:
+    for size_mb in SIZES_MB:
+        body = build_body(size_mb)
+        assert parse_twice(body) == parse_once(body)
+
+        print(f"{len(body) / 1024 / 1024:.1f} MB body")
+        for name, parse in [("before", parse_twice), ("after", parse_once)]:
+            seconds = min(timeit.repeat(lambda: parse(body), number=5, repeat=3))
+            print(f"{name:>10}: {seconds / 5 * 1e3:8.2f} ms/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Microbenchmark of the per-token cost of encoding text generation SSE events.
+
+Run with:
+    poetry run python -m backend.tests.benchmarks.bench_stream_encoder
+"""
+
+import timeit
+
+from backend.chat.encoder import encode_chat_response_event, encode_text_generation
+from backend.schemas.chat import StreamTextGeneration
+
+TOKENS = 10_000
+
+
+def encode_with_pydantic(event: dict) -> str:
+    return encode_chat_response_event(StreamTextGeneration.model_validate(event))
+
+
+def encode_fast(event: dict) -> str:
+    return encode_text_generation(event["text"], event["is_finished"])
+
+
+def main() -> None:
+    event = {"event_type": "text-generation", "text": " token", "is_finished": False}
+    assert encode_with_pydantic(event) == encode_fast(event)
+
+    for name, encode in [("pydantic", encode_with_pydantic), ("fast path", encode_fast)]:
+        seconds = min(timeit.repeat(lambda: encode(event), number=TOKENS, repeat=5))
+        print(f"{name:>10}: {seconds / TOKENS * 1e6:8.2f} us/token")
+
+
+if __name__ == "__main__":
+    main()
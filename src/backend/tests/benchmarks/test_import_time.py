@@ -0,0 +1,67 @@
+"""
+Cold start budget of the app: `python -X importtime -c "import backend.main"`.
+The SDKs of the tools and deployments must only be imported on first use.
+
+IMPORT_TIME_BUDGET_MS overrides the budget, e.g: on a slow CI runner.
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "2000"))
+
+HEAVY_MODULES = [
+    "boto3",
+    "chromadb",
+    "cohere",
+    "langchain",
+    "langchain_cohere",
+    "langchain_community",
+    "langchain_core",
+    "llama_cpp",
+    "openai",
+    "tavily",
+    "transformers",
+]
+
+SRC_PATH = Path(__file__).resolve().parents[3]
+
+
+def import_times(module: str) -> dict[str, int]:
+    env = os.environ | {
+        "PYTHONPATH": str(SRC_PATH),
+        "USE_COMMUNITY_FEATURES": "false",
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+
+    # import time: self [us] | cumulative | imported package
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_main_does_not_import_sdks() -> None:
+    imported = import_times("backend.main")
+
+    top_level = {name.split(".")[0] for name in imported}
+    assert top_level.isdisjoint(HEAVY_MODULES), sorted(
+        top_level.intersection(HEAVY_MODULES)
+    )
+
+
+def test_main_import_time_budget() -> None:
+    imported = import_times("backend.main")
+
+    assert imported["backend.main"] / 1000 < IMPORT_TIME_BUDGET_MS
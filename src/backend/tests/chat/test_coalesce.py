@@ -0,0 +1,52 @@
+import asyncio
+from typing import Any, AsyncGenerator
+
+from backend.chat.coalesce import coalesce_text_generation
+from backend.chat.enums import StreamEvent
+
+
+async def stream(deltas: list[tuple[float, str]]) -> AsyncGenerator[Any, None]:
+    yield {"event_type": StreamEvent.STREAM_START, "is_finished": False}
+    for delay, text in deltas:
+        await asyncio.sleep(delay)
+        yield {
+            "event_type": StreamEvent.TEXT_GENERATION,
+            "text": text,
+            "is_finished": False,
+        }
+    yield {"event_type": StreamEvent.STREAM_END, "is_finished": True}
+
+
+def collect(deltas: list[tuple[float, str]], **kwargs: Any) -> list[tuple[str, Any]]:
+    async def run() -> list[tuple[str, Any]]:
+        return [
+            (event["event_type"], event.get("text"))
+            async for event in coalesce_text_generation(stream(deltas), **kwargs)
+        ]
+
+    return asyncio.run(run())
+
+
+def test_merges_deltas_within_window() -> None:
+    events = collect([(0, "Hel"), (0, "lo"), (0.1, " wor"), (0, "ld")], window_ms=30)
+    assert events == [
+        (StreamEvent.STREAM_START, None),
+        (StreamEvent.TEXT_GENERATION, "Hello"),
+        (StreamEvent.TEXT_GENERATION, " world"),
+        (StreamEvent.STREAM_END, None),
+    ]
+
+
+def test_flushes_on_max_chars() -> None:
+    events = collect([(0, "aaa"), (0, "bbb"), (0, "c")], window_ms=1000, max_chars=5)
+    assert events == [
+        (StreamEvent.STREAM_START, None),
+        (StreamEvent.TEXT_GENERATION, "aaabbb"),
+        (StreamEvent.TEXT_GENERATION, "c"),
+        (StreamEvent.STREAM_END, None),
+    ]
+
+
+def test_disabled_window_passes_through() -> None:
+    events = collect([(0, "a"), (0, "b")], window_ms=0)
+    assert [text for _, text in events] == [None, "a", "b", None]
@@ -0,0 +1,135 @@
+import asyncio
+import time
+from unittest.mock import MagicMock, patch
+
+from backend.chat.custom.custom import CustomChat
+from backend.chat.enums import StreamEvent
+from backend.schemas.cohere_chat import CohereChatRequest
+from backend.schemas.tool import ToolCall
+from backend.services.response_cache import ResponseCache
+
+
+async def collect(stream) -> list:
+    return [event async for event in stream]
+
+
+def test_stream_start_sent_before_search() -> None:
+    calls = []
+
+    async def search_queries(message, chat_history):
+        calls.append("search_queries")
+        return ["height of mount everest"]
+
+    async def chat_stream(chat_request, **kwargs):
+        yield {
+            "event_type": StreamEvent.STREAM_START,
+            "generation_id": "deployment",
+            "is_finished": False,
+        }
+        yield {
+            "event_type": StreamEvent.TEXT_GENERATION,
+            "text": "29,035 feet",
+            "is_finished": False,
+        }
+
+    deployment = MagicMock()
+    deployment.ainvoke_search_queries = search_queries
+    deployment.ainvoke_chat_stream = chat_stream
+    retriever = MagicMock()
+    retriever.retrieve_documents.return_value = [{"text": "Mount Everest"}]
+
+    chat_request = CohereChatRequest(
+        message="How high is Mount Everest?",
+        user_msg_id="user",
+        bot_msg_id="bot",
+        chat_history=[],
+    )
+    with patch(
+        "backend.chat.custom.custom.get_deployment", return_value=deployment
+    ), patch.object(CustomChat, "get_retrievers", return_value=[retriever]), patch(
+        "backend.chat.custom.custom.combine_documents",
+        side_effect=lambda documents, _: (documents["height of mount everest"], 0),
+    ):
+
+        async def run() -> list:
+            stream = await CustomChat().achat(chat_request, stream=True)
+            first = await stream.__anext__()
+            assert calls == []
+            return [first] + await collect(stream)
+
+        events = asyncio.run(run())
+
+    assert [event["event_type"] for event in events] == [
+        StreamEvent.STREAM_START,
+        StreamEvent.SEARCH_QUERIES_GENERATION,
+        StreamEvent.SEARCH_RESULTS,
+        StreamEvent.TEXT_GENERATION,
+    ]
+    assert events[2]["documents"] == [{"text": "Mount Everest", "id": "doc_0"}]
+
+
+def test_tool_results_keep_call_order() -> None:
+    def slow_call(parameters, **kwargs):
+        time.sleep(parameters["delay"])
+        return {"result": parameters["delay"]}
+
+    tool = MagicMock()
+    tool.implementation.return_value.call.side_effect = slow_call
+    tool_calls = [
+        ToolCall(name="calculator", parameters={"delay": 0.2}),
+        ToolCall(name="calculator", parameters={"delay": 0.0}),
+    ]
+    deployment = MagicMock()
+    deployment.invoke_tools.return_value.tool_calls = tool_calls
+
+    with patch.dict(
+        "backend.chat.custom.custom.AVAILABLE_TOOLS", {"calculator": tool}
+    ):
+        tool_results = CustomChat().get_tool_results("1+1", [], deployment)
+
+    assert [result["call"] for result in tool_results] == tool_calls
+    assert [result["outputs"] for result in tool_results] == [
+        [{"result": 0.2}],
+        [{"result": 0.0}],
+    ]
+
+
+def test_deterministic_stream_replayed_from_cache() -> None:
+    calls = []
+
+    async def chat_stream(chat_request, **kwargs):
+        calls.append("chat_stream")
+        for text in ("29,035", " feet"):
+            yield {
+                "event_type": StreamEvent.TEXT_GENERATION,
+                "text": text,
+                "is_finished": False,
+            }
+        yield {"event_type": StreamEvent.STREAM_END, "finish_reason": "COMPLETE"}
+
+    deployment = MagicMock()
+    deployment.ainvoke_chat_stream = chat_stream
+
+    def chat_request() -> CohereChatRequest:
+        return CohereChatRequest(
+            message="How high is Mount Everest?",
+            user_msg_id="user",
+            bot_msg_id="bot",
+            temperature=0,
+        )
+
+    async def run() -> list:
+        stream = await CustomChat().achat(chat_request(), managed_tools=False)
+        return await collect(stream)
+
+    with patch(
+        "backend.chat.custom.custom.get_deployment", return_value=deployment
+    ), patch(
+        "backend.chat.custom.custom.get_response_cache", return_value=ResponseCache()
+    ):
+        streamed = asyncio.run(run())
+        replayed = asyncio.run(run())
+
+    assert calls == ["chat_stream"]
+    assert [event.get("text") for event in streamed[1:]] == ["29,035", " feet", None]
+    assert [event.get("text") for event in replayed[1:]] == ["29,035 feet", None]
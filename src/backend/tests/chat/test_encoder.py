@@ -0,0 +1,39 @@
+import pytest
+
+from backend.chat.encoder import (
+    encode_chat_response_event,
+    encode_text_generation,
+    is_fast_text_generation,
+)
+from backend.chat.enums import StreamEvent
+from backend.schemas.chat import StreamTextGeneration
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "Hello",
+        " world.",
+        'He said "hi"\n\ttabs\\backslashes',
+        "café — 日本語 \U0001F600",
+        "\x00\x1f control",
+    ],
+)
+@pytest.mark.parametrize("is_finished", [True, False])
+def test_encode_text_generation_matches_pydantic(text: str, is_finished: bool) -> None:
+    expected = encode_chat_response_event(
+        StreamTextGeneration(text=text, is_finished=is_finished)
+    )
+    assert encode_text_generation(text, is_finished) == expected
+
+
+def test_is_fast_text_generation() -> None:
+    event = {
+        "event_type": StreamEvent.TEXT_GENERATION,
+        "text": "Hi",
+        "is_finished": False,
+    }
+    assert is_fast_text_generation(event)
+    assert not is_fast_text_generation(event | {"text": None})
+    assert not is_fast_text_generation({"text": "Hi"})
@@ -0,0 +1,60 @@
+from backend.chat.history import window_chat_history
+from backend.models.message import Message, MessageAgent
+
+
+def message(
+    position: int, token_count: int | None, is_annotation_response: bool = False
+) -> Message:
+    return Message(
+        text=f"message {position}",
+        position=position,
+        agent=MessageAgent.USER,
+        token_count=token_count,
+        is_annotation_response=is_annotation_response,
+    )
+
+
+def test_keeps_latest_messages_within_budget() -> None:
+    messages = [message(i, 10) for i in range(5)]
+
+    history = window_chat_history(messages, token_budget=30)
+
+    assert [m.position for m in history] == [2, 3, 4]
+
+
+def test_always_keeps_last_message() -> None:
+    messages = [message(0, 10), message(1, 100)]
+
+    history = window_chat_history(messages, token_budget=50)
+
+    assert [m.position for m in history] == [1]
+
+
+def test_stops_at_first_message_over_budget() -> None:
+    messages = [message(0, 1), message(1, 50), message(2, 10)]
+
+    history = window_chat_history(messages, token_budget=20)
+
+    assert [m.position for m in history] == [2]
+
+
+def test_keeps_pinned_messages() -> None:
+    messages = [
+        message(0, 20, is_annotation_response=True),
+        message(1, 10),
+        message(2, 10),
+        message(3, 10),
+    ]
+
+    history = window_chat_history(messages, token_budget=40)
+
+    assert [m.position for m in history] == [0, 2, 3]
+
+
+def test_backfills_missing_token_counts() -> None:
+    messages = [message(0, None), message(1, 5)]
+
+    history = window_chat_history(messages, token_budget=100)
+
+    assert [m.position for m in history] == [0, 1]
+    assert messages[0].token_count is not None
@@ -0,0 +1,132 @@
+import pytest
+
+from backend.chat import history, summary
+from backend.chat.summary import (
+    build_summary_prompt,
+    get_messages_to_summarize,
+    should_refresh_summary,
+)
+from backend.models.conversation import Conversation
+from backend.models.message import Message, MessageAgent
+
+
+@pytest.fixture(autouse=True)
+def enable_summaries(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(history, "USE_CONVERSATION_SUMMARY", True)
+    monkeypatch.setattr(summary, "USE_CONVERSATION_SUMMARY", True)
+    monkeypatch.setattr(summary, "CONVERSATION_SUMMARY_INTERVAL", 2)
+
+
+def conversation(
+    count: int,
+    summary_text: str | None = None,
+    summary_position: int | None = None,
+    pinned: tuple[int, ...] = (),
+) -> Conversation:
+    return Conversation(
+        summary=summary_text,
+        summary_position=summary_position,
+        text_messages=[
+            Message(
+                text=f"message {position}",
+                position=position,
+                agent=(
+                    MessageAgent.USER if position % 2 == 0 else MessageAgent.CHATBOT
+                ),
+                token_count=10,
+                is_annotation_response=position in pinned,
+            )
+            for position in range(count)
+        ],
+    )
+
+
+def test_refreshes_every_interval_turns() -> None:
+    # Chatbot messages of turns 1 to 4
+    assert [should_refresh_summary(position) for position in range(4)] == [
+        False,
+        True,
+        False,
+        True,
+    ]
+
+
+def test_does_not_refresh_when_disabled(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(summary, "USE_CONVERSATION_SUMMARY", False)
+
+    assert not should_refresh_summary(1)
+
+
+def test_summarizes_messages_before_window() -> None:
+    messages = get_messages_to_summarize(conversation(10), token_budget=30)
+
+    assert [m.position for m in messages] == [0, 1, 2, 3, 4, 5, 6]
+
+
+def test_summarizes_whole_turns(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(summary, "CONVERSATION_SUMMARY_INPUT_TOKENS", 30)
+    # The user and chatbot messages of a turn share its position
+    turns = Conversation(
+        text_messages=[
+            Message(
+                text=f"message {index}",
+                position=index // 2,
+                agent=MessageAgent.USER if index % 2 == 0 else MessageAgent.CHATBOT,
+                token_count=10,
+                is_annotation_response=False,
+            )
+            for index in range(10)
+        ],
+    )
+
+    messages = get_messages_to_summarize(turns, token_budget=20)
+
+    # The cap is reached within turn 1, which is still summarized whole
+    assert [m.position for m in messages] == [0, 0, 1, 1]
+
+
+def test_skips_summarized_and_pinned_messages() -> None:
+    messages = get_messages_to_summarize(
+        conversation(10, "summary", summary_position=2, pinned=(4,)),
+        token_budget=50,
+    )
+
+    # The window keeps 4 (pinned) and 7 to 9
+    assert [m.position for m in messages] == [3, 5, 6]
+
+
+def test_window_follows_summary() -> None:
+    text, messages = history.window_conversation(
+        conversation(10, "summary", summary_position=5), token_budget=100
+    )
+
+    assert text == "summary"
+    assert [m.position for m in messages] == [6, 7, 8, 9]
+
+
+def test_window_of_loaded_messages() -> None:
+    loaded = conversation(10, "summary", summary_position=5)
+    text, messages = history.window_conversation(
+        loaded, token_budget=100, messages=loaded.messages[8:]
+    )
+
+    assert text == "summary"
+    assert [m.position for m in messages] == [8, 9]
+
+
+def test_window_ignores_summary_when_disabled(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(history, "USE_CONVERSATION_SUMMARY", False)
+
+    text, messages = history.window_conversation(
+        conversation(4, "summary", summary_position=1), token_budget=100
+    )
+
+    assert text is None
+    assert [m.position for m in messages] == [0, 1, 2, 3]
+
+
+def test_prompt_includes_summary_and_messages() -> None:
+    prompt = build_summary_prompt("Earlier summary", conversation(2).messages)
+
+    assert "Earlier summary" in prompt
+    assert "USER: message 0\nCHATBOT: message 1" in prompt
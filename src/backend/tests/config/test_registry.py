@@ -0,0 +1,39 @@
+from unittest.mock import MagicMock, patch
+
+from backend.config.registry import LazyRegistry
+
+
+def test_loader_runs_once_on_first_access() -> None:
+    loader = MagicMock(return_value="tool")
+    registry = LazyRegistry({"Tool": loader, "Other": MagicMock()})
+
+    assert list(registry) == ["Tool", "Other"]
+    assert "Tool" in registry
+    loader.assert_not_called()
+
+    assert registry["Tool"] == "tool"
+    assert registry["Tool"] == "tool"
+    loader.assert_called_once()
+    assert not registry.is_loaded("Other")
+
+
+def test_copy_and_update_do_not_load() -> None:
+    loader = MagicMock(return_value="tool")
+    community_loader = MagicMock(return_value="community tool")
+    registry = LazyRegistry({"Tool": loader}).copy()
+    registry.update(LazyRegistry({"Community": community_loader}))
+
+    assert list(registry) == ["Tool", "Community"]
+    loader.assert_not_called()
+    community_loader.assert_not_called()
+    assert registry["Community"] == "community tool"
+
+
+def test_patch_dict_restores_loaders() -> None:
+    loader = MagicMock(return_value="tool")
+    registry = LazyRegistry({"Tool": loader})
+
+    with patch.dict(registry, {"Tool": "mock"}, clear=True):
+        assert registry["Tool"] == "mock"
+
+    assert registry["Tool"] == "tool"
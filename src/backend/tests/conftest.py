@@ -1,4 +1,5 @@
 import os
+from contextlib import nullcontext
 from typing import Any, Generator
 from unittest.mock import patch
 
@@ -12,7 +13,7 @@ from sqlalchemy.orm import Session
 from backend.chat.custom.model_deployments.base import BaseDeployment
 from backend.config.deployments import AVAILABLE_MODEL_DEPLOYMENTS, ModelDeploymentName
 from backend.main import app, create_app
-from backend.models import get_session
+from backend.models import get_session, get_session_factory
 from backend.schemas.deployment import Deployment
 from backend.schemas.user import User
 from backend.tests.factories import get_factory
@@ -72,6 +73,9 @@ def session_client(session: Session) -> Generator[TestClient, None, None]:
 
     app = create_app()
     app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_session_factory] = lambda: lambda: nullcontext(
+        session
+    )
 
     print("Session at fixture " + str(session))
 
@@ -135,6 +139,9 @@ def session_client_chat(session_chat: Session) -> Generator[TestClient, None, No
 
     app = create_app()
     app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_session_factory] = lambda: lambda: nullcontext(
+        session_chat
+    )
 
     print("Session at fixture " + str(session_chat))
 
@@ -95,6 +95,19 @@ def test_list_messages_by_conversation_id_empty(session, user):
     assert len(messages) == 0
 
 
+def test_get_latest_messages(session, user):
+    for position in range(5):
+        _ = get_factory("Message", session).create(
+            conversation_id="1",
+            user_id=user.id,
+            position=position,
+            is_annotation_response=position == 0,
+        )
+
+    messages = message_crud.get_latest_messages(session, "1", 2)
+    assert [message.position for message in messages] == [0, 3, 4]
+
+
 def test_update_message(session, user):
     message = get_factory("Message", session).create(
         text="Hello, World!", conversation_id="1", user_id=user.id
@@ -14,6 +14,7 @@ class MessageFactory(BaseFactory):
     generation_id = factory.Faker("uuid4")
     conversation_id = factory.Faker("uuid4")
     position = factory.Faker("random_int")
+    token_count = factory.Faker("random_int", max=100)
     is_active = factory.Faker("boolean")
     documents = []
     citations = []
@@ -0,0 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from backend.chat.custom.model_deployments.deployment import (
+    clear_deployment_instances,
+    get_deployment,
+)
+from backend.schemas.deployment import Deployment
+from backend.tests.model_deployments.mock_deployments import (
+    MockAzureDeployment,
+    MockCohereDeployment,
+)
+
+
+def build_deployments(deployment_class) -> dict[str, Deployment]:
+    return {
+        "Mock": Deployment(
+            name="Mock",
+            deployment_class=deployment_class,
+            models=deployment_class.list_models(),
+            is_available=True,
+            env_vars=[],
+        )
+    }
+
+
+def test_deployment_instance_is_shared() -> None:
+    clear_deployment_instances()
+    with patch.dict(
+        "backend.chat.custom.model_deployments.deployment.AVAILABLE_MODEL_DEPLOYMENTS",
+        build_deployments(MockCohereDeployment),
+        clear=True,
+    ):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            instances = list(executor.map(get_deployment, ["Mock"] * 16))
+        fallback = get_deployment("Unknown")
+    clear_deployment_instances()
+
+    assert isinstance(instances[0], MockCohereDeployment)
+    assert all(instance is instances[0] for instance in instances)
+    assert fallback is instances[0]
+
+
+def test_deployment_instance_follows_patched_class() -> None:
+    clear_deployment_instances()
+    with patch.dict(
+        "backend.chat.custom.model_deployments.deployment.AVAILABLE_MODEL_DEPLOYMENTS",
+        build_deployments(MockCohereDeployment),
+        clear=True,
+    ):
+        cohere = get_deployment("Mock")
+    with patch.dict(
+        "backend.chat.custom.model_deployments.deployment.AVAILABLE_MODEL_DEPLOYMENTS",
+        build_deployments(MockAzureDeployment),
+        clear=True,
+    ):
+        azure = get_deployment("Mock")
+    clear_deployment_instances()
+
+    assert isinstance(cohere, MockCohereDeployment)
+    assert isinstance(azure, MockAzureDeployment)
@@ -1,10 +1,15 @@
+import asyncio
 import json
 import os
+import threading
 import uuid
+from importlib import import_module
 from typing import Any
+from unittest.mock import MagicMock
 
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
 from backend.chat.enums import StreamEvent
@@ -12,9 +17,18 @@ from backend.config.deployments import ModelDeploymentName
 from backend.models.conversation import Conversation
 from backend.models.message import Message, MessageAgent
 from backend.models.user import User
+from backend.routers.chat import (
+    get_history_messages,
+    get_next_message_position,
+    process_chat,
+)
+from backend.schemas.cohere_chat import CohereChatRequest
 from backend.schemas.tool import Category
 from backend.tests.factories import get_factory
 
+# backend.routers re-exports the chat endpoint under the name of its module
+chat_router = import_module("backend.routers.chat")
+
 is_cohere_env_set = (
     os.environ.get("COHERE_API_KEY") is not None
     and os.environ.get("COHERE_API_KEY") != ""
@@ -699,3 +713,170 @@ def is_valid_uuid(id: str) -> bool:
         return True
     except ValueError:
         return False
+
+
+def test_process_chat_statement_count(session_chat: Session, user: User) -> None:
+    conversation = get_factory("Conversation", session_chat).create(user_id=user.id)
+    _ = get_factory("Message", session_chat).create(
+        conversation_id=conversation.id,
+        user_id=user.id,
+        agent="USER",
+        text="Hello",
+        position=0,
+        is_active=True,
+    )
+    file = get_factory("File", session_chat).create(
+        conversation_id=conversation.id, user_id=user.id
+    )
+    session_chat.commit()
+
+    request = MagicMock(
+        headers={
+            "User-Id": user.id,
+            "Deployment-Name": ModelDeploymentName.CoherePlatform,
+        }
+    )
+    chat_request = CohereChatRequest(
+        message="How are you?",
+        conversation_id=conversation.id,
+        file_ids=[file.id],
+    )
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = session_chat.get_bind().engine
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        _, chat_request, file_paths, *_ = process_chat(
+            session_chat, chat_request, request
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+
+    # Locked conversation, latest messages, next position, files,
+    # user message insert, file update
+    assert len(statements) == 6, statements
+    assert file_paths == [file.file_path]
+    assert [message.message for message in chat_request.chat_history] == [
+        "Hello",
+        "How are you?",
+    ]
+
+
+def test_next_message_position_ignores_inactive_messages(
+    session_chat: Session, user: User
+) -> None:
+    conversation = get_factory("Conversation", session_chat).create(user_id=user.id)
+    for position, is_active in [(0, True), (1, True), (2, False)]:
+        _ = get_factory("Message", session_chat).create(
+            conversation_id=conversation.id,
+            user_id=user.id,
+            position=position,
+            is_active=is_active,
+        )
+
+    assert get_next_message_position(session_chat, conversation) == 2
+    assert get_next_message_position(session_chat, Conversation(user_id=user.id)) == 0
+
+
+def test_history_includes_turns_pending_persistence(
+    session_chat: Session, user: User, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    conversation = get_factory("Conversation", session_chat).create(user_id=user.id)
+    user_message = get_factory("Message", session_chat).create(
+        conversation_id=conversation.id,
+        user_id=user.id,
+        position=0,
+        agent=MessageAgent.USER,
+    )
+    pending_message = Message(
+        id=str(uuid.uuid4()),
+        conversation_id=conversation.id,
+        position=0,
+        agent=MessageAgent.CHATBOT,
+        text="Not written yet",
+    )
+    persistence_worker = MagicMock()
+    persistence_worker.get_pending_turns.return_value = [pending_message]
+    monkeypatch.setattr(
+        chat_router, "get_persistence_worker", lambda: persistence_worker
+    )
+
+    messages = get_history_messages(session_chat, conversation)
+
+    assert messages == [user_message, pending_message]
+    persistence_worker.get_pending_turns.assert_called_once_with(conversation.id)
+
+
+def test_stored_turn_is_looked_up_off_the_event_loop(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    threads = []
+
+    def get_stored_turn(session, chat_request, user_id):
+        threads.append(threading.current_thread())
+        return Message(id="bot_msg", agent=MessageAgent.CHATBOT, text="Stored")
+
+    monkeypatch.setattr(chat_router, "get_stored_turn", get_stored_turn)
+    monkeypatch.setattr(chat_router, "encode_stored_turn", lambda message: [])
+    turn = MagicMock()
+
+    async def start_turn() -> threading.Thread:
+        await chat_router.start_chat_turn(
+            MagicMock(), MagicMock(), MagicMock(), MagicMock(), turn
+        )
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(start_turn())
+
+    assert threads and threads[0] is not loop_thread
+    turn.start.assert_called_once()
+
+
+def test_disconnect_closes_model_stream_and_keeps_partial_answer(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    closed = []
+    persisted = []
+
+    async def model_stream():
+        try:
+            yield {
+                "event_type": StreamEvent.STREAM_START,
+                "generation_id": "generation",
+                "is_finished": False,
+            }
+            for text in ("Partial", " answer", " never sent"):
+                yield {
+                    "event_type": StreamEvent.TEXT_GENERATION,
+                    "text": text,
+                    "is_finished": False,
+                }
+        finally:
+            closed.append(True)
+
+    async def persist_chat_turn(session_factory, response_message, *args):
+        persisted.append(response_message)
+
+    monkeypatch.setattr(chat_router, "persist_chat_turn", persist_chat_turn)
+    response_message = Message(
+        id=str(uuid.uuid4()), position=1, agent=MessageAgent.CHATBOT, text=""
+    )
+
+    async def disconnect_after_two_deltas() -> None:
+        stream = chat_router.generate_chat_stream(
+            MagicMock(), model_stream(), response_message, "conversation", "user"
+        )
+        for _ in range(3):
+            await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(disconnect_after_two_deltas())
+
+    assert closed == [True]
+    assert persisted == [response_message]
+    assert response_message.text == "Partial answer"
+    assert response_message.finish_reason == chat_router.USER_CANCEL_FINISH_REASON
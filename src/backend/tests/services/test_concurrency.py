@@ -0,0 +1,110 @@
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+import pytest
+
+from backend.services import concurrency
+from backend.services.concurrency import run_concurrently
+
+
+def test_calls_run_concurrently_in_order() -> None:
+    def sleep_and_return(value):
+        time.sleep(0.2)
+        return value
+
+    start = time.monotonic()
+    outcomes = run_concurrently(
+        [lambda value=value: sleep_and_return(value) for value in range(4)],
+        max_concurrency=4,
+    )
+
+    assert time.monotonic() - start < 0.6
+    assert [outcome.value for outcome in outcomes] == [0, 1, 2, 3]
+    assert all(outcome.elapsed >= 0.2 for outcome in outcomes)
+
+
+def test_partial_results_on_failure_and_timeout() -> None:
+    def fail():
+        raise ValueError("retriever down")
+
+    outcomes = run_concurrently(
+        [lambda: "ok", fail, lambda: time.sleep(1)],
+        timeout=0.1,
+    )
+
+    assert outcomes[0].ok and outcomes[0].value == "ok"
+    assert isinstance(outcomes[1].error, ValueError)
+    assert isinstance(outcomes[2].error, TimeoutError)
+
+
+def test_timeout_counted_from_start_of_call() -> None:
+    outcomes = run_concurrently(
+        [lambda: time.sleep(0.1)] * 3,
+        max_concurrency=1,
+        timeout=0.25,
+    )
+
+    assert all(outcome.ok for outcome in outcomes)
+
+
+def test_call_waiting_for_a_pool_thread_times_out(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(concurrency, "get_fan_out_executor", lambda: executor)
+    # An abandoned call keeps the only pool thread
+    release = threading.Event()
+    executor.submit(release.wait)
+    calls_started = []
+
+    start = time.monotonic()
+    outcomes = run_concurrently([lambda: calls_started.append(0)], timeout=0.1)
+    release.set()
+    executor.shutdown()
+
+    assert time.monotonic() - start < 0.5
+    assert isinstance(outcomes[0].error, TimeoutError)
+    assert calls_started == []
+
+
+def test_cancelled_fan_out_skips_queued_calls() -> None:
+    cancelled = threading.Event()
+    threading.Timer(0.1, cancelled.set).start()
+    calls_started = []
+
+    def call(index):
+        calls_started.append(index)
+        time.sleep(0.3)
+
+    start = time.monotonic()
+    outcomes = run_concurrently(
+        [lambda index=index: call(index) for index in range(4)],
+        max_concurrency=1,
+        cancelled=cancelled,
+    )
+
+    assert time.monotonic() - start < 0.3
+    assert calls_started == [0]
+    assert all(isinstance(outcome.error, CancelledError) for outcome in outcomes)
+
+
+def test_fan_outs_share_a_bounded_pool() -> None:
+    running = []
+    max_running = []
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            running.append(threading.current_thread().name)
+            max_running.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+        return threading.current_thread().name
+
+    first = run_concurrently([call] * 4, max_concurrency=2)
+    second = run_concurrently([call] * 4, max_concurrency=2)
+
+    assert max(max_running) == 2
+    assert all(outcome.value.startswith("fan-out") for outcome in first + second)
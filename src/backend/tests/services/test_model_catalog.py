@@ -0,0 +1,49 @@
+import json
+import threading
+import time
+
+from backend.chat.custom.model_deployments.base import BaseDeployment
+from backend.services.model_catalog import ModelCatalog
+
+
+class SlowDeployment(BaseDeployment):
+    calls = 0
+    release = threading.Event()
+
+    @classmethod
+    def list_models(cls) -> list[str]:
+        cls.calls += 1
+        cls.release.wait(1)
+        return [f"model-{cls.calls}"]
+
+
+def test_cold_start_waits_for_first_fetch(tmp_path) -> None:
+    SlowDeployment.calls = 0
+    SlowDeployment.release.set()
+    cache_path = tmp_path / "catalog.json"
+    catalog = ModelCatalog(cache_path=str(cache_path), ttl=60, cold_timeout=1)
+
+    assert catalog.get_models(SlowDeployment) == (["model-1"], False)
+    assert catalog.get_models(SlowDeployment) == (["model-1"], False)
+    assert SlowDeployment.calls == 1
+    assert json.loads(cache_path.read_text())["SlowDeployment"]["models"] == [
+        "model-1"
+    ]
+
+
+def test_expired_list_served_stale_while_refreshing(tmp_path) -> None:
+    SlowDeployment.calls = 0
+    SlowDeployment.release.clear()
+    cache_path = tmp_path / "catalog.json"
+    cache_path.write_text(
+        json.dumps({"SlowDeployment": {"models": ["cached"], "fetched_at": 0}})
+    )
+    catalog = ModelCatalog(cache_path=str(cache_path), ttl=60, cold_timeout=1)
+
+    start = time.monotonic()
+    assert catalog.get_models(SlowDeployment) == (["cached"], True)
+    assert time.monotonic() - start < 0.5
+
+    SlowDeployment.release.set()
+    catalog.refresh(SlowDeployment).wait(1)
+    assert catalog.get_models(SlowDeployment) == (["model-1"], False)
@@ -0,0 +1,249 @@
+import json
+import time
+from unittest.mock import MagicMock
+
+from sqlalchemy.exc import OperationalError
+
+from backend.models.citation import Citation
+from backend.models.document import Document
+from backend.models.message import Message, MessageAgent
+from backend.services.persistence import (
+    ChatTurnPersistenceWorker,
+    message_from_dict,
+    message_to_dict,
+)
+
+
+def build_message() -> Message:
+    document = Document(
+        document_id="doc_0",
+        text="The height of Mount Everest is 29,035 feet",
+        title="Height of Mount Everest",
+        url="https://example.com",
+        user_id="1",
+        conversation_id="1",
+        message_id="bot_msg",
+    )
+    citation = Citation(
+        text="29,035 feet",
+        user_id="1",
+        start=0,
+        end=11,
+        document_ids=["doc_0"],
+    )
+    citation.documents.append(document)
+    return Message(
+        id="bot_msg",
+        user_id="1",
+        conversation_id="1",
+        text="Mount Everest is 29,035 feet high.",
+        position=1,
+        is_active=True,
+        generation_id="gen",
+        is_annotation_response=False,
+        agent=MessageAgent.CHATBOT,
+        documents=[document],
+        citations=[citation],
+    )
+
+
+def test_message_round_trip() -> None:
+    message = message_from_dict(message_to_dict(build_message()))
+
+    assert message.id == "bot_msg"
+    assert message.agent == MessageAgent.CHATBOT
+    assert [d.document_id for d in message.documents] == ["doc_0"]
+    assert message.citations[0].documents == [message.documents[0]]
+
+
+def test_spools_when_database_unavailable(tmp_path) -> None:
+    session = MagicMock()
+    session.commit.side_effect = OperationalError("commit", {}, Exception("down"))
+    session_factory = MagicMock()
+    session_factory.return_value.__enter__.return_value = session
+
+    spool_path = tmp_path / "spool.jsonl"
+    worker = ChatTurnPersistenceWorker(
+        session_factory,
+        flush_interval=0,
+        max_retries=1,
+        retry_backoff=0,
+        spool_path=str(spool_path),
+    )
+    worker.start()
+    worker.submit(build_message())
+    worker.flush()
+    worker.stop()
+
+    lines = spool_path.read_text().splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["id"] == "bot_msg"
+    assert session.commit.call_count == 2
+
+
+def test_replays_spool_on_start(tmp_path) -> None:
+    spool_path = tmp_path / "spool.jsonl"
+    spool_path.write_text(json.dumps(message_to_dict(build_message())) + "\n")
+
+    session = MagicMock()
+    session_factory = MagicMock()
+    session_factory.return_value.__enter__.return_value = session
+
+    worker = ChatTurnPersistenceWorker(
+        session_factory, flush_interval=0, spool_path=str(spool_path)
+    )
+    worker.start()
+    worker.flush()
+    worker.stop()
+
+    assert not spool_path.exists()
+    session.add_all.assert_called_once()
+    session.commit.assert_called_once()
+
+
+def test_writes_a_copy_and_notifies_once_written(tmp_path) -> None:
+    session = MagicMock()
+    session_factory = MagicMock()
+    session_factory.return_value.__enter__.return_value = session
+    written = []
+    session.add_all.side_effect = written.extend
+
+    worker = ChatTurnPersistenceWorker(
+        session_factory, flush_interval=0, spool_path=str(tmp_path / "spool.jsonl")
+    )
+    worker.start()
+    message = build_message()
+    on_written = MagicMock(side_effect=lambda: session.commit.assert_called_once())
+    worker.submit(message, on_written)
+    worker.flush()
+    worker.stop()
+
+    # The caller's message is never added to the worker's session
+    assert len(written) == 1
+    assert written[0] is not message
+    assert written[0].id == message.id
+    on_written.assert_called_once()
+
+
+def test_spooled_turn_is_not_notified(tmp_path) -> None:
+    session = MagicMock()
+    session.commit.side_effect = OperationalError("commit", {}, Exception("down"))
+    session_factory = MagicMock()
+    session_factory.return_value.__enter__.return_value = session
+
+    worker = ChatTurnPersistenceWorker(
+        session_factory,
+        flush_interval=0,
+        max_retries=0,
+        spool_path=str(tmp_path / "spool.jsonl"),
+    )
+    worker.start()
+    on_written = MagicMock()
+    worker.submit(build_message(), on_written)
+    worker.flush()
+    worker.stop()
+
+    on_written.assert_not_called()
+
+
+def test_replays_spool_periodically(tmp_path) -> None:
+    session = MagicMock()
+    session_factory = MagicMock()
+    session_factory.return_value.__enter__.return_value = session
+
+    spool_path = tmp_path / "spool.jsonl"
+    worker = ChatTurnPersistenceWorker(
+        session_factory,
+        flush_interval=0,
+        spool_path=str(spool_path),
+        spool_replay_interval=0.05,
+    )
+    worker.start()
+    # Spooled while the worker runs, e.g: by a failed batch
+    spool_path.write_text(json.dumps(message_to_dict(build_message())) + "\n")
+    time.sleep(0.2)
+    worker.flush()
+    worker.stop()
+
+    assert not spool_path.exists()
+    session.add_all.assert_called_once()
+
+
+def test_pending_turn_readable_until_written(tmp_path) -> None:
+    session = MagicMock()
+    session.commit.side_effect = [
+        OperationalError("commit", {}, Exception("down")),
+        None,
+    ]
+    session_factory = MagicMock()
+    session_factory.return_value.__enter__.return_value = session
+
+    spool_path = tmp_path / "spool.jsonl"
+    worker = ChatTurnPersistenceWorker(
+        session_factory, flush_interval=0, max_retries=0, spool_path=str(spool_path)
+    )
+    worker.start()
+    worker.submit(build_message())
+    worker.flush()
+
+    # Spooled, still pending
+    pending = worker.get_pending_turn("bot_msg")
+    assert pending.text == "Mount Everest is 29,035 feet high."
+    assert [d.document_id for d in pending.documents] == ["doc_0"]
+    assert [m.id for m in worker.get_pending_turns("1")] == ["bot_msg"]
+    assert worker.get_pending_turns("2") == []
+
+    worker.stop()
+    worker.start()
+    worker.flush()
+    worker.stop()
+
+    assert worker.get_pending_turn("bot_msg") is None
+    assert worker.get_pending_turns("1") == []
+
+
+def test_replay_skips_unreadable_lines_and_leftover_replay(tmp_path) -> None:
+    spool_path = tmp_path / "spool.jsonl"
+    leftover = message_to_dict(build_message()) | {"id": "leftover_msg"}
+    # Left over by a crash during a previous replay
+    (tmp_path / "spool.jsonl.replay").write_text(json.dumps(leftover) + "\n")
+    spool_path.write_text(
+        '{"id": "truncated", "te\n' + json.dumps(message_to_dict(build_message())) + "\n"
+    )
+
+    written = []
+    session = MagicMock()
+    session.add_all.side_effect = written.extend
+    session_factory = MagicMock()
+    session_factory.return_value.__enter__.return_value = session
+
+    worker = ChatTurnPersistenceWorker(
+        session_factory, flush_interval=0, spool_path=str(spool_path)
+    )
+    worker.start()
+    worker.flush()
+    worker.stop()
+
+    assert sorted(message.id for message in written) == ["bot_msg", "leftover_msg"]
+    assert not spool_path.exists()
+    assert not (tmp_path / "spool.jsonl.replay").exists()
+
+
+def test_worker_survives_failed_replay(tmp_path) -> None:
+    session = MagicMock()
+    session_factory = MagicMock()
+    session_factory.return_value.__enter__.return_value = session
+
+    # The spool directory doesn't exist, every replay fails
+    worker = ChatTurnPersistenceWorker(
+        session_factory,
+        flush_interval=0,
+        spool_path=str(tmp_path / "missing" / "spool.jsonl"),
+        spool_replay_interval=0,
+    )
+    worker.start()
+    worker.submit(build_message())
+    worker.flush()
+    worker.stop()
+
+    session.add_all.assert_called_once()
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+
+from backend.schemas.cohere_chat import CohereChatRequest
+from backend.services.request_validators import chat_request_exception_handler
+
+
+def validation_error(tools: list[dict]) -> RequestValidationError:
+    with pytest.raises(ValidationError) as exc_info:
+        CohereChatRequest(
+            message="Hello", user_msg_id="user", bot_msg_id="bot", tools=tools
+        )
+    return RequestValidationError(exc_info.value.errors())
+
+
+def test_custom_tools_need_a_description() -> None:
+    response = asyncio.run(
+        chat_request_exception_handler(None, validation_error([{"name": "tool"}]))
+    )
+
+    assert response.status_code == 400
+    assert response.body == b'{"detail":"Custom tools must have a description"}'
+
+
+def test_managed_and_custom_tools_cannot_be_mixed() -> None:
+    tools = [{"name": "Calculator"}, {"name": "tool", "description": "Tool"}]
+    response = asyncio.run(
+        chat_request_exception_handler(None, validation_error(tools))
+    )
+
+    assert response.status_code == 400
+    assert response.body == b'{"detail":"Cannot mix both managed and custom tools"}'
+
+
+def test_valid_tools() -> None:
+    request = CohereChatRequest(
+        message="Hello",
+        user_msg_id="user",
+        bot_msg_id="bot",
+        tools=[{"name": "Calculator"}],
+    )
+
+    assert [tool.name for tool in request.tools] == ["Calculator"]
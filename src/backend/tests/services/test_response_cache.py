@@ -0,0 +1,137 @@
+import time
+from unittest.mock import MagicMock
+
+from backend.chat.enums import StreamEvent
+from backend.schemas.chat import ChatMessage, ChatRole
+from backend.schemas.cohere_chat import CohereChatRequest
+from backend.services.response_cache import (
+    ResponseCache,
+    compact_stream_events,
+    get_cache_key,
+    get_semantic_scope,
+    is_first_turn,
+    lookup_response,
+)
+
+
+def chat_request(**kwargs) -> CohereChatRequest:
+    return CohereChatRequest(
+        message="How high is Mount Everest?",
+        user_msg_id="user",
+        bot_msg_id="bot",
+        **kwargs,
+    )
+
+
+def test_only_deterministic_requests_have_a_key() -> None:
+    assert get_cache_key("Deployment", chat_request(temperature=0.7), True) is None
+    assert get_cache_key("Deployment", chat_request(temperature=0), True) is not None
+    assert get_cache_key("Deployment", chat_request(seed=42), True) is not None
+
+
+def test_key_ignores_conversation_ids() -> None:
+    first = chat_request(temperature=0, conversation_id="first")
+    second = chat_request(temperature=0, conversation_id="second")
+    other_documents = chat_request(
+        temperature=0, documents=[{"text": "Mount Everest is 8,849 m high"}]
+    )
+
+    key = get_cache_key("Deployment", first, True)
+    assert key == get_cache_key("Deployment", second, True)
+    assert key != get_cache_key("Deployment", other_documents, True)
+    assert key != get_cache_key("Deployment", first, False)
+
+
+def test_first_turn() -> None:
+    assert is_first_turn(
+        chat_request(chat_history=[ChatMessage(role=ChatRole.USER, message="Hi")])
+    )
+    assert not is_first_turn(
+        chat_request(chat_history=[ChatMessage(role=ChatRole.CHATBOT, message="Hi")])
+    )
+
+
+def test_evicts_least_recently_used() -> None:
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", "answer a", 8)
+    cache.put("b", "answer b", 8)
+    cache.get("a")
+    cache.put("c", "answer c", 8)
+
+    assert cache.get("a") == "answer a"
+    assert cache.get("b") is None
+    assert cache.get("c") == "answer c"
+
+
+def test_evicts_over_size_cap() -> None:
+    cache = ResponseCache(max_chars=10)
+    cache.put("a", "answer a", 8)
+    cache.put("b", "answer b", 8)
+    cache.put("too big", "answer", 11)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == "answer b"
+    assert cache.get("too big") is None
+
+
+def test_expires_after_ttl() -> None:
+    cache = ResponseCache(ttl=0.05)
+    cache.put("a", "answer a", 8)
+    time.sleep(0.1)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_semantic_tier_matches_similar_prompts_of_scope() -> None:
+    cache = ResponseCache(similarity=0.95)
+    cache.put("a", "answer a", 8, scope="scope", embedding=[1.0, 0.0])
+
+    assert cache.get_similar("scope", [0.99, 0.05]) == "answer a"
+    assert cache.get_similar("scope", [0.5, 0.5]) is None
+    assert cache.get_similar("other scope", [1.0, 0.0]) is None
+
+
+def test_semantic_scope_per_user_and_documents() -> None:
+    def scope(user_id: str, text: str) -> str:
+        request = chat_request(temperature=0, documents=[{"text": text}])
+        return get_semantic_scope("Deployment", request, False, user_id)
+
+    assert scope("a", "file of a") == scope("a", "file of a")
+    assert scope("a", "file of a") != scope("b", "file of a")
+    assert scope("a", "file of a") != scope("a", "file of b")
+
+
+def test_semantic_tier_skips_deployments_without_embeddings() -> None:
+    deployment = MagicMock()
+    deployment.embed_enabled = False
+    cache = ResponseCache(similarity=0.95)
+
+    lookup = lookup_response(
+        cache, deployment, chat_request(temperature=0), False, user_id="a"
+    )
+
+    assert not lookup.hit
+    deployment.invoke_embed.assert_not_called()
+
+
+def test_compact_stream_events() -> None:
+    def text(value: str) -> dict:
+        return {
+            "event_type": StreamEvent.TEXT_GENERATION,
+            "text": value,
+            "is_finished": False,
+        }
+
+    stream_end = {"event_type": StreamEvent.STREAM_END, "finish_reason": "COMPLETE"}
+    events = [
+        {"event_type": StreamEvent.STREAM_START, "is_finished": False},
+        text("29,035"),
+        text(" feet"),
+        stream_end,
+    ]
+
+    compacted, size = compact_stream_events(events)
+
+    assert compacted == [text("29,035 feet"), stream_end]
+    assert size == len("29,035 feet")
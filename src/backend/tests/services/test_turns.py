@@ -0,0 +1,115 @@
+import asyncio
+
+from backend.services.turns import InMemoryEventBuffer, TurnRegistry
+
+
+async def collect(stream) -> list[str]:
+    return [event async for _, event in stream]
+
+
+def test_retry_attaches_to_turn_in_progress() -> None:
+    generated = []
+
+    async def generate():
+        for event in ("start", "text", "end"):
+            generated.append(event)
+            yield event
+            await asyncio.sleep(0.01)
+
+    async def retry_during_generation():
+        registry = TurnRegistry()
+        turn, created = registry.reserve("user", "bot")
+        assert created
+        turn.start(generate())
+        first = asyncio.create_task(collect(turn.subscribe()))
+        await asyncio.sleep(0.015)
+
+        retried, created = registry.reserve("user", "bot")
+        assert retried is turn and not created
+        second = await collect(retried.subscribe())
+        return await first, second
+
+    first, second = asyncio.run(retry_during_generation())
+
+    assert first == second == ["start", "text", "end"]
+    # The retry didn't start a second generation
+    assert generated == ["start", "text", "end"]
+
+
+def test_finished_turn_is_replayed_until_ttl() -> None:
+    async def generate():
+        yield "end"
+
+    async def retry_after_generation():
+        registry = TurnRegistry(replay_ttl=0.05)
+        turn, _ = registry.reserve("user", "bot")
+        turn.start(generate())
+        await collect(turn.subscribe())
+
+        replayed = await collect(registry.get("user", "bot").subscribe())
+        await asyncio.sleep(0.1)
+        return replayed, registry.get("user", "bot")
+
+    replayed, expired = asyncio.run(retry_after_generation())
+
+    assert replayed == ["end"]
+    assert expired is None
+
+
+def test_last_subscriber_leaving_cancels_generation() -> None:
+    cancelled = []
+
+    async def generate():
+        try:
+            yield "start"
+            await asyncio.sleep(10)
+            yield "end"
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def disconnect():
+        registry = TurnRegistry(grace_period=0)
+        turn, _ = registry.reserve("user", "bot")
+        turn.start(generate())
+        stream = turn.subscribe()
+        assert await anext(stream) == (0, "start")
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+        return turn
+
+    turn = asyncio.run(disconnect())
+
+    assert cancelled == [True]
+    assert turn.finished
+
+
+def test_reconnect_resumes_within_grace_period() -> None:
+    async def generate():
+        for event in ("start", "text", "end"):
+            yield event
+            await asyncio.sleep(0.02)
+
+    async def reconnect():
+        registry = TurnRegistry(grace_period=1)
+        turn, _ = registry.reserve("user", "bot")
+        turn.start(generate())
+        stream = turn.subscribe()
+        last_event_id, _ = await anext(stream)
+        await stream.aclose()
+
+        # The generation keeps running while the client is away
+        await asyncio.sleep(0.03)
+        return await collect(turn.subscribe(last_event_id + 1))
+
+    assert asyncio.run(reconnect()) == ["text", "end"]
+
+
+def test_event_buffer_keeps_recent_events() -> None:
+    events = InMemoryEventBuffer(max_events=2)
+    for event in ("start", "text", "end"):
+        events.append(event)
+
+    assert events.first_id() == 1
+    assert events.read(0) == [(1, "text"), (2, "end")]
+    assert events.read(2) == [(2, "end")]
@@ -0,0 +1,31 @@
+from backend.tools.retrieval.bm25 import bm25_scores, tokenize
+
+
+def test_tokenize() -> None:
+    assert tokenize("Mount Everest's height: 8,849 m") == [
+        "mount",
+        "everest",
+        "s",
+        "height",
+        "8",
+        "849",
+        "m",
+    ]
+
+
+def test_ranks_documents_with_rare_query_terms_first() -> None:
+    scores = bm25_scores(
+        "height of mount everest",
+        [
+            "The height of the Eiffel Tower is 330 m",
+            "Mount Everest is the highest mountain, its height is 8,849 m",
+            "Penguins live in the southern hemisphere",
+        ],
+    )
+
+    assert scores[1] > scores[0] > scores[2] == 0
+
+
+def test_no_query_terms() -> None:
+    assert bm25_scores("?", ["text", "other text"]) == [0.0, 0.0]
+    assert bm25_scores("query", []) == []
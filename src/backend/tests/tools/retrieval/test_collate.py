@@ -1,4 +1,5 @@
 import os
+from types import SimpleNamespace
 
 import pytest
 
@@ -24,6 +25,100 @@ def test_rerank() -> None:
     }
 
 
+class KeywordRerankDeployment:
+    """Scores documents by the number of query words they contain."""
+
+    rerank_enabled = True
+
+    def __init__(self):
+        self.calls = []
+
+    def invoke_rerank(self, query, documents, **kwargs):
+        self.calls.append((query, documents))
+        words = query.split()
+        return SimpleNamespace(
+            results=[
+                SimpleNamespace(
+                    index=index,
+                    relevance_score=sum(word in document for word in words),
+                )
+                for index, document in enumerate(documents)
+            ]
+        )
+
+
+def test_batched_rerank_dedupes_across_queries(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(collate, "RERANK_MODE", "batched")
+    model = KeywordRerankDeployment()
+    input = {
+        "mountain": [{"text": "cable"}, {"text": "mountain goat"}],
+        "computer": [{"text": "cable"}, {"text": "computer software"}],
+    }
+
+    assert collate.rerank(input, model) == {
+        "mountain": [{"text": "mountain goat"}, {"text": "cable"}],
+        "computer": [{"text": "computer software"}],
+    }
+    assert model.calls == [
+        ("mountain", ["cable", "mountain goat"]),
+        ("computer", ["computer software"]),
+    ]
+
+
+def test_batched_rerank_splits_calls_over_max_documents(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(collate, "RERANK_MODE", "batched")
+    monkeypatch.setattr(collate, "RERANK_MAX_DOCUMENTS", 2)
+    model = KeywordRerankDeployment()
+    input = {"goat": [{"text": "cable"}, {"text": "hill"}, {"text": "goat"}]}
+
+    assert collate.rerank(input, model)["goat"][0] == {"text": "goat"}
+    assert model.calls == [("goat", ["cable", "hill"]), ("goat", ["goat"])]
+
+
+def test_rerank_keeps_top_k(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(collate, "RERANK_TOP_K", 1)
+    input = {
+        "mountain": [{"text": "hill"}, {"text": "mountain goat"}],
+        "computer": [{"text": "computer"}, {"text": "penguin"}],
+    }
+
+    assert collate.rerank(input, KeywordRerankDeployment()) == {
+        "mountain": [{"text": "mountain goat"}],
+        "computer": [{"text": "computer"}],
+    }
+
+
+def test_rerank_locally_without_rerank_model() -> None:
+    model = KeywordRerankDeployment()
+    model.rerank_enabled = False
+    input = {
+        "mountain goat": [{"text": "cable"}, {"text": "a goat on the mountain"}],
+    }
+
+    assert collate.rerank(input, model) == {
+        "mountain goat": [{"text": "a goat on the mountain"}, {"text": "cable"}],
+    }
+    assert model.calls == []
+
+
+def test_remove_near_duplicates_across_queries() -> None:
+    article = "Mount Everest is the highest mountain above sea level, 8,849 m high"
+    input = {
+        "q1": [{"text": article}, {"text": "Penguins live in the southern hemisphere"}],
+        "q2": [{"text": article.upper() + "!"}, {"text": "Cables carry electricity"}],
+    }
+
+    assert collate.remove_near_duplicates(input, similarity=0.95) == {
+        "q1": [{"text": article}, {"text": "Penguins live in the southern hemisphere"}],
+        "q2": [{"text": "Cables carry electricity"}],
+    }
+    assert collate.remove_near_duplicates(input, similarity=0) == input
+
+
 def test_interleave() -> None:
     input = {
         "q1": [{"q1a": "a"}, {"q1b": "b"}, {"q1c": "c"}],
@@ -0,0 +1,52 @@
+from backend.tools.retrieval.compression import (
+    SPAN_SEPARATOR,
+    compress_text,
+    split_sentences,
+)
+
+TEXT = (
+    "Penguins live in the southern hemisphere. "
+    "They cannot fly. "
+    "Emperor penguins are the tallest. "
+    "Mount Everest is the highest mountain. "
+    "It is 8,849 m high. "
+    "Climbers use oxygen. "
+    "Most expeditions start in Nepal. "
+    "The Mariana Trench is the deepest point. "
+    "It lies in the Pacific Ocean. "
+    "Submarines have reached its floor."
+)
+
+
+def test_split_sentences() -> None:
+    text = "Everest is 8,849 m high. Is it? Yes!\nThe end"
+
+    assert [text[start:end] for start, end in split_sentences(text)] == [
+        "Everest is 8,849 m high.",
+        "Is it?",
+        "Yes!",
+        "The end",
+    ]
+
+
+def test_keeps_top_sentences_and_neighbours() -> None:
+    assert compress_text(TEXT, "deepest trench") == (
+        "Most expeditions start in Nepal. "
+        "The Mariana Trench is the deepest point. "
+        "It lies in the Pacific Ocean."
+    )
+
+
+def test_separates_spans_in_document_order() -> None:
+    spans = compress_text(TEXT, "southern oxygen").split(SPAN_SEPARATOR)
+
+    assert len(spans) == 2
+    assert all(span in TEXT for span in spans)
+    assert TEXT.index(spans[0]) < TEXT.index(spans[1])
+
+
+def test_short_or_unrelated_documents_are_kept() -> None:
+    assert compress_text("Everest is 8,849 m high.", "height") == (
+        "Everest is 8,849 m high."
+    )
+    assert compress_text(TEXT, "quantum physics") == TEXT
@@ -0,0 +1,42 @@
+from backend.services.tokens import count_tokens
+from backend.tools.retrieval.packing import pack_documents, truncate_text
+
+LONG = {"text": "Mount Everest is the highest mountain on Earth. " * 50}
+SHORT = {"text": "Everest is 8,849 m high."}
+UNRELATED = {"text": "Penguins live in the southern hemisphere."}
+
+
+def test_documents_within_budget_are_kept() -> None:
+    documents = [(LONG, 0.9), (SHORT, 0.8)]
+
+    assert pack_documents(documents, 10_000) == ([LONG, SHORT], 0)
+
+
+def test_packs_densest_documents_and_truncates_one() -> None:
+    short_tokens = count_tokens(SHORT["text"])
+    unrelated_tokens = count_tokens(UNRELATED["text"])
+    budget = short_tokens + unrelated_tokens + 100
+    total = count_tokens(LONG["text"]) + short_tokens + unrelated_tokens
+
+    packed, tokens_saved = pack_documents(
+        [(LONG, 0.9), (SHORT, 0.8), (UNRELATED, 0.1)], budget
+    )
+
+    # Prompt order is kept, the long document is truncated to the tokens left
+    assert packed[1:] == [SHORT, UNRELATED]
+    assert LONG["text"].startswith(packed[0]["text"])
+    # About 100 tokens, cut by characters at a word boundary
+    assert count_tokens(packed[0]["text"]) <= 110
+    assert tokens_saved == total - budget
+
+
+def test_drops_documents_when_too_few_tokens_are_left() -> None:
+    budget = count_tokens(SHORT["text"]) + 10
+
+    packed, _ = pack_documents([(LONG, 0.9), (SHORT, 0.8)], budget)
+
+    assert packed == [SHORT]
+
+
+def test_truncate_text_at_word_boundary() -> None:
+    assert truncate_text("one two three four", 4, 2) == "one two"
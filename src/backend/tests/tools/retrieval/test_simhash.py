@@ -0,0 +1,31 @@
+import time
+
+from backend.tools.retrieval.simhash import hamming_distance, simhash
+
+EVEREST = (
+    "Mount Everest is Earth's highest mountain above sea level, located in the "
+    "Mahalangur Himal sub-range of the Himalayas. The China-Nepal border runs "
+    "across its summit point. Its elevation of 8,848.86 m was most recently "
+    "established in 2020 by the Chinese and Nepali authorities."
+)
+MARIANA = (
+    "The Mariana Trench is an oceanic trench located in the western Pacific "
+    "Ocean, about 200 kilometres east of the Mariana Islands. It is the deepest "
+    "oceanic trench on Earth, crescent-shaped and about 2,550 km long."
+)
+
+
+def test_near_duplicates_have_close_fingerprints() -> None:
+    reformatted = EVEREST.replace(", ", " , ").upper() + "\n"
+
+    assert simhash(EVEREST) == simhash(reformatted)
+    assert hamming_distance(simhash(EVEREST), simhash(EVEREST + " Source: wiki")) <= 8
+    assert hamming_distance(simhash(EVEREST), simhash(MARIANA)) > 16
+
+
+def test_fingerprint_is_fast() -> None:
+    start = time.perf_counter()
+    for _ in range(100):
+        simhash(EVEREST)
+
+    assert (time.perf_counter() - start) / 100 < 0.001
@@ -1,7 +1,17 @@
-from backend.tools.function_tools.calculator import CalculatorFunctionTool
-from backend.tools.function_tools.python_interpreter import (
-    PythonInterpreterFunctionTool,
-)
+import importlib
+
+# Implementations are imported on first access, they pull in their SDKs
+_IMPLEMENTATIONS = {
+    "CalculatorFunctionTool": "backend.tools.function_tools.calculator",
+    "PythonInterpreterFunctionTool": "backend.tools.function_tools.python_interpreter",
+}
+
+
+def __getattr__(name):
+    if name in _IMPLEMENTATIONS:
+        return getattr(importlib.import_module(_IMPLEMENTATIONS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     "CalculatorFunctionTool",
@@ -29,7 +29,9 @@ class PythonInterpreterFunctionTool(BaseFunctionTool):
             raise Exception("Python Interpreter tool called while URL not set")
 
         code = parameters.get("code", "")
-        res = requests.post(self.interpreter_url, json={"code": code})
+        res = requests.post(
+            self.interpreter_url, json={"code": code}, timeout=kwargs.get("timeout")
+        )
 
         return res.json()
 
@@ -1,8 +1,18 @@
-from backend.tools.retrieval.lang_chain import (
-    LangChainVectorDBRetriever,
-    LangChainWikiRetriever,
-)
-from backend.tools.retrieval.tavily import TavilyInternetSearch
+import importlib
+
+# Implementations are imported on first access, they pull in their SDKs
+_IMPLEMENTATIONS = {
+    "LangChainVectorDBRetriever": "backend.tools.retrieval.lang_chain",
+    "LangChainWikiRetriever": "backend.tools.retrieval.lang_chain",
+    "TavilyInternetSearch": "backend.tools.retrieval.tavily",
+}
+
+
+def __getattr__(name):
+    if name in _IMPLEMENTATIONS:
+        return getattr(importlib.import_module(_IMPLEMENTATIONS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     "LangChainVectorDBRetriever",
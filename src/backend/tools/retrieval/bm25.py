@@ -0,0 +1,62 @@
+"""
+BM25 scoring of retrieved documents against a query, used to rerank them when
+the deployment has no rerank model. Runs locally on the candidate set only: the
+document frequencies are those of the documents retrieved, no index is kept.
+
+Tokenizing is plain Python, the scoring is vectorized with NumPy over the
+documents and the query terms.
+"""
+
+import re
+from collections import Counter
+from typing import List
+
+import numpy as np
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens of a text."""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def bm25_scores(
+    query: str, documents: List[str], k1: float = BM25_K1, b: float = BM25_B
+) -> List[float]:
+    """
+    Scores documents against a query with Okapi BM25.
+
+    Args:
+        query (str): Search query.
+        documents (List[str]): Texts of the documents.
+        k1 (float): Term frequency saturation.
+        b (float): Document length normalization.
+
+    Returns:
+        List[float]: Score of each document, 0 when it has no query term.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not documents or not terms:
+        return [0.0] * len(documents)
+
+    term_counts = [Counter(tokenize(document)) for document in documents]
+    # Frequency of each query term in each document, shape (documents, terms)
+    frequencies = np.array(
+        [[counts[term] for term in terms] for counts in term_counts], dtype=float
+    )
+    lengths = np.array([sum(counts.values()) for counts in term_counts], dtype=float)
+
+    document_frequencies = np.count_nonzero(frequencies, axis=0)
+    idf = np.log(
+        1
+        + (len(documents) - document_frequencies + 0.5)
+        / (document_frequencies + 0.5)
+    )
+    average_length = lengths.mean() or 1.0
+    norms = k1 * (1 - b + b * lengths / average_length)
+    scores = (frequencies * (k1 + 1) / (frequencies + norms[:, None])) @ idf
+    return scores.tolist()
@@ -1,25 +1,111 @@
+"""
+Collation of the documents retrieved for the search queries of a turn.
+
+Near-duplicate documents are dropped first: a document whose SimHash
+fingerprint (see simhash.py) is at least DOCUMENT_DEDUP_SIMILARITY similar to
+one kept already, for any query, is not sent to the rerank nor the model.
+0 disables it.
+
+RERANK_MODE selects how the documents are reranked:
+- per_query: one rerank call per query, with the documents of that query.
+- batched: the documents are deduped across queries by content hash, each one
+  is kept for the first query it was retrieved for and scored only against
+  that query, in one call per query (or one per RERANK_MAX_DOCUMENTS
+  documents). A document retrieved by several queries is scored once.
+
+When the deployment has no rerank, the documents of each query are scored
+locally with BM25 (see bm25.py) instead, unless USE_LOCAL_RERANK is false.
+
+RERANK_TOP_K keeps the top k documents of each query before they are
+interleaved, 0 keeps them all. With USE_DOCUMENT_COMPRESSION, only the
+sentences relevant to their query are kept (see compression.py). The
+interleaved documents are then packed in the documents token budget of the
+deployment (see packing.py).
+"""
+
+import hashlib
+import os
+from distutils.util import strtobool
 from itertools import zip_longest
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 from backend.chat.custom.model_deployments.base import BaseDeployment
+from backend.tools.retrieval.compression import (
+    compress_documents,
+    use_document_compression,
+)
+from backend.tools.retrieval.packing import get_documents_token_budget, pack_documents
+from backend.tools.retrieval.simhash import SIMHASH_BITS, hamming_distance, simhash
+
+use_local_rerank = bool(strtobool(os.getenv("USE_LOCAL_RERANK", "true")))
+
+RERANK_MODE = os.getenv("RERANK_MODE", "per_query")
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "0"))
+RERANK_MAX_DOCUMENTS = int(os.getenv("RERANK_MAX_DOCUMENTS", "1000"))
+DOCUMENT_DEDUP_SIMILARITY = float(os.getenv("DOCUMENT_DEDUP_SIMILARITY", "0.95"))
 
 
 def combine_documents(
     documents: Dict[str, List[Dict[str, Any]]],
     model: BaseDeployment,
-) -> List[Dict[str, Any]]:
+) -> Tuple[List[Dict[str, Any]], int]:
     """
-    Combines documents from different retrievers and reranks them.
+    Combines documents from different retrievers, reranks them, compresses them
+    if enabled and packs them in the documents token budget of the deployment.
 
     Args:
         documents (Dict[str, List[Dict[str, Any]]]): Dictionary from queries of lists of documents.
         model (BaseDeployment): Model deployment.
 
     Returns:
-        List[Dict[str, Any]]: List of combined documents.
+        Tuple[List[Dict[str, Any]], int]: List of combined documents, and tokens
+            of documents left out of the budget.
+    """
+    documents = remove_near_duplicates(documents)
+    ranked_documents = rank_documents(documents, model)
+    if use_document_compression:
+        ranked_documents = compress_documents(ranked_documents)
+    return pack_documents(
+        interleave(ranked_documents), get_documents_token_budget(model)
+    )
+
+
+def remove_near_duplicates(
+    documents_by_query: Dict[str, List[Dict[str, Any]]],
+    similarity: float | None = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Keeps a document only if it is not a near-duplicate of one kept before it,
+    for its query or a previous one.
+
+    Args:
+        documents_by_query (Dict[str, List[Dict[str, Any]]]): Dictionary from queries of lists of documents.
+        similarity (float | None): Share of identical fingerprint bits from which
+            documents are duplicates, DOCUMENT_DEDUP_SIMILARITY by default.
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: Dictionary from queries of lists of distinct documents.
     """
-    reranked_documents = rerank(documents, model)
-    return interleave(reranked_documents)
+    if similarity is None:
+        similarity = DOCUMENT_DEDUP_SIMILARITY
+    if similarity <= 0:
+        return documents_by_query
+
+    max_distance = int((1 - similarity) * SIMHASH_BITS)
+    fingerprints = []
+    deduped = {}
+    for query, documents in documents_by_query.items():
+        deduped[query] = []
+        for document in documents:
+            fingerprint = simhash(document.get("text", ""))
+            if any(
+                hamming_distance(fingerprint, kept) <= max_distance
+                for kept in fingerprints
+            ):
+                continue
+            fingerprints.append(fingerprint)
+            deduped[query].append(document)
+    return deduped
 
 
 def rerank(
@@ -37,28 +123,175 @@ def rerank(
     Returns:
         Dict[str, List[Dict[str, Any]]]: Dictionary from queries of lists of reranked documents.
     """
-    # If rerank is not enabled return documents as is:
-    if not model.rerank_enabled:
+    # If rerank is not enabled, score locally or return documents as is:
+    if not model.rerank_enabled and not use_local_rerank:
         return documents_by_query
 
-    # rerank the documents by each query
+    ranked_documents = rank_documents(documents_by_query, model)
+    return {
+        query: [document for document, _ in scored_documents]
+        for query, scored_documents in ranked_documents.items()
+    }
+
+
+def rank_documents(
+    documents_by_query: Dict[str, List[Dict[str, Any]]], model: BaseDeployment
+) -> Dict[str, List[Tuple[Dict[str, Any], float]]]:
+    """
+    Reranks the documents of each query, with their relevance scores between 0
+    and 1. Without rerank, the documents keep their order and are scored by rank.
+
+    Args:
+        documents_by_query (Dict[str, List[Dict[str, Any]]]): Dictionary from queries of lists of documents.
+        model (BaseDeployment): Model deployment.
+
+    Returns:
+        Dict[str, List[Tuple[Dict[str, Any], float]]]: Dictionary from queries of
+            lists of reranked documents and their scores.
+    """
+    if not model.rerank_enabled:
+        if use_local_rerank:
+            scores_by_query = score_locally(documents_by_query)
+        else:
+            scores_by_query = {
+                query: [1 / (rank + 1) for rank in range(len(documents))]
+                for query, documents in documents_by_query.items()
+            }
+    elif RERANK_MODE == "batched":
+        documents_by_query = dedupe_documents(documents_by_query)
+        scores_by_query = score_batched(documents_by_query, model)
+    else:
+        scores_by_query = score_per_query(documents_by_query, model)
+
     all_rerank_docs = {}
+    for query, scores in scores_by_query.items():
+        documents = documents_by_query[query]
+        # Sort the documents by relevance score
+        order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)
+        if RERANK_TOP_K > 0:
+            order = order[:RERANK_TOP_K]
+        all_rerank_docs[query] = [(documents[i], scores[i]) for i in order]
+
+    return all_rerank_docs
+
+
+def score_per_query(
+    documents_by_query: Dict[str, List[Dict[str, Any]]], model: BaseDeployment
+) -> Dict[str, List[float]]:
+    """
+    Scores the documents of each query with one rerank call per query.
+
+    Args:
+        documents_by_query (Dict[str, List[Dict[str, Any]]]): Dictionary from queries of lists of documents.
+        model (BaseDeployment): Model deployment.
+
+    Returns:
+        Dict[str, List[float]]: Dictionary from queries of the relevance scores of their documents.
+    """
+    scores_by_query = {}
     for query, documents in documents_by_query.items():
         # Only rerank on text of document
-        # TODO handle no text in document
-        docs_to_rerank = [doc["text"] for doc in documents]
+        docs_to_rerank = [doc.get("text", "") for doc in documents]
 
         # If no documents to rerank, continue to the next query
         if not docs_to_rerank:
             continue
 
         res = model.invoke_rerank(query=query, documents=docs_to_rerank)
-        # Sort the results by relevance score
-        res.results.sort(key=lambda x: x.relevance_score, reverse=True)
-        # Map the results back to the original documents
-        all_rerank_docs[query] = [documents[r.index] for r in res.results]
+        scores = [0.0] * len(documents)
+        for result in res.results:
+            scores[result.index] = result.relevance_score
+        scores_by_query[query] = scores
 
-    return all_rerank_docs
+    return scores_by_query
+
+
+def score_batched(
+    documents_by_query: Dict[str, List[Dict[str, Any]]], model: BaseDeployment
+) -> Dict[str, List[float]]:
+    """
+    Scores the deduped documents of each query against that query, with one
+    rerank call per query, or one per RERANK_MAX_DOCUMENTS documents.
+
+    Args:
+        documents_by_query (Dict[str, List[Dict[str, Any]]]): Dictionary from queries of lists of deduped documents.
+        model (BaseDeployment): Model deployment.
+
+    Returns:
+        Dict[str, List[float]]: Dictionary from queries of the relevance scores of their documents.
+    """
+    batch_size = max(RERANK_MAX_DOCUMENTS, 1)
+    scores_by_query = {}
+    for query, documents in documents_by_query.items():
+        if not documents:
+            continue
+
+        texts = [document.get("text", "") for document in documents]
+        scores = [0.0] * len(texts)
+        for start in range(0, len(texts), batch_size):
+            res = model.invoke_rerank(
+                query=query, documents=texts[start : start + batch_size]
+            )
+            for result in res.results:
+                scores[start + result.index] = result.relevance_score
+        scores_by_query[query] = scores
+
+    return scores_by_query
+
+
+def score_locally(
+    documents_by_query: Dict[str, List[Dict[str, Any]]]
+) -> Dict[str, List[float]]:
+    """
+    Scores the documents of each query with BM25, without any network call.
+
+    Args:
+        documents_by_query (Dict[str, List[Dict[str, Any]]]): Dictionary from queries of lists of documents.
+
+    Returns:
+        Dict[str, List[float]]: Dictionary from queries of the relevance scores of their documents, scaled to at most 1.
+    """
+    # NumPy is only imported when a deployment without rerank retrieves documents
+    from backend.tools.retrieval.bm25 import bm25_scores
+
+    scores_by_query = {}
+    for query, documents in documents_by_query.items():
+        if not documents:
+            continue
+        scores = bm25_scores(query, [doc.get("text", "") for doc in documents])
+        # BM25 scores are unbounded, scaling makes the queries comparable
+        max_score = max(scores) or 1.0
+        scores_by_query[query] = [score / max_score for score in scores]
+    return scores_by_query
+
+
+def get_document_key(document: Dict[str, Any]) -> str:
+    """Content hash of a document, the same text retrieved twice has the same key."""
+    return hashlib.sha1(document.get("text", "").encode()).hexdigest()
+
+
+def dedupe_documents(
+    documents_by_query: Dict[str, List[Dict[str, Any]]]
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Keeps each document only for the first query it was retrieved for.
+
+    Args:
+        documents_by_query (Dict[str, List[Dict[str, Any]]]): Dictionary from queries of lists of documents.
+
+    Returns:
+        Dict[str, List[Dict[str, Any]]]: Dictionary from queries of lists of unique documents.
+    """
+    seen = set()
+    deduped = {}
+    for query, documents in documents_by_query.items():
+        deduped[query] = []
+        for document in documents:
+            key = get_document_key(document)
+            if key not in seen:
+                seen.add(key)
+                deduped[query].append(document)
+    return deduped
 
 
 def interleave(documents: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
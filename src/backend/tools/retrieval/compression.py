@@ -0,0 +1,100 @@
+"""
+Query-focused compression of retrieved documents.
+
+A document is split into sentences, the sentences are scored against the
+search query that retrieved it with BM25 (see bm25.py), and only the top
+COMPRESSION_TOP_SENTENCES sentences and COMPRESSION_NEIGHBOURS sentences around
+each are kept. The spans kept are joined with SPAN_SEPARATOR, in document order.
+
+Citations are not affected: their start and end index the generated answer,
+not the documents.
+"""
+
+import os
+import re
+from distutils.util import strtobool
+from typing import Any, Dict, List, Tuple
+
+use_document_compression = bool(
+    strtobool(os.getenv("USE_DOCUMENT_COMPRESSION", "false"))
+)
+COMPRESSION_TOP_SENTENCES = int(os.getenv("COMPRESSION_TOP_SENTENCES", "2"))
+COMPRESSION_NEIGHBOURS = int(os.getenv("COMPRESSION_NEIGHBOURS", "1"))
+
+SPAN_SEPARATOR = " ... "
+
+# A sentence ends at ., ! or ? followed by whitespace, or at the end of the text
+_SENTENCE_PATTERN = re.compile(r"\S.*?(?:[.!?]+(?=\s)|$)", re.DOTALL)
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """Start and end offsets of the sentences of a text."""
+    return [match.span() for match in _SENTENCE_PATTERN.finditer(text)]
+
+
+def compress_text(text: str, query: str) -> str:
+    """
+    Keep the sentences of a text most relevant to a query, and their neighbours.
+
+    Args:
+        text (str): Text.
+        query (str): Search query.
+
+    Returns:
+        str: Compressed text.
+    """
+    sentences = split_sentences(text)
+    if len(sentences) <= COMPRESSION_TOP_SENTENCES * (2 * COMPRESSION_NEIGHBOURS + 1):
+        return text
+
+    # NumPy is only imported when compression is enabled
+    from backend.tools.retrieval.bm25 import bm25_scores
+
+    scores = bm25_scores(query, [text[start:end] for start, end in sentences])
+    top = sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True)
+    top = [i for i in top[:COMPRESSION_TOP_SENTENCES] if scores[i] > 0]
+    # Nothing matches the query, the document is kept as is
+    if not top:
+        return text
+
+    kept = {
+        j
+        for i in top
+        for j in range(i - COMPRESSION_NEIGHBOURS, i + COMPRESSION_NEIGHBOURS + 1)
+        if 0 <= j < len(sentences)
+    }
+
+    # Consecutive sentences make a single span
+    spans = []
+    for i in sorted(kept):
+        start, end = sentences[i]
+        if spans and i - 1 in kept:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+
+    return SPAN_SEPARATOR.join(text[start:end] for start, end in spans)
+
+
+def compress_documents(
+    documents_by_query: Dict[str, List[Tuple[Dict[str, Any], float]]]
+) -> Dict[str, List[Tuple[Dict[str, Any], float]]]:
+    """
+    Compress the documents of each query against that query.
+
+    Args:
+        documents_by_query (Dict[str, List[Tuple[Dict[str, Any], float]]]): Dictionary
+            from queries of lists of ranked documents and their scores.
+
+    Returns:
+        Dict[str, List[Tuple[Dict[str, Any], float]]]: Same, with compressed documents.
+    """
+    compressed = {}
+    for query, scored_documents in documents_by_query.items():
+        compressed[query] = []
+        for document, score in scored_documents:
+            text = compress_text(document.get("text", ""), query)
+            if text != document.get("text", ""):
+                document = document | {"text": text}
+            compressed[query].append((document, score))
+    return compressed
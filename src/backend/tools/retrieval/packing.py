@@ -0,0 +1,99 @@
+"""
+Packing of the retrieved documents in the documents token budget of the
+deployment.
+
+When the documents don't fit, they are picked by relevance per token, which
+maximizes the relevance sent within the budget when a truncated document is
+worth its share of tokens: the densest documents are kept whole, then the first
+one that doesn't fit is truncated to the tokens left, if at least
+DOCUMENT_MIN_TRUNCATED_TOKENS. The documents kept stay in their order.
+
+DOCUMENTS_TOKEN_BUDGET overrides the budget of every deployment.
+"""
+
+import os
+from typing import Any, Dict, List, Tuple
+
+from backend.chat.custom.model_deployments.base import BaseDeployment
+from backend.services.tokens import count_tokens
+
+DOCUMENTS_TOKEN_BUDGET = os.getenv("DOCUMENTS_TOKEN_BUDGET")
+DOCUMENT_MIN_TRUNCATED_TOKENS = int(os.getenv("DOCUMENT_MIN_TRUNCATED_TOKENS", "50"))
+
+
+def get_documents_token_budget(model: BaseDeployment) -> int:
+    """
+    Get the documents token budget of a deployment.
+
+    Args:
+        model (BaseDeployment): Model deployment.
+
+    Returns:
+        int: Token budget of the documents.
+    """
+    if DOCUMENTS_TOKEN_BUDGET:
+        return int(DOCUMENTS_TOKEN_BUDGET)
+    return model.documents_token_budget
+
+
+def truncate_text(text: str, tokens: int, max_tokens: int) -> str:
+    """
+    Truncate a text to about max_tokens, at a word boundary.
+
+    Args:
+        text (str): Text.
+        tokens (int): Tokens of the text.
+        max_tokens (int): Tokens to keep.
+
+    Returns:
+        str: Beginning of the text.
+    """
+    end = len(text) * max_tokens // tokens
+    boundary = text.rfind(" ", 0, end + 1)
+    return text[: boundary if boundary > 0 else end].rstrip()
+
+
+def pack_documents(
+    scored_documents: List[Tuple[Dict[str, Any], float]], token_budget: int
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Pick the documents, and truncation point, that maximize relevance within
+    the token budget.
+
+    Args:
+        scored_documents (List[Tuple[Dict[str, Any], float]]): Documents in prompt
+            order, with their relevance scores.
+        token_budget (int): Tokens of documents sent to the model.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], int]: Documents packed, and tokens left out.
+    """
+    tokens = [
+        max(count_tokens(document.get("text", "")), 1)
+        for document, _ in scored_documents
+    ]
+    total_tokens = sum(tokens)
+    if total_tokens <= token_budget:
+        return [document for document, _ in scored_documents], 0
+
+    # Densest first, in prompt order on ties
+    order = sorted(
+        range(len(scored_documents)),
+        key=lambda i: max(scored_documents[i][1], 0) / tokens[i],
+        reverse=True,
+    )
+    packed: Dict[int, Dict[str, Any]] = {}
+    tokens_left = token_budget
+    for i in order:
+        document = scored_documents[i][0]
+        if tokens[i] <= tokens_left:
+            packed[i] = document
+            tokens_left -= tokens[i]
+        elif tokens_left >= DOCUMENT_MIN_TRUNCATED_TOKENS:
+            packed[i] = document | {
+                "text": truncate_text(document.get("text", ""), tokens[i], tokens_left)
+            }
+            tokens_left = 0
+
+    used_tokens = token_budget - tokens_left
+    return [packed[i] for i in sorted(packed)], total_tokens - used_tokens
@@ -0,0 +1,55 @@
+"""
+SimHash fingerprints of document texts, to find near-duplicates: the same
+chunk or article retrieved by several queries or retrievers, with small
+differences in whitespace, punctuation or a few words.
+
+A fingerprint is 64 bits; each bit is the majority vote of that bit over the
+hashes of the word shingles of the text. Similar texts have fingerprints at a
+small Hamming distance.
+"""
+
+import hashlib
+import re
+from typing import List
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def get_shingles(text: str, size: int = SHINGLE_SIZE) -> List[str]:
+    """Overlapping sequences of size lowercased words, the whole text if shorter."""
+    words = _TOKEN_PATTERN.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)]
+    return [" ".join(words[i : i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(text: str) -> int:
+    """
+    Compute the SimHash fingerprint of a text.
+
+    Args:
+        text (str): Text.
+
+    Returns:
+        int: 64 bit fingerprint.
+    """
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest())
+        for shingle in get_shingles(text)
+    ]
+    # Counts the set bits of each position over the hashes, bit 63 first
+    columns = zip(*(f"{value:064b}" for value in hashes))
+    threshold = len(hashes) / 2
+
+    fingerprint = 0
+    for column in columns:
+        fingerprint = (fingerprint << 1) | (column.count("1") > threshold)
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of bits that differ between two fingerprints."""
+    return (a ^ b).bit_count()